@@ -1,4 +1,14 @@
-from .decorator import q_method
+from .decorator import q_method, evaluate_flags
 from .utils import nested_q
 from .filterq import obj_matches_q
 from .filterq import filter_by_q
+from .mirror import TableMirror
+from .cache import QResultCache
+from .serialize import serialize_q, deserialize_q, fingerprint_q
+from .session import evaluation_session
+from .planner import UNKNOWN
+from .live import LiveFilteredSet
+from .ordering import order_by_in_memory, top_k
+from .inmemory import InMemoryQuerySet
+from .codegen import compile_q
+from .projection import required_fields
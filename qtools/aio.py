@@ -0,0 +1,139 @@
+"""
+Async counterparts of the filtering functions (python 3.5+)
+
+Django's ORM is synchronous, so database work runs in the event loop's default executor and the loop is never
+blocked:
+
+    delivered = await afilter_by_q(pizzas, PizzaQuerySet.is_delivered.q())
+    matches = await amatches_q_in_db(pizzas, PizzaQuerySet.is_delivered.q())
+
+Before filtering, the relations used by the Q object are prefetched for all of the objects at once. Each relation
+path loads in its own thread, concurrently with the others, instead of one lazy load per object.
+
+Queries run on the worker threads' own database connections, so they don't see changes made in a transaction that
+is still open on the calling thread.
+"""
+import asyncio
+import functools
+from collections import OrderedDict
+
+from django.db import close_old_connections
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query import prefetch_related_objects
+from django.db.models.query_utils import Q
+
+from .filterq import filter_by_q, obj_matches_q, get_model_field
+from .planner import matching_pks
+from .utils import get_related_model, RELATED_FIELD_CLASSES
+
+IN_DB_CHUNK_SIZE = 500
+
+
+async def afilter_by_q(objs, q, lookup_adapter=None, using=None):
+    """Filters a collection of objects by a Q object without blocking the event loop"""
+    objs = list(objs)
+    await aprefetch_for_q(objs, q)
+    return await run_in_thread(filter_by_q, objs, q, lookup_adapter=lookup_adapter, using=using)
+
+
+async def aobj_matches_q(obj, q, lookup_adapter=None, using=None):
+    """Returns True if obj matches the Q object, without blocking the event loop"""
+    await aprefetch_for_q([obj], q)
+    return await run_in_thread(obj_matches_q, obj, q, lookup_adapter=lookup_adapter, using=using)
+
+
+async def amatches_q_in_db(objs, q, chunk_size=IN_DB_CHUNK_SIZE):
+    """
+    Checks in the database which of the saved objects match the Q object
+
+    Returns a list of booleans in the order of `objs`. Each object is checked in the database it was loaded from.
+    Runs one query per model, database and chunk of `chunk_size` objects, all of them concurrently.
+    """
+    objs = list(objs)
+    pks_by_model = OrderedDict()
+    for obj in objs:
+        pks_by_model.setdefault((type(obj), obj._state.db), []).append(obj.pk)
+
+    chunks = []
+    for (model, db), pks in pks_by_model.items():
+        for i in range(0, len(pks), chunk_size):
+            chunks.append((model, db, pks[i:i + chunk_size]))
+
+    results = await asyncio.gather(*[run_in_thread(matching_pks, model, db, q, pks) for model, db, pks in chunks])
+
+    matching = set()
+    for (model, db, pks), chunk_matching_pks in zip(chunks, results):
+        matching.update((model, db, pk) for pk in chunk_matching_pks)
+    return [(type(obj), obj._state.db, obj.pk) in matching for obj in objs]
+
+
+async def aprefetch_for_q(objs, q):
+    """Loads the relations used by the Q object for all of the objects, one thread per relation"""
+    objs = list(objs)
+    if not objs or len(set(type(obj) for obj in objs)) != 1:
+        return
+
+    groups = OrderedDict()
+    for path in get_relation_paths(type(objs[0]), q):
+        groups.setdefault(path.split('__')[0], []).append(path)
+    if not groups:
+        return
+
+    # django creates this dict lazily. create it up front so concurrent prefetches don't replace each other's dict.
+    for obj in objs:
+        if not hasattr(obj, '_prefetched_objects_cache'):
+            obj._prefetched_objects_cache = {}
+
+    await asyncio.gather(*[run_in_thread(prefetch_related_objects, objs, paths) for paths in groups.values()])
+
+
+def get_relation_paths(model, q):
+    """Returns the prefetch_related paths of the relations the Q object traverses"""
+    paths = []
+    for filter_statement in _iter_filter_statements(q):
+        path = _relation_path(model, filter_statement.split('__'))
+        if path and path not in paths:
+            paths.append(path)
+    return paths
+
+
+async def run_in_thread(fn, *args, **kwargs):
+    """Runs fn in the event loop's default executor"""
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, functools.partial(_call_and_close_connections, fn, *args, **kwargs))
+
+
+def _call_and_close_connections(fn, *args, **kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # executor threads outlive the call, release their connections like django does at the end of a request
+        close_old_connections()
+
+
+def _iter_filter_statements(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            for filter_statement in _iter_filter_statements(child):
+                yield filter_statement
+        else:
+            yield child[0]
+
+
+def _relation_path(model, tokens):
+    accessors = []
+    for token in tokens:
+        try:
+            field = get_model_field(model, token)
+        except (FieldDoesNotExist, KeyError):
+            break
+
+        if isinstance(field, RELATED_FIELD_CLASSES):
+            accessors.append(field.get_accessor_name())
+            model = get_related_model(field)
+        elif getattr(field, 'rel', None) is not None:
+            accessors.append(field.name)
+            model = field.rel.to
+        else:
+            break
+    return '__'.join(accessors)
@@ -0,0 +1,519 @@
+"""
+Static analysis of Q objects
+
+    is_satisfiable(Q(price__gt=10) & Q(price__lt=5), Order)  # False
+    q_implies(Q(price__range=(100, 500)), Q(price__gte=0, price__lte=1000), Order)  # True
+
+The analysis is conservative: False means no object can ever match, True means one might. Filters that it can't
+reason about, like string lookups or F() expressions, never make a Q object unsatisfiable. Likewise q_implies only
+returns True when the implication holds.
+
+Filters under the same AND only contradict each other on fields with a single value per object: local fields and
+fields reached over foreign keys and one to one relations. A pizza can have a `cheese` topping and a `ham` topping, so
+`Q(toppings__name='cheese') & Q(toppings__name='ham')` is satisfiable. Filter values are converted by the model field
+first like django does, an IntegerField compares 1.2 as 1 and a DateField compares datetimes as their date. Without a
+model nothing is known about the fields, only filters that can't match on their own are found, like `pk__in=[]`.
+"""
+import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query_utils import Q
+from django.utils import six, timezone
+
+from .filterq import get_model_field, process_filter_statement
+from .utils import get_field_simple_datatype, get_related_model, RELATED_FIELD_CLASSES
+
+# the kinds of comparable_value a field of each simple type compares
+SIMPLE_TYPE_KINDS = {
+    'boolean':  ('number',),
+    'number':   ('number',),
+    'string':   ('string',),
+    'date':     ('date',),
+    'datetime': ('datetime', 'naive datetime'),
+}
+
+
+def is_satisfiable(q, model=None):
+    """Returns False if no object of `model` can match the Q object"""
+    return _is_satisfiable(q, model, [])
+
+
+def q_implies(q_narrow, q_wide, model=None):
+    """
+    Returns True if every object of `model` that matches q_narrow also matches q_wide
+
+    The objects matching q_narrow can then be found by filtering the objects that matched q_wide.
+    """
+    if _same_q(q_narrow, q_wide) or not is_satisfiable(q_narrow, model):
+        return True
+
+    if q_wide.negated:
+        positive = q_wide.clone()
+        positive.negated = False
+        return not is_satisfiable(q_narrow & positive, model)
+
+    if not q_narrow.negated and q_narrow.connector == q_narrow.OR and q_narrow.children:
+        return all(q_implies(_as_q(child), q_wide, model) for child in q_narrow.children)
+
+    if q_wide.connector == q_wide.OR and q_wide.children:
+        return any(q_implies(q_narrow, _as_q(child), model) for child in q_wide.children)
+
+    for child in q_wide.children:
+        if isinstance(child, Q):
+            implied = q_implies(q_narrow, child, model)
+        else:
+            implied = _implies_leaf(q_narrow, child, model)
+        if not implied:
+            return False
+    return True
+
+
+def _implies_leaf(q_narrow, leaf, model):
+    if q_narrow.negated:
+        return False
+
+    leaves = list(_iter_and_leaves(q_narrow))
+    if any(_same_leaf(leaf, narrow_leaf) for narrow_leaf in leaves):
+        return True
+
+    path, lookup = split_filter_statement(leaf[0])
+    key = get_constraint_key(model, path)
+    field = get_value_field(model, path)
+    if key is not None:
+        constraint = FieldConstraint(fold_strings=False, field=field)
+        for filter_statement, value in leaves:
+            narrow_path, narrow_lookup = split_filter_statement(filter_statement)
+            if get_constraint_key(model, narrow_path) == key:
+                constraint.add(narrow_lookup, value)
+        if constraint.implies(lookup, leaf[1]):
+            return True
+    else:
+        # the field may have many values per object, one filter has to imply the leaf by itself
+        for filter_statement, value in leaves:
+            narrow_path, narrow_lookup = split_filter_statement(filter_statement)
+            if narrow_path == path:
+                constraint = FieldConstraint(fold_strings=False, field=field)
+                constraint.add(narrow_lookup, value)
+                if constraint.implies(lookup, leaf[1]):
+                    return True
+
+    return any(q_implies(subtree, Q(leaf), model) for subtree in _iter_and_subtrees(q_narrow))
+
+
+def _as_q(child):
+    return child if isinstance(child, Q) else Q(child)
+
+
+def _same_q(a, b):
+    if a.connector != b.connector or a.negated != b.negated or len(a.children) != len(b.children):
+        return False
+    for a_child, b_child in zip(a.children, b.children):
+        if isinstance(a_child, Q) and isinstance(b_child, Q):
+            if not _same_q(a_child, b_child):
+                return False
+        elif isinstance(a_child, Q) or isinstance(b_child, Q) or not _same_leaf(a_child, b_child):
+            return False
+    return True
+
+
+def _same_leaf(a, b):
+    try:
+        return a[0] == b[0] and type(a[1]) == type(b[1]) and a[1] == b[1]
+    except TypeError:
+        # naive and aware datetimes
+        return False
+
+
+def _is_satisfiable(q, model, context):
+    """`context` are the leaves the enclosing AND nodes require besides q"""
+    if q.negated:
+        # ~q can only be unsatisfiable if q matches everything, which isn't analyzed
+        return True
+
+    if q.connector == q.OR and q.children:
+        return any(_is_satisfiable(child if isinstance(child, Q) else Q(child), model, context) for child in q.children)
+
+    leaves = context + list(_iter_and_leaves(q))
+    if not are_leaves_satisfiable(leaves, model):
+        return False
+    return all(_is_satisfiable(subtree, model, leaves) for subtree in _iter_and_subtrees(q))
+
+
+def are_leaves_satisfiable(leaves, model=None):
+    """Returns False if no object of `model` can match all of the (filter statement, value) leaves"""
+    constraints = {}
+    for filter_statement, value in leaves:
+        path, lookup = split_filter_statement(filter_statement)
+        key = get_constraint_key(model, path)
+        if key is None:
+            constraint = FieldConstraint(field=get_value_field(model, path))
+        elif key in constraints:
+            constraint = constraints[key]
+        else:
+            constraint = constraints[key] = FieldConstraint(field=get_value_field(model, path))
+        constraint.add(lookup, value)
+        if constraint.is_empty():
+            return False
+    return True
+
+
+def _iter_and_leaves(q):
+    """Yields the leaves that have to match for an AND node to match, flattening nested AND nodes"""
+    for child in q.children:
+        if not isinstance(child, Q):
+            yield child
+        elif not child.negated and child.connector == q.AND:
+            for leaf in _iter_and_leaves(child):
+                yield leaf
+
+
+def _iter_and_subtrees(q):
+    """Yields the OR and negated nodes that have to match for an AND node to match"""
+    for child in q.children:
+        if not isinstance(child, Q):
+            continue
+        if not child.negated and child.connector == q.AND:
+            for subtree in _iter_and_subtrees(child):
+                yield subtree
+        else:
+            yield child
+
+
+def split_filter_statement(filter_statement):
+    """Splits a filter statement into the field path and the lookup"""
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    return tuple([next_token] + remaining_statement_parts[:-1]), remaining_statement_parts[-1]
+
+
+def get_constraint_key(model, path):
+    """
+    Returns the names of the fields along the path if the path leads to a single value per object
+
+    Returns None for paths over multi-valued relations and for any path when the model isn't known.
+    """
+    if model is None:
+        return None
+
+    names = []
+    for name in path:
+        try:
+            field = get_model_field(model, name)
+        except FieldDoesNotExist:
+            return None
+
+        if isinstance(field, RELATED_FIELD_CLASSES):
+            if not isinstance(field.field, models.OneToOneField):
+                return None
+            model = get_related_model(field)
+        elif isinstance(field, models.ManyToManyField):
+            return None
+        elif getattr(field, 'rel', None) is not None:
+            model = field.rel.to
+        names.append(field.name)
+    return tuple(names)
+
+
+def get_value_field(model, path):
+    """
+    Returns the field that prepares the filter values of the path, None when it isn't known
+
+    Relations compare the pk of the related objects.
+    """
+    if model is None:
+        return None
+
+    field = None
+    for name in path:
+        if field is not None:
+            model = get_related_model(field)
+            if model is None:
+                return None
+        try:
+            field = get_model_field(model, name)
+        except FieldDoesNotExist:
+            return None
+
+    related_model = get_related_model(field)
+    if related_model is None:
+        return field
+    if getattr(field, 'rel', None) is not None and field.rel.get_related_field() != related_model._meta.pk:
+        # the values are compared with another field than the pk model instances stand for
+        return None
+    return related_model._meta.pk
+
+
+def prepare_value(field, lookup, value):
+    """
+    Returns the filter value converted by the field like django does before querying
+
+    Raises CantCompare if the field can't convert it, or the converted value isn't of a kind the field compares.
+    """
+    kinds = SIMPLE_TYPE_KINDS.get(get_field_simple_datatype(field))
+    if kinds is None:
+        raise CantCompare()
+
+    is_multiple = lookup in ('in', 'range')
+    if is_multiple:
+        if not isinstance(value, (list, tuple, set, frozenset)):
+            raise CantCompare()
+        value = [v.pk if isinstance(v, models.Model) else v for v in value]
+    elif isinstance(value, models.Model):
+        value = value.pk
+
+    # DateTimeFields only make naive datetimes aware, with a warning
+    if not isinstance(field, models.DateTimeField):
+        try:
+            if hasattr(field, 'get_prep_lookup'):
+                value = field.get_prep_lookup(lookup, value)
+            elif is_multiple:
+                value = [field.get_prep_value(v) for v in value]
+            else:
+                value = field.get_prep_value(value)
+        except (TypeError, ValueError, ValidationError):
+            raise CantCompare()
+
+    for v in (value if is_multiple else [value]):
+        if v is not None and comparable_value(v)[0] not in kinds:
+            raise CantCompare()
+    return value
+
+
+class CantCompare(Exception):
+    """The filter value can't be compared statically"""
+    pass
+
+
+def comparable_value(value, fold_strings=True):
+    """
+    Returns a (kind, key) pair for a filter value
+
+    Keys of the same kind compare like the values do in every supported database. Strings are only compared for
+    equality. With `fold_strings` they ignore case and trailing spaces like MySQL does, so different keys are never
+    equal. Otherwise they are kept as they are, so equal keys are always equal.
+    """
+    if isinstance(value, models.Model):
+        value = value.pk
+
+    if isinstance(value, float):
+        if value != value:
+            raise CantCompare()
+        return 'number', Decimal(repr(value))
+    if isinstance(value, six.integer_types + (Decimal,)):
+        return 'number', value
+    if isinstance(value, datetime.datetime):
+        # django makes naive datetimes aware, comparing them with aware ones isn't meaningful
+        return 'datetime' if timezone.is_aware(value) else 'naive datetime', value
+    if isinstance(value, datetime.date):
+        return 'date', value
+    if isinstance(value, six.string_types):
+        if not fold_strings:
+            return 'string', value
+        try:
+            value.encode('ascii')
+        except UnicodeError:
+            # other collations also ignore accents
+            raise CantCompare()
+        return 'string', value.rstrip(' ').lower()
+    raise CantCompare()
+
+
+class FieldConstraint(object):
+    """
+    The values a single field can have so all the filters added on it match
+
+    Without `fold_strings`, only filters that match exactly the same strings in every database are treated as equal.
+    With a `field`, the filter values are converted by it first, see prepare_value.
+    """
+    def __init__(self, fold_strings=True, field=None):
+        self.fold_strings = fold_strings
+        self.field = field
+        self.kind = None
+        self.values = None
+        self.lower = None
+        self.upper = None
+        self.is_null = None
+        self.not_null = False
+        self.never_matches = False
+
+    def add(self, lookup, value):
+        """Narrows the constraint by a filter. Filters that can't be reasoned about are ignored."""
+        if lookup == 'isnull':
+            self._add_is_null(bool(value))
+            return
+        if lookup == 'exact' and value is None:
+            self._add_is_null(True)
+            return
+
+        try:
+            if lookup in ('exact', 'iexact'):
+                if lookup == 'iexact' and (not self.fold_strings or not isinstance(value, six.string_types)):
+                    raise CantCompare()
+                self._add_values([self._prepare(lookup, value)])
+            elif lookup == 'in':
+                if not isinstance(value, (list, tuple, set, frozenset)) or None in value:
+                    raise CantCompare()
+                value = self._prepare(lookup, value)
+                if None in value:
+                    raise CantCompare()
+                self._add_values(value)
+            elif lookup in ('gt', 'gte'):
+                self._add_bound('lower', self._prepare(lookup, value), lookup == 'gte')
+            elif lookup in ('lt', 'lte'):
+                self._add_bound('upper', self._prepare(lookup, value), lookup == 'lte')
+            elif lookup == 'range':
+                lower, upper = self._prepare(lookup, value)
+                self._add_bound('lower', lower, True)
+                self._add_bound('upper', upper, True)
+            else:
+                return
+        except (CantCompare, TypeError, ValueError):
+            return
+        self.not_null = True
+
+    def is_empty(self):
+        """Returns True if no value can satisfy the constraint"""
+        if self.never_matches:
+            return True
+        if self.is_null and self.not_null:
+            return True
+        if self.values is not None and not any(self._in_bounds(key) for key in self.values):
+            return True
+        if self.lower is not None and self.upper is not None:
+            try:
+                if self.lower[0] > self.upper[0]:
+                    return True
+                if self.lower[0] == self.upper[0] and not (self.lower[1] and self.upper[1]):
+                    return True
+            except TypeError:
+                pass
+        return False
+
+    def implies(self, lookup, value):
+        """Returns True if every value that satisfies the constraint matches the filter"""
+        if self.is_empty():
+            # unequal strings may match the same rows, so the constraint isn't necessarily empty in the database
+            return False
+        if lookup == 'isnull':
+            return self.is_null is True if value else self.not_null
+        if lookup == 'exact' and value is None:
+            return self.is_null is True
+
+        try:
+            if lookup in ('exact', 'in', 'gt', 'gte', 'lt', 'lte', 'range'):
+                value = self._prepare(lookup, value)
+            if lookup == 'exact':
+                keys = self._keys_of_kind([value])
+                allowed = self._allowed_keys()
+                return allowed is not None and allowed <= keys
+            if lookup == 'in':
+                if not isinstance(value, (list, tuple, set, frozenset)) or not value:
+                    return False
+                keys = self._keys_of_kind(value)
+                allowed = self._allowed_keys()
+                return allowed is not None and allowed <= keys
+            if lookup in ('gt', 'gte'):
+                return self._is_above(self._keys_of_kind([value]).pop(), lookup == 'gte')
+            if lookup in ('lt', 'lte'):
+                return self._is_below(self._keys_of_kind([value]).pop(), lookup == 'lte')
+            if lookup == 'range':
+                lower, upper = self._keys_of_kind([value[0]]), self._keys_of_kind([value[1]])
+                return self._is_above(lower.pop(), True) and self._is_below(upper.pop(), True)
+        except (CantCompare, TypeError, ValueError):
+            pass
+        return False
+
+    def _prepare(self, lookup, value):
+        if self.field is None:
+            return value
+        return prepare_value(self.field, lookup, value)
+
+    def _keys_of_kind(self, values):
+        keys = set()
+        for value in values:
+            kind, key = comparable_value(value, self.fold_strings)
+            if kind != self.kind:
+                raise CantCompare()
+            keys.add(key)
+        return keys
+
+    def _allowed_keys(self):
+        """Returns the set of keys that satisfy the constraint, or None if there's no such finite set"""
+        if self.values is not None:
+            return set(key for key in self.values if self._in_bounds(key))
+        if self.lower is not None and self.upper is not None and self.lower[0] == self.upper[0]:
+            return set([self.lower[0]])
+        return None
+
+    def _is_above(self, key, inclusive):
+        if self.kind == 'string':
+            return False
+        allowed = self._allowed_keys()
+        if allowed is not None:
+            return all(k > key or (inclusive and k == key) for k in allowed)
+        if self.lower is None:
+            return False
+        lower, lower_inclusive = self.lower
+        return lower > key or (lower == key and (inclusive or not lower_inclusive))
+
+    def _is_below(self, key, inclusive):
+        if self.kind == 'string':
+            return False
+        allowed = self._allowed_keys()
+        if allowed is not None:
+            return all(k < key or (inclusive and k == key) for k in allowed)
+        if self.upper is None:
+            return False
+        upper, upper_inclusive = self.upper
+        return upper < key or (upper == key and (inclusive or not upper_inclusive))
+
+    def _add_is_null(self, is_null):
+        if self.is_null is not None and self.is_null != is_null:
+            self.never_matches = True
+        self.is_null = is_null
+        if not is_null:
+            self.not_null = True
+
+    def _add_values(self, values):
+        keys = set()
+        for value in values:
+            kind, key = comparable_value(value, self.fold_strings)
+            self._check_kind(kind)
+            keys.add(key)
+        if not values:
+            self.never_matches = True
+        self.values = keys if self.values is None else self.values & keys
+
+    def _add_bound(self, side, value, inclusive):
+        kind, key = comparable_value(value, self.fold_strings)
+        if kind == 'string':
+            # string ordering depends on the collation
+            raise CantCompare()
+        self._check_kind(kind)
+
+        current = getattr(self, side)
+        if current is None:
+            setattr(self, side, (key, inclusive))
+            return
+        tighter = key > current[0] if side == 'lower' else key < current[0]
+        if tighter or (key == current[0] and not inclusive):
+            setattr(self, side, (key, inclusive))
+
+    def _check_kind(self, kind):
+        if self.kind is None:
+            self.kind = kind
+        elif self.kind != kind:
+            # '2015-01-01' and date(2015, 1, 1) or '5' and 5 can be the same value in the database
+            raise CantCompare()
+
+    def _in_bounds(self, key):
+        try:
+            if self.lower is not None and (key < self.lower[0] or (key == self.lower[0] and not self.lower[1])):
+                return False
+            if self.upper is not None and (key > self.upper[0] or (key == self.upper[0] and not self.upper[1])):
+                return False
+        except TypeError:
+            pass
+        return True
@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class QToolsConfig(AppConfig):
+    """
+    Optional app config that warms up and validates the q_methods when django starts
+
+    Set QTOOLS_WARM_UP = False to skip it, or QTOOLS_GC_FREEZE = True to also freeze the warmed state before forking.
+    """
+    name = 'qtools'
+    verbose_name = 'qtools'
+
+    def ready(self):
+        if getattr(settings, 'QTOOLS_WARM_UP', True):
+            from .warmup import warm_up
+            warm_up(freeze=getattr(settings, 'QTOOLS_GC_FREEZE', False))
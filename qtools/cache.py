@@ -0,0 +1,181 @@
+"""
+Opt-in result cache for in-memory filtering
+
+    cache = QResultCache(maxsize=256, time_tolerance=timedelta(seconds=30))
+    delivered = filter_by_q(orders, OrderQuerySet.is_delivered.q(), cache=cache, version=orders_version)
+
+Results are keyed by the fingerprint of the Q object (see qtools.serialize), the lookup adapter and a version token for the collection. The
+version token is either passed in explicitly or read from a `version` attribute on the collection (a TableMirror has
+one). Whoever owns the collection is responsible for changing the token when the collection or its objects change.
+Without a version token nothing is cached.
+
+When a filter_by_q result isn't cached, the smallest cached result for the same collection and version whose Q
+object is implied by the new one (see qtools.analysis.q_implies) is filtered instead of the whole collection:
+
+    everything = filter_by_q(orders, OrderQuerySet.cost_between.q(0, 1000), cache=cache, version=orders_version)
+    some = filter_by_q(orders, OrderQuerySet.cost_between.q(100, 500), cache=cache, version=orders_version)
+
+Q objects holding datetimes are usually built from `timezone.now()`, so they never compare equal twice. They are only
+cached when `time_tolerance` is set: datetimes are rounded down to the tolerance when building the key and the entry
+expires once it is older than the tolerance.
+"""
+import datetime
+import threading
+import time
+from collections import namedtuple, OrderedDict
+
+from django.db import models
+from django.db.models.query import QuerySet
+from django.utils import timezone
+
+from .analysis import q_implies
+from .filterq import filter_by_q, get_common_model, obj_matches_q
+from .lookups import get_lookup_adapter
+from .planner import Unknown
+from .serialize import QSerializer, fingerprint_q
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class UncacheableQ(Exception):
+    """The Q object holds values that can't be used in a cache key"""
+    pass
+
+
+class QResultCache(object):
+    def __init__(self, maxsize=128, time_tolerance=None):
+        if isinstance(time_tolerance, datetime.timedelta):
+            time_tolerance = time_tolerance.total_seconds()
+
+        self.maxsize = maxsize
+        self.time_tolerance = time_tolerance
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def filter_by_q(self, objs, q, lookup_adapter=None, version=None, using=None, missing='load', model=None):
+        result = self._get_or_compute(objs, q, lookup_adapter, version, using, filter_by_q, missing=missing, model=model)
+        return list(result)
+
+    def obj_matches_q(self, obj, q, lookup_adapter=None, version=None, using=None, missing='load', model=None):
+        return self._get_or_compute(obj, q, lookup_adapter, version, using, obj_matches_q, missing=missing, model=model)
+
+    def info(self):
+        with self._lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _get_or_compute(self, target, q, lookup_adapter, version, using, compute, missing, model):
+        if version is None:
+            version = getattr(target, 'version', None)
+
+        key = None
+        if version is not None:
+            try:
+                q_key, is_time_dependent = q_cache_key(q, self.time_tolerance)
+            except UncacheableQ:
+                pass
+            else:
+                if not is_time_dependent or self.time_tolerance is not None:
+                    key = compute.__name__, id(target), version, get_lookup_adapter(lookup_adapter, using=using), using, model, q_key
+
+        if key is None:
+            with self._lock:
+                self.misses += 1
+            return compute(target, q, lookup_adapter=lookup_adapter, using=using, missing=missing, model=model)
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and self._is_fresh(entry, target):
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        source = target
+        if compute is filter_by_q:
+            source = self._find_superset(key, q, target, model)
+        result = compute(source, q, lookup_adapter=lookup_adapter, using=using, missing=missing, model=model)
+        if isinstance(result, Unknown):
+            # the result changes as soon as the missing data is loaded
+            return result
+
+        with self._lock:
+            # the target is kept in the entry so its id can't be reused by a different object while cached
+            expires = time.time() + self.time_tolerance if is_time_dependent else None
+            self._entries[key] = (target, result, expires, q)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return result
+
+    def _find_superset(self, key, q, target, model):
+        """
+        Returns the smallest cached result for the collection whose Q object is implied by q, or the collection
+
+        Every object of the collection matching q is in that result, so filtering it gives the same answer.
+        """
+        with self._lock:
+            candidates = [entry for entry_key, entry in self._entries.items()
+                          if entry_key[:-1] == key[:-1] and self._is_fresh(entry, target)]
+        if not candidates:
+            return target
+
+        model = model or get_common_model(target)
+        for cached_target, result, expires, cached_q in sorted(candidates, key=lambda entry: len(entry[1])):
+            if q_implies(q, cached_q, model):
+                return result
+        return target
+
+    def _is_fresh(self, entry, target):
+        cached_target, result, expires, q = entry
+        if cached_target is not target:
+            return False
+        if expires is not None and time.time() > expires:
+            return False
+        return True
+
+
+class _CacheKeySerializer(QSerializer):
+    """Serializes Q objects for cache keys without running queries"""
+    def __init__(self, time_tolerance=None):
+        self.time_tolerance = time_tolerance
+        self.is_time_dependent = False
+
+    def encode_value(self, value):
+        if isinstance(value, datetime.datetime):
+            self.is_time_dependent = True
+            if self.time_tolerance:
+                if timezone.is_aware(value):
+                    value = timezone.make_naive(value, timezone.utc)
+                seconds = (value - _EPOCH).total_seconds()
+                return {'$datetime_bucket': int(seconds // self.time_tolerance)}
+        if isinstance(value, models.Model) and value.pk is None:
+            raise UncacheableQ('Unsaved model instances cannot be used in a cache key.')
+        if isinstance(value, QuerySet):
+            raise UncacheableQ('QuerySet values may change without the collection version changing.')
+
+        try:
+            return super(_CacheKeySerializer, self).encode_value(value)
+        except ValueError as e:
+            raise UncacheableQ(str(e))
+
+
+def q_cache_key(q, time_tolerance=None):
+    """
+    Returns the fingerprint of the Q object to use in a cache key
+
+    Also returns whether the Q object depends on the current time (holds datetimes). When a tolerance is given,
+    datetimes are rounded down to it.
+    """
+    serializer = _CacheKeySerializer(time_tolerance)
+    key = fingerprint_q(q, serializer=serializer)
+    return key, serializer.is_time_dependent
@@ -0,0 +1,225 @@
+"""
+Compiling Q objects to python source
+
+For the few Q objects evaluated over and over, compile_q writes the Q object as a single python function:
+
+    is_big_and_cheap = compile_q(Pizza, Q(diameter__gt=12) & ~Q(order__price__gt=20))
+    matching = is_big_and_cheap.filter(pizzas)
+    print(is_big_and_cheap.source)
+
+which reads
+
+    def match(obj):
+        return _k0(obj.diameter) and not (_leaf1(obj))
+
+The local fields of the model are read directly from the object, foreign keys from their `_id` attribute. Their
+lookup kernels are compiled once with the filter value prepared, and bound to the function with the normalization of
+the object value. AND, OR and negation are python's short-circuiting `and`, `or` and `not`. Leaves that traverse
+relations or compare with a QuerySet are bound as calls to the regular evaluation of the leaf. A Q object using F()
+expressions is evaluated the regular way as a whole, the source says so.
+
+The lookups behave like the database the adapter is picked for at compile time, `lookup_adapter` or `using`, instead of
+the database each object was loaded from. Compiled functions are cached per model, fingerprint of the Q object (see
+qtools.serialize), adapter and database. Q objects with QuerySet or F() values are compiled every time.
+`compiled_q_cache()` lists the cached functions, and the source of the cached ones shows up in tracebacks.
+"""
+import linecache
+import threading
+from collections import OrderedDict
+
+from django.db import models
+from django.db.models.query import QuerySet
+from django.db.models.query_utils import Q
+
+from .analysis import is_satisfiable
+from .expressions import is_expression
+from .filterq import compile_leaf, get_key_attname, get_model_field, obj_matches_leaf, obj_matches_q, \
+    process_filter_statement
+from .lookups import get_lookup_adapter
+from .serialize import fingerprint_q
+from .session import evaluation_session
+
+CODEGEN_CACHE_SIZE = 256
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+_counter = [0]
+
+
+class CompiledQ(object):
+    def __init__(self, model, q, adapter, using, source, func, filename):
+        self.model = model
+        self.q = q
+        self.adapter = adapter
+        self.using = using
+        self.source = source
+        self.func = func
+        self.filename = filename
+
+    def __call__(self, obj):
+        return self.func(obj)
+
+    def filter(self, objs):
+        """Returns the objs that match, in one evaluation session"""
+        func = self.func
+        with evaluation_session():
+            return [obj for obj in objs if func(obj)]
+
+    def __repr__(self):
+        return '<CompiledQ %s %s %s>' % (self.model.__name__, self.adapter.__name__, self.q)
+
+
+def compile_q(model, q, lookup_adapter=None, using=None):
+    """Returns a CompiledQ that evaluates the Q object for objects of `model`, from the cache when possible"""
+    adapter = get_lookup_adapter(lookup_adapter, using=using)
+    try:
+        key = (model, fingerprint_q(q), adapter, using) if _is_cacheable(q) else None
+    except ValueError:
+        # a value that can't be serialized
+        key = None
+    if key is None:
+        return generate_compiled_q(model, q, adapter, using)
+
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled[key] = _compiled.pop(key)
+            return compiled
+
+    compiled = generate_compiled_q(model, q, adapter, using)
+    with _compiled_lock:
+        if key in _compiled:
+            # compiled by another thread meanwhile
+            return _compiled[key]
+        _compiled[key] = compiled
+        # so tracebacks show the generated lines, for as long as the function is cached
+        linecache.cache[compiled.filename] = (len(compiled.source), None, compiled.source.splitlines(True),
+                                              compiled.filename)
+        while len(_compiled) > CODEGEN_CACHE_SIZE:
+            _, evicted = _compiled.popitem(last=False)
+            linecache.cache.pop(evicted.filename, None)
+    return compiled
+
+
+def compiled_q_cache():
+    """Returns the cached CompiledQs, least recently used first"""
+    with _compiled_lock:
+        return list(_compiled.values())
+
+
+def clear_compiled_q_cache():
+    with _compiled_lock:
+        for compiled in _compiled.values():
+            linecache.cache.pop(compiled.filename, None)
+        _compiled.clear()
+
+
+def generate_compiled_q(model, q, adapter, using=None):
+    """Writes the source of the function evaluating the Q object and compiles it"""
+    namespace = {}
+    if not is_satisfiable(q, model):
+        expression = 'False'
+    elif _has_expressions(q):
+        namespace['_match_q'] = lambda obj: obj_matches_q(obj, q, lookup_adapter=adapter, using=using)
+        expression = '_match_q(obj)  # F() expressions are evaluated by obj_matches_q'
+    else:
+        expression = _generate_node(model, q, adapter, using, namespace)
+
+    source = 'def match(obj):\n    return %s\n' % expression
+    with _compiled_lock:
+        _counter[0] += 1
+        filename = '<qtools compiled q %s>' % _counter[0]
+    exec(compile(source, filename, 'exec'), namespace)
+    return CompiledQ(model, q, adapter, using, source, namespace['match'], filename)
+
+
+def _generate_node(model, q, adapter, using, namespace):
+    is_and = q.connector == q.AND
+    parts = []
+    for child in q.children:
+        if isinstance(child, Q):
+            expression = _generate_node(model, child, adapter, using, namespace)
+            # `not` binds tighter than `and` and `or`
+            if len(q.children) > 1 and _is_compound(child):
+                expression = '(%s)' % expression
+            parts.append(expression)
+        else:
+            parts.append(_generate_leaf(model, child[0], child[1], adapter, using, namespace))
+
+    if not parts:
+        expression = 'True' if is_and else 'False'
+    else:
+        expression = (' and ' if is_and else ' or ').join(parts)
+    if q.negated:
+        expression = 'not (%s)' % expression
+    return expression
+
+
+def _generate_leaf(model, filter_statement, filter_value, adapter, using, namespace):
+    name = '%s' % len(namespace)
+    attname = _get_local_attname(model, filter_statement, filter_value)
+    if attname is None:
+        namespace['_leaf' + name] = lambda obj: obj_matches_leaf(obj, filter_statement, filter_value, adapter, using)
+        return '_leaf%s(obj)' % name
+
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    leaf = compile_leaf(model, next_token, filter_statement, filter_value, remaining_statement_parts[-1], adapter,
+                        using)
+    if leaf is None:
+        # the filter is a no-op
+        return 'True'
+
+    namespace['_k' + name] = leaf.kernel
+    normalization = adapter.get_obj_value_normalization(leaf.lookup)
+    if normalization is None:
+        return '_k%s(obj.%s)' % (name, attname)
+
+    namespace['_normalize'] = adapter.normalize_obj_value
+    return '_k%s(_normalize(%r, obj.%s, %r))' % (name, str(normalization), attname, str(leaf.simple_type))
+
+
+def _get_local_attname(model, filter_statement, filter_value):
+    """Returns the attribute holding the value the leaf compares, None when it isn't a local field"""
+    if isinstance(filter_value, QuerySet):
+        return None
+
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    if len(remaining_statement_parts) != 1:
+        return None
+
+    field = get_model_field(model, next_token)
+    if field not in model._meta.concrete_fields:
+        return None
+    if isinstance(field, models.ForeignKey):
+        # None when the leaf compares the related pk and the attribute holds another field
+        return get_key_attname(field)
+    return field.attname
+
+
+def _is_compound(q):
+    """Returns True when the expression of the Q object joins several parts with `and` or `or`"""
+    if q.negated:
+        return False
+    if len(q.children) == 1 and isinstance(q.children[0], Q):
+        return _is_compound(q.children[0])
+    return len(q.children) > 1
+
+
+def _has_expressions(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            if _has_expressions(child):
+                return True
+        elif is_expression(child[1]):
+            return True
+    return False
+
+
+def _is_cacheable(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            if not _is_cacheable(child):
+                return False
+        elif isinstance(child[1], QuerySet) or is_expression(child[1]):
+            return False
+    return True
@@ -4,24 +4,40 @@ from functools import partial
 
 from django.utils import six
 from django.db.models import Q
+from qtools.analysis import is_satisfiable
 from qtools.filterq import obj_matches_q
 
+try:
+    from django.db.models import BooleanField, Case, Value, When
+except ImportError:
+    # django 1.7
+    Case = None
+
+# evaluate_flags stores the results of the descriptors in this attribute of the instance
+FLAGS_ATTR = '_qtools_flags'
+
 
 class QToMethodDescriptor(object):
-    def __init__(self, _q_func, is_property=False, execute_in_memory=False):
+    def __init__(self, _q_func, is_property=False, execute_in_memory=False, missing='load'):
         self._q_func = _q_func
         self._is_property = is_property
         self._execute_in_memory = execute_in_memory
+        self._missing = missing
 
     def _execute(self, model_cls, model_instance, q):
         if self._execute_in_memory:
-            return obj_matches_q(model_instance, q)
+            return obj_matches_q(model_instance, q, missing=self._missing)
+        elif not is_satisfiable(q, model_cls):
+            return False
         else:
             return model_cls.objects.filter(q).filter(pk=model_instance.pk).exists()
 
     def __get__(self, instance, owner):
         if instance:
             if self._is_property:
+                flags = instance.__dict__.get(FLAGS_ATTR)
+                if flags and self in flags:
+                    return flags[self]
                 q = self._q_func()
                 return self._execute(owner, instance, q)
             else:
@@ -33,9 +49,82 @@ class QToMethodDescriptor(object):
             return self
 
 
+class AsyncQToMethodDescriptor(QToMethodDescriptor):
+    """Like QToMethodDescriptor, but returns awaitables. See qtools.aio (python 3.5+)."""
+    def _execute(self, model_cls, model_instance, q):
+        from qtools import aio
+        if self._execute_in_memory and self._missing == 'load':
+            return aio.aobj_matches_q(model_instance, q)
+        else:
+            return aio.run_in_thread(super(AsyncQToMethodDescriptor, self)._execute, model_cls, model_instance, q)
+
+
+def evaluate_flags(instance, names):
+    """
+    Evaluates the as_property() descriptors named in `names` for the instance, with at most one query
+
+    Returns a dict of the results by name. The descriptors that run in the database are checked together in a single
+    query, the others in memory. The results are also stored on the instance, reading the properties afterwards
+    returns them without evaluating again. Reload the instance or call clear_flags(instance) to evaluate again.
+    """
+    model = type(instance)
+    descriptors = [(name, _get_flag_descriptor(model, name)) for name in names]
+
+    results = {}
+    in_db = []
+    for name, descriptor in descriptors:
+        q = descriptor._q_func()
+        if descriptor._execute_in_memory or not is_satisfiable(q, model):
+            results[name] = descriptor._execute(model, instance, q)
+        else:
+            in_db.append((name, q))
+
+    manager = model._default_manager.db_manager(instance._state.db)
+    if in_db and Case is None:
+        for name, q in in_db:
+            results[name] = manager.filter(q).filter(pk=instance.pk).exists()
+    elif in_db:
+        # a subquery per flag keeps the semantics of filter(q) for multi-valued relations and excluded filters
+        annotations = dict(
+            ('_qtools_flag_%s' % i, Case(
+                When(pk__in=manager.filter(q).values('pk'), then=Value(True)),
+                default=Value(False), output_field=BooleanField()
+            )) for i, (name, q) in enumerate(in_db)
+        )
+        qs = manager.filter(pk=instance.pk)
+        row = qs.annotate(**annotations).values(*annotations).first() or {}
+        for i, (name, q) in enumerate(in_db):
+            results[name] = bool(row.get('_qtools_flag_%s' % i, False))
+
+    flags = instance.__dict__.setdefault(FLAGS_ATTR, {})
+    for name, descriptor in descriptors:
+        flags[descriptor] = results[name]
+    return results
+
+
+def clear_flags(instance):
+    """Forgets the results evaluate_flags stored on the instance"""
+    instance.__dict__.pop(FLAGS_ATTR, None)
+
+
+def _get_flag_descriptor(model, name):
+    descriptor = None
+    for klass in model.__mro__:
+        if name in vars(klass):
+            descriptor = vars(klass)[name]
+            break
+
+    if not isinstance(descriptor, QToMethodDescriptor) or isinstance(descriptor, AsyncQToMethodDescriptor) \
+            or not descriptor._is_property:
+        raise ValueError('%s.%s is not a q_method as_property() descriptor' % (model.__name__, name))
+    return descriptor
+
+
 def _create_qs_instance_method(q_func, qs):
     def qs_func(*args, **kwargs):
         q = q_func(*args, **kwargs)
+        if not is_satisfiable(q, qs.model):
+            return qs.none()
         return qs.filter(q)
     qs_func.q = q_func
     return qs_func
@@ -55,6 +144,8 @@ def _create_qs_class_method(q_func, qs_class):
     qs_func.q = q_func
     qs_func.as_method = lambda **kwargs: QToMethodDescriptor(q_func, is_property=False, **kwargs)
     qs_func.as_property = lambda **kwargs: QToMethodDescriptor(q_func, is_property=True, **kwargs)
+    qs_func.as_async_method = lambda **kwargs: AsyncQToMethodDescriptor(q_func, is_property=False, **kwargs)
+    qs_func.as_async_property = lambda **kwargs: AsyncQToMethodDescriptor(q_func, is_property=True, **kwargs)
     if six.PY2:
         qs_func = types.MethodType(qs_func, qs_class, qs_class)
     return qs_func
@@ -94,6 +185,7 @@ class q_method(object):
             if not isinstance(q, Q):
                 raise ValueError('QuerySet methods decorated with q_method must return a Q object.')
             return q
+        q_func.fn = self.fn
 
         if instance is not None:
             return _create_qs_instance_method(q_func, instance)
@@ -0,0 +1,170 @@
+"""
+Reports on how a Q object is evaluated, in memory and in the database
+
+    print(explain_q(Pizza, PizzaQuerySet.is_delivered.q(), objs=pizzas))
+
+For each leaf of the Q object the report has the resolved field path, the simple datatype of the field, the lookup
+function and adapter that evaluate it in memory, and the relations it traverses. Relations are `forward` (foreign
+keys and one to ones), `reverse` or `m2m`, and with `objs` the report counts on how many objects each one is
+loaded. It estimates the queries evaluating the Q object in memory would run and shows the SQL of
+`model.objects.filter(q)`, to help choose between `execute_in_memory` and the database for a call site.
+"""
+from collections import namedtuple
+
+from django.db import models
+from django.db.models.query import QuerySet
+from django.db.models.query_utils import Q
+
+from .expressions import is_expression
+from .filterq import compile_leaf, get_model_attribute_values_by_db_name, process_filter_statement
+from .lookups import get_lookup_adapter
+from .planner import is_field_loaded
+from .rows import get_path_fields
+from .utils import get_field_simple_datatype, get_related_model, RELATED_FIELD_CLASSES
+
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:
+    # django < 1.11
+    from django.db.models.sql.datastructures import EmptyResultSet
+
+LeafExplanation = namedtuple('LeafExplanation', ['filter_statement', 'field_path', 'simple_type', 'lookup',
+                                                 'lookup_function', 'adapter', 'relations'])
+
+# `loaded` is a (loaded, total) pair counting the objects the relation is read from, None without objects
+RelationHop = namedtuple('RelationHop', ['path', 'kind', 'model', 'loaded'])
+
+
+class QExplanation(object):
+    def __init__(self, model, q, leaves, estimated_queries, sql):
+        self.model = model
+        self.q = q
+        self.leaves = leaves
+        self.estimated_queries = estimated_queries
+        self.sql = sql
+
+    def __str__(self):
+        lines = ['%s.objects.filter(%s)' % (self.model.__name__, self.q)]
+        for leaf in self.leaves:
+            lines.append('  %s: %s %s, %s via %s.%s' % (
+                leaf.filter_statement, leaf.field_path, leaf.simple_type, leaf.lookup, leaf.adapter.__name__,
+                leaf.lookup_function
+            ))
+            for hop in leaf.relations:
+                loaded = '' if hop.loaded is None else ', loaded on %s of %s' % hop.loaded
+                lines.append('    %s: %s %s%s' % (hop.path, hop.kind, hop.model.__name__, loaded))
+        lines.append('in memory: about %s queries' % self.estimated_queries)
+        lines.append('sql: %s' % (self.sql if self.sql is not None else 'no query, the filter matches nothing'))
+        return '\n'.join(lines)
+
+
+def explain_q(model, q, objs=None, using=None):
+    """
+    Returns a QExplanation of evaluating the Q object for `model`
+
+    With `objs`, the relations are checked on them and `estimated_queries` counts the lazy loads evaluating the Q
+    object over them would run. Without, it is the estimate for one object loaded without its relations. It is a
+    lower bound, relations loaded lazily are counted once per object they are read from.
+    """
+    adapter = get_lookup_adapter(using=using)
+    objs = list(objs) if objs is not None else None
+
+    leaves = []
+    missing = set()
+    for filter_statement, filter_value in _iter_leaves(q):
+        leaves.append(explain_leaf(model, filter_statement, filter_value, adapter, objs, using))
+        next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+        path = [next_token] + remaining_statement_parts[:-1]
+        for obj in objs if objs is not None else [None]:
+            _collect_missing(model, obj, path, (id(obj),), missing)
+        if isinstance(filter_value, QuerySet):
+            # evaluated once per call
+            missing.add(('queryset', id(filter_value)))
+
+    try:
+        sql = str(model._default_manager.filter(q).query)
+    except EmptyResultSet:
+        sql = None
+
+    return QExplanation(model, q, leaves, len(missing), sql)
+
+
+def explain_leaf(model, filter_statement, filter_value, adapter, objs=None, using=None):
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    path = [next_token] + remaining_statement_parts[:-1]
+    lookup = remaining_statement_parts[-1]
+    field_model, fields = get_path_fields(model, path)
+    field_path = '__'.join(field.name if name == 'pk' else name for name, field in zip(path, fields))
+
+    simple_type = get_field_simple_datatype(fields[-1], using)
+    if not isinstance(filter_value, QuerySet) and not is_expression(filter_value):
+        field_statement = '__'.join(filter_statement.split('__')[len(path) - 1:])
+        leaf = compile_leaf(field_model, path[-1], field_statement, filter_value, lookup, adapter, using)
+        if leaf is not None:
+            simple_type, lookup = leaf.simple_type, leaf.lookup
+
+    lookup_function = adapter.get_lookup_function(lookup).__name__
+    relations = _explain_relations(model, path, fields, objs)
+    return LeafExplanation(filter_statement, field_path, simple_type, lookup, lookup_function, adapter, relations)
+
+
+def get_relation_kind(field):
+    """Returns 'forward', 'reverse' or 'm2m' for a relation field, None for other fields"""
+    if isinstance(field, RELATED_FIELD_CLASSES):
+        return 'm2m' if isinstance(field.field, models.ManyToManyField) else 'reverse'
+    if isinstance(field, models.ManyToManyField):
+        return 'm2m'
+    if getattr(field, 'rel', None) is not None:
+        return 'forward'
+    return None
+
+
+def _explain_relations(model, path, fields, objs):
+    hops = []
+    current = objs
+    for i, (name, field) in enumerate(zip(path, fields)):
+        kind = get_relation_kind(field)
+        if kind is None:
+            break
+
+        loaded = None
+        if current is not None:
+            loaded_objs = [obj for obj in current if is_field_loaded(obj, name)]
+            loaded = (len(loaded_objs), len(current))
+            current = [related for obj in loaded_objs for related in get_model_attribute_values_by_db_name(obj, name)
+                       if isinstance(related, models.Model)]
+        hops.append(RelationHop('__'.join(path[:i + 1]), kind, get_related_model(field), loaded))
+    return hops
+
+
+def _collect_missing(model, obj, path, key, missing):
+    """Adds a key to `missing` for every lazy load reading the path from obj would run, None is an unloaded obj"""
+    name = path[0]
+    field = get_path_fields(model, [name])[1][0]
+    if obj is not None and not is_field_loaded(obj, name):
+        # a deferred field, or a relation that isn't cached
+        missing.add(key + (name,))
+        obj = None
+    elif obj is None and get_relation_kind(field) is not None:
+        missing.add(key + (name,))
+
+    if len(path) == 1 or get_relation_kind(field) is None:
+        return
+
+    related_model = get_related_model(field)
+    if obj is None:
+        _collect_missing(related_model, None, path[1:], key + (name,), missing)
+        return
+
+    for related in get_model_attribute_values_by_db_name(obj, name):
+        if isinstance(related, models.Model):
+            _collect_missing(related_model, related, path[1:], (id(related),), missing)
+
+
+def _iter_leaves(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            for leaf in _iter_leaves(child):
+                yield leaf
+        else:
+            yield child
@@ -0,0 +1,105 @@
+"""
+Evaluating F() expressions in memory
+
+    obj_matches_q(order, Q(delivered_time__gt=F('created')))
+    obj_matches_q(misc, Q(integer__gte=F('foreign__integer') * 2))
+
+F() references are read from the object being filtered, following relations like a filter statement does.
+Arithmetic (+, -, *, /, %, ^) is done by the lookup adapter, so integer division, division by zero and NULL follow
+the database. A reference through a multi-valued relation stands for each of its values, like the join the
+database makes, and the leaf matches if any of them do. The resulting value is then compared like any other filter
+value.
+"""
+import itertools
+from decimal import Decimal
+
+from django.db.models.expressions import F
+from django.utils import six
+
+try:
+    from django.db.models.expressions import CombinedExpression, Value
+except ImportError:
+    # django 1.7, where arithmetic on F() builds ExpressionNodes with two children
+    from django.db.models.expressions import ExpressionNode as CombinedExpression
+    Value = None
+
+
+def is_expression(value):
+    """Returns True if the filter value is an F() reference or arithmetic on one"""
+    return isinstance(value, (F, CombinedExpression))
+
+
+def get_expression_paths(expression):
+    """Returns the field paths the F() references of the expression read"""
+    if isinstance(expression, F):
+        return [expression.name]
+
+    paths = []
+    for operand in _get_operands(expression):
+        paths.extend(p for p in get_expression_paths(operand) if p not in paths)
+    return paths
+
+
+def evaluate_expression(expression, get_path_values, lookup_adapter):
+    """
+    Returns the possible values of the expression
+
+    `get_path_values(path)` returns the values of a field path, [None] when there are none. There is one value per
+    combination of the values of the F() references.
+    """
+    paths = get_expression_paths(expression)
+    values_per_path = [get_path_values(path) or [None] for path in paths]
+
+    results = []
+    for values in itertools.product(*values_per_path):
+        results.append(_evaluate(expression, dict(zip(paths, values)), lookup_adapter))
+    return results
+
+
+def combine_values(connector, lhs, rhs):
+    """Applies an arithmetic connector like python does, returning None when either side is None"""
+    if lhs is None or rhs is None:
+        return None
+
+    if isinstance(lhs, Decimal) and isinstance(rhs, float):
+        rhs = Decimal(repr(rhs))
+    elif isinstance(rhs, Decimal) and isinstance(lhs, float):
+        lhs = Decimal(repr(lhs))
+
+    try:
+        if connector == '+':
+            return lhs + rhs
+        if connector == '-':
+            return lhs - rhs
+        if connector == '*':
+            return lhs * rhs
+        if connector == '/':
+            return lhs / rhs
+        if connector == '%%':
+            return lhs % rhs
+        if connector == '^':
+            return lhs ** rhs
+    except ZeroDivisionError:
+        return None
+    raise ValueError("The %s operator can't be evaluated in memory" % connector)
+
+
+def _evaluate(expression, values, lookup_adapter):
+    if isinstance(expression, F):
+        return values[expression.name]
+    if Value is not None and isinstance(expression, Value):
+        return expression.value
+    if isinstance(expression, CombinedExpression):
+        lhs, rhs = [_evaluate(operand, values, lookup_adapter) for operand in _get_operands(expression)]
+        return lookup_adapter.combine_values(expression.connector, lhs, rhs)
+    if isinstance(expression, six.integer_types + (float, Decimal)) or hasattr(expression, 'total_seconds'):
+        return expression
+    raise ValueError("%r can't be evaluated in memory" % (expression,))
+
+
+def _get_operands(expression):
+    if isinstance(expression, F):
+        return []
+    if hasattr(expression, 'lhs'):
+        return [expression.lhs, expression.rhs]
+    return list(getattr(expression, 'children', []))
@@ -1,3 +1,5 @@
+from collections import namedtuple
+
 # from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 from django.db.models.fields import FieldDoesNotExist
@@ -6,49 +8,186 @@ from django.db.models.query_utils import Q
 from django.utils import six
 
 from .exceptions import NoOpFilterException
+from .expressions import evaluate_expression, is_expression
 from .lookups import get_lookup_adapter
+from .session import evaluation_session, get_current_session
 from .utils import assert_is_valid_lookup_for_field, django_instances_to_keys, get_field_simple_datatype, RELATED_FIELD_CLASSES
 
 
-def filter_by_q(objs, q, lookup_adapter=None):
-    """Filters a collection of objects by a Q object"""
-    return [obj for obj in objs if obj_matches_q(obj, q)]
+CompiledLeaf = namedtuple('CompiledLeaf', ['lookup', 'simple_type', 'kernel'])
+
+
+MISSING_MODES = ('load', 'query', 'unknown')
+
+
+def filter_by_q(objs, q, lookup_adapter=None, cache=None, version=None, using=None, missing='load', model=None,
+                project=False):
+    """
+    Filters a collection of objects by a Q object
+
+    Lookups behave like they would in the database the objects were loaded from (`obj._state.db`). Pass `using` to
+    pick the database alias or `lookup_adapter` to pick the lookup semantics explicitly.
+
+    Fields and relations that aren't loaded are loaded lazily. With `missing='query'`, the objects that can't be
+    decided from loaded data are checked with a single query instead. See qtools.planner.
+
+    Pass `model` to filter values() rows, dicts or named tuples, of that model instead of model instances. See
+    qtools.rows. `missing` doesn't apply to rows.
+
+    With `project=True`, an unevaluated QuerySet only loads the fields and relations the Q object reads, the other
+    fields of the returned objects are deferred. See qtools.projection.
+
+    Returns an empty list without evaluating anything when the Q object can never match. See qtools.analysis.
+
+    Pass a QResultCache as `cache` to reuse results. See qtools.cache for how `version` is used.
+    """
+    check_missing_mode(missing)
+    if missing == 'unknown':
+        raise ValueError("filter_by_q can't leave results unknown, use missing='load' or missing='query'")
+    from .analysis import is_satisfiable
+    if not is_satisfiable(q, model or get_common_model(objs)):
+        return []
+
+    if cache is not None:
+        return cache.filter_by_q(objs, q, lookup_adapter=lookup_adapter, version=version, using=using, missing=missing,
+                                 model=model)
+
+    if model is not None:
+        from .rows import filter_rows_by_q
+        return filter_rows_by_q(objs, q, model, lookup_adapter=lookup_adapter, using=using)
+
+    if project and isinstance(objs, QuerySet):
+        from .projection import project_queryset
+        objs = project_queryset(objs, q)
+
+    if missing == 'query':
+        from .planner import planned_matches
+        objs = list(objs)
+        matches = planned_matches(objs, q, lookup_adapter=lookup_adapter, using=using)
+        return [obj for obj, obj_matches in zip(objs, matches) if obj_matches]
+
+    with evaluation_session():
+        return [obj for obj in objs if obj_matches_q(obj, q, lookup_adapter=lookup_adapter, using=using)]
+
+
+def obj_matches_q(obj, q, lookup_adapter=None, cache=None, version=None, using=None, missing='load', model=None):
+    """
+    Returns True if obj matches the Q object. See filter_by_q for the arguments.
+
+    With `missing='unknown'` nothing is loaded. UNKNOWN is returned when the result depends on data that isn't loaded,
+    with the paths of the missing fields in its `missing_fields`. See qtools.planner.
+    """
+    check_missing_mode(missing)
+    if cache is not None:
+        return cache.obj_matches_q(obj, q, lookup_adapter=lookup_adapter, version=version, using=using, missing=missing,
+                                   model=model)
 
+    if model is not None:
+        from .rows import row_matches_q
+        return row_matches_q(obj, q, model, lookup_adapter=lookup_adapter, using=using)
 
-def obj_matches_q(obj, q, lookup_adapter=None):
-    """Returns True if obj matches the Q object"""
+    if missing == 'query':
+        from .planner import planned_matches
+        return planned_matches([obj], q, lookup_adapter=lookup_adapter, using=using)[0]
 
-    does_it_match = q.connector == q.AND
+    if missing == 'unknown':
+        from .planner import partial_obj_matches_q
+        with evaluation_session():
+            return partial_obj_matches_q(obj, q, lookup_adapter, using)
+
+    with evaluation_session():
+        return bool(_obj_matches_q(obj, q, lookup_adapter, using))
+
+
+def check_missing_mode(missing):
+    if missing not in MISSING_MODES:
+        raise ValueError('missing must be one of %s, not %r' % (', '.join(MISSING_MODES), missing))
+
+
+def _obj_matches_q(obj, q, lookup_adapter, using):
+    is_and = q.connector == q.AND
+    does_it_match = is_and
+    is_unknown = False
     for child in q.children:
         if isinstance(child, Q):
-            r = obj_matches_q(obj, child)
+            r = _obj_matches_q(obj, child, lookup_adapter, using)
         else:
             filter_statement, value = child
-            r = obj_matches_filter_statement(obj, filter_statement, value, lookup_adapter)
+            r = obj_matches_leaf(obj, filter_statement, value, lookup_adapter, using)
 
-        if q.connector == q.AND and not r:
+        if r is None:
+            # compared with NULL, decided by the other children like in SQL
+            is_unknown = True
+        elif is_and and not r:
             does_it_match = False
             break
-        elif q.connector == q.OR and r:
+        elif not is_and and r:
             does_it_match = True
             break
+    else:
+        if is_unknown:
+            does_it_match = None
 
-    if q.negated:
+    if q.negated and does_it_match is not None:
         does_it_match = not does_it_match
 
     return does_it_match
 
 
+def obj_matches_leaf(obj, filter_statement, filter_value, lookup_adapter=None, using=None):
+    """
+    Returns True if the obj matches a leaf of a Q object
+
+    F() expressions in the filter value are evaluated against obj first. When they all evaluate to NULL and the field
+    isn't NULL the result is None, unknown like the comparison in SQL, so that negating it doesn't match either.
+    """
+    if not is_expression(filter_value):
+        return bool(obj_matches_filter_statement(obj, filter_statement, filter_value, lookup_adapter, using))
+
+    adapter = get_lookup_adapter(lookup_adapter, using=using or get_obj_db(obj))
+    values = [v for v in evaluate_expression(filter_value, lambda path: get_path_values(obj, path), adapter)
+              if v is not None]
+    for value in values:
+        if obj_matches_filter_statement(obj, filter_statement, value, lookup_adapter, using):
+            return True
+    if values:
+        return False
+
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    field_path = '__'.join([next_token] + remaining_statement_parts[:-1])
+    # django negates the filter with `OR field IS NULL`
+    return None if any(v is not None for v in get_path_values(obj, field_path)) else False
+
+
+def get_path_values(obj, path):
+    """Returns the values of a field path like `order__price` on obj, related objects are returned as their keys"""
+    objs = [obj]
+    for name in path.split('__'):
+        objs = [value for o in objs if o is not None for value in get_model_attribute_values_by_db_name(o, name)]
+    return django_instances_to_keys(*objs)
+
+
 def get_model_attribute_values_by_db_name(obj, name, lookup_adapter=None):
     """
     Get the model instance attribute value
 
     Handles traversing relationships as well as simple attributes.
 
-    Always returns a collection of values.
+    Always returns a collection of values. Related objects are read once per object and relation in the current
+    evaluation session, however many leaves of the Q object traverse the relation.
     """
-    model = type(obj)
     field = get_obj_field(obj, name)
+    session = get_current_session()
+    is_relation = isinstance(field, RELATED_FIELD_CLASSES) or getattr(field, 'rel', None) is not None
+    if session is None or not is_relation:
+        return _get_model_attribute_values(obj, name, field)
+
+    key = ('relation', id(obj), name)
+    return session.memoize(key, obj, lambda: _get_model_attribute_values(obj, name, field))
+
+
+def _get_model_attribute_values(obj, name, field):
+    model = type(obj)
     if isinstance(field, RELATED_FIELD_CLASSES):
         accessor_name = field.get_accessor_name()
         try:
@@ -60,6 +199,8 @@ def get_model_attribute_values_by_db_name(obj, name, lookup_adapter=None):
             return list(manager_or_obj.all())
         else:
             return [manager_or_obj]
+    elif isinstance(field, models.ManyToManyField):
+        return list(getattr(obj, name).all())
     else:
         try:
             return [getattr(obj, name)]
@@ -67,58 +208,183 @@ def get_model_attribute_values_by_db_name(obj, name, lookup_adapter=None):
             return []
 
 
+def get_normalized_obj_values(obj, name, lookup_adapter, lookup, simple_type):
+    """
+    Get the model instance attribute values in the form the lookup compares them
+
+    Reuses the values normalized earlier in the current evaluation session, keyed by (object identity, field,
+    normalization kind).
+    """
+    normalization = lookup_adapter.get_obj_value_normalization(lookup)
+
+    def compute():
+        attname = get_key_attname(get_obj_field(obj, name))
+        if attname is not None:
+            # the related object is compared by the key the object holds
+            obj_values = [getattr(obj, attname)]
+        else:
+            obj_values = django_instances_to_keys(*get_model_attribute_values_by_db_name(obj, name))
+        return [lookup_adapter.normalize_obj_value(normalization, v, simple_type) for v in obj_values]
+
+    session = get_current_session()
+    if session is None:
+        return compute()
+    key = ('obj_values', id(obj), name, lookup_adapter, normalization, simple_type)
+    return session.memoize(key, obj, compute)
+
+
+def compile_leaf(model, field_name, filter_statement, filter_value, lookup, lookup_adapter, using=None):
+    """
+    Prepare a filter statement on a local field of the model for evaluation
+
+    Returns None if the filter is a no-op.
+    """
+    field = get_model_field(model, field_name)
+    simple_type = get_field_simple_datatype(field, using)
+    assert_is_valid_lookup_for_field(lookup, simple_type)
+
+    is_value_set = isinstance(filter_value, frozenset)
+    try:
+        filter_value, lookup = prep_filter_value_and_lookup(model, filter_statement, filter_value)
+    except NoOpFilterException:
+        return None
+
+    if is_value_set and lookup == 'in' and not isinstance(filter_value, frozenset):
+        # keep the values hashed, django prepares them as a list
+        try:
+            filter_value = frozenset(filter_value)
+        except TypeError:
+            pass
+
+    kernel = lookup_adapter.compile_lookup(lookup, filter_value, simple_type)
+    return CompiledLeaf(lookup, simple_type, kernel)
+
+
+def get_compiled_leaf(model, field_name, filter_statement, filter_value, lookup, lookup_adapter, using=None):
+    """Compiles the leaf once per model, statement, filter value and database in the current evaluation session"""
+    def compute():
+        return compile_leaf(model, field_name, filter_statement, filter_value, lookup, lookup_adapter, using)
+
+    session = get_current_session()
+    if session is None:
+        return compute()
+    key = ('leaf', model, filter_statement, id(filter_value), lookup_adapter, using)
+    return session.memoize(key, filter_value, compute)
+
+
+def get_key_attname(field):
+    """Returns the attribute holding the related pk of a foreign key or one to one field, None for other fields"""
+    if not isinstance(field, models.ForeignKey) or field.rel.get_related_field() != field.rel.to._meta.pk:
+        return None
+    return field.attname
+
+
 def get_obj_field(obj, field_name):
-    model = type(obj)
+    return get_model_field(type(obj), field_name)
+
+
+def get_model_field(model, field_name):
     opts = model._meta
+    if field_name == 'pk':
+        return opts.pk
     try:
         field = opts.get_field(field_name)
     except FieldDoesNotExist:
-        field = opts._name_map[field_name][0]
+        if hasattr(opts, 'get_fields'):
+            raise
+        # django 1.7 only finds reverse relations by their query name with get_field_by_name, which builds the name
+        # map of deferred model classes on first use
+        field = opts.get_field_by_name(field_name)[0]
     return field
 
 
-def obj_matches_filter_statement(obj, filter_statement, filter_value, lookup_adapter=None):
-    """Returns True if the obj matches the filter statement"""
+def obj_matches_filter_statement(obj, filter_statement, filter_value, lookup_adapter=None, using=None):
+    """
+    Returns True if the obj matches the filter statement
+
+    Without `using`, the database alias the obj was loaded from is used to pick the lookup adapter and field types.
+    """
     next_token, remaining_statement_parts = process_filter_statement(filter_statement)
     lookup = remaining_statement_parts[-1]
-    lookup_adapter = get_lookup_adapter(lookup_adapter)
+    db = using or get_obj_db(obj)
+    adapter = get_lookup_adapter(lookup_adapter, using=db)
     if obj is None:
-        return lookup_adapter.evaluate_lookup(lookup, obj, filter_value)
-
-    # handle QuerySets as arguments
-    if isinstance(filter_value, QuerySet):
-        filter_value = list(filter_value)
+        return adapter.evaluate_lookup(lookup, obj, filter_value)
 
     if not isinstance(obj, models.Model):
-        raise Exception("Only django objects supported for now. %s" % str(obj))
+        raise Exception("Only django objects supported, pass model= to filter values() rows. %s" % str(obj))
 
     if len(remaining_statement_parts) == 1:
-        model = type(obj)
-        field = get_obj_field(obj, next_token)
-        simple_type = get_field_simple_datatype(field)
-        assert_is_valid_lookup_for_field(lookup, simple_type)
+        if isinstance(filter_value, QuerySet):
+            # related objects are compared by pk
+            filter_value = get_queryset_values(filter_value)
 
-        try:
-            filter_value, lookup = prep_filter_value_and_lookup(model, filter_statement, filter_value)
-        except NoOpFilterException:
+        leaf = get_compiled_leaf(type(obj), next_token, filter_statement, filter_value, lookup, adapter, db)
+        if leaf is None:
+            # the filter was a no-op
             return True
 
-        obj_values = get_model_attribute_values_by_db_name(obj, next_token)
-        obj_values = django_instances_to_keys(*obj_values)
+        obj_values = get_normalized_obj_values(obj, next_token, adapter, leaf.lookup, leaf.simple_type)
         for obj_value in obj_values:
-            r = lookup_adapter.evaluate_lookup(lookup, obj_value, filter_value, simple_type)
-            if r:
+            if leaf.kernel(obj_value):
                 return True
         return False
 
     obj_values = get_model_attribute_values_by_db_name(obj, next_token)
 
     for o in obj_values:
-        result = obj_matches_filter_statement(o, '__'.join(remaining_statement_parts), filter_value)
+        result = obj_matches_filter_statement(o, '__'.join(remaining_statement_parts), filter_value, lookup_adapter, using)
         if result:
             return True
 
 
+def get_queryset_values(queryset, target='pk'):
+    """
+    Returns the values a QuerySet used as a filter value stands for, queried once per evaluation session
+
+    Like in the database, values() and values_list() querysets stand for their first field and other querysets for
+    the `target` field of their objects. Only that field is fetched. The values are returned as a frozenset when
+    they are hashable.
+    """
+    fields = getattr(queryset, '_fields', None)
+    if fields:
+        target = fields[0]
+
+    def compute():
+        values = list(queryset.values_list(target, flat=True))
+        try:
+            return frozenset(values)
+        except TypeError:
+            return values
+
+    session = get_current_session()
+    if session is None:
+        return compute()
+    key = ('queryset', id(queryset), target)
+    return session.memoize(key, queryset, compute)
+
+
+def get_common_model(objs):
+    """
+    Returns the model of the objects if they are all instances of the same model
+
+    Only lists and tuples are inspected. Other collections, like querysets and table mirrors, may have a `model`.
+    """
+    if not isinstance(objs, (list, tuple)):
+        return getattr(objs, 'model', None)
+    concrete_models = set(type(obj)._meta.concrete_model for obj in objs if isinstance(obj, models.Model))
+    if len(concrete_models) == 1 and all(isinstance(obj, models.Model) for obj in objs):
+        return concrete_models.pop()
+    return None
+
+
+def get_obj_db(obj):
+    """Returns the database alias the obj was loaded from or saved to"""
+    if isinstance(obj, models.Model):
+        return obj._state.db
+    return None
+
+
 def prep_filter_value_and_lookup(model, filter_statement, filter_value):
     """
     Prepare the filter value and lookup for execution in python
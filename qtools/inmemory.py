@@ -0,0 +1,188 @@
+"""
+QuerySet-like chaining over collections in memory
+
+    pizzas = InMemoryQuerySet(cached_pizzas, queryset_class=PizzaQuerySet)
+    pizzas.is_delivered().filter(diameter__gt=12).exclude(order__price__gt=20).count()
+
+The q_methods of `queryset_class` are available by name, next to `filter`, `exclude`, `none`, `all` and `order_by`.
+They return a new InMemoryQuerySet without evaluating anything. The chain runs when it is evaluated (iteration,
+`len`, `count`, `exists`, `first`, `values_list`), in a single pass over the objects that checks every filter of an
+object before moving to the next. `exists` and `first` stop at the first match.
+
+Every `filter()` and `exclude()` call is checked by itself, like django does for separate calls: with
+`orders.filter(pizza__diameter__gt=12).filter(pizza__diameter__lt=8)` the two pizzas may be different pizzas.
+
+Without `order_by`, the objects keep the order of the collection, and `first()` returns the first match in it. The
+model's `Meta.ordering` is not applied.
+"""
+import itertools
+
+from django.db.models.query_utils import Q
+
+from .analysis import is_satisfiable
+from .decorator import q_method
+from .filterq import get_path_values, obj_matches_q
+from .ordering import order_by_in_memory, top_k
+from .session import evaluation_session
+
+
+class InMemoryQuerySet(object):
+    def __init__(self, objs, queryset_class=None, model=None, lookup_adapter=None, using=None):
+        self._objs = objs if isinstance(objs, (list, tuple)) else list(objs)
+        self.model = model or (type(self._objs[0]) if self._objs else None)
+        self.queryset_class = queryset_class
+        if queryset_class is None and self.model is not None:
+            self.queryset_class = self.model._default_manager._queryset_class
+        self.lookup_adapter = lookup_adapter
+        self.using = using
+        # the Q object of each filter() call, and the negated Q object of each exclude() call
+        self._filters = []
+        self._ordering = ()
+        self._is_empty = False
+        self._result_cache = None
+
+    def __getattr__(self, name):
+        queryset_class = self.__dict__.get('queryset_class')
+        if name.startswith('_') or queryset_class is None or not _is_q_method(queryset_class, name):
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+        q_func = getattr(queryset_class, name).q
+
+        def qs_func(*args, **kwargs):
+            q = q_func(*args, **kwargs)
+            if self.model is not None and not is_satisfiable(q, self.model):
+                return self.none()
+            return self.filter(q)
+        return qs_func
+
+    def __repr__(self):
+        return '<InMemoryQuerySet %r>' % (self._fetch_all(),)
+
+    def __iter__(self):
+        return iter(self._fetch_all())
+
+    def __len__(self):
+        return len(self._fetch_all())
+
+    def __bool__(self):
+        return bool(self._fetch_all())
+    __nonzero__ = __bool__
+
+    def all(self):
+        return self._clone()
+
+    def filter(self, *args, **kwargs):
+        return self._add_filter(Q(*args, **kwargs))
+
+    def exclude(self, *args, **kwargs):
+        # negating the Q object keeps comparisons with NULL unknown, like in the database
+        return self._add_filter(~Q(*args, **kwargs))
+
+    def none(self):
+        clone = self._clone()
+        clone._is_empty = True
+        return clone
+
+    def order_by(self, *fields):
+        clone = self._clone()
+        clone._ordering = fields
+        return clone
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return sum(1 for _ in self._iter_matching())
+
+    def exists(self):
+        if self._result_cache is not None:
+            return bool(self._result_cache)
+        return self._find_first() is not None
+
+    def first(self):
+        """Returns the first match in the order_by() order, or in the collection's order. None without matches."""
+        if self._result_cache is not None:
+            return self._result_cache[0] if self._result_cache else None
+        if self._ordering:
+            matching = top_k(self._iter_matching(), 1, *self._ordering, **self._ordering_kwargs())
+            return matching[0] if matching else None
+        return self._find_first()
+
+    def values_list(self, *fields, **kwargs):
+        """
+        Returns a list of tuples of the field values of the matching objects, or of the values with `flat=True`
+
+        Related objects are returned as their keys. Like the join in the database, an object has a row for every value
+        of a multi-valued relation, and a row of None when there are none.
+        """
+        flat = kwargs.pop('flat', False)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments to values_list: %s' % ', '.join(sorted(kwargs)))
+        if flat and len(fields) != 1:
+            raise TypeError("'flat' is not valid when values_list is called with more than one field.")
+
+        matching = self._fetch_all()
+        if not fields and matching:
+            fields = [field.name for field in type(matching[0])._meta.concrete_fields]
+
+        rows = []
+        with evaluation_session():
+            for obj in matching:
+                values = [get_path_values(obj, field) or [None] for field in fields]
+                rows.extend(itertools.product(*values))
+        if flat:
+            return [row[0] for row in rows]
+        return rows
+
+    def _add_filter(self, q):
+        clone = self._clone()
+        clone._filters.append(q)
+        return clone
+
+    def _clone(self):
+        clone = InMemoryQuerySet(self._objs, self.queryset_class, self.model, self.lookup_adapter, self.using)
+        clone._filters = list(self._filters)
+        clone._ordering = self._ordering
+        clone._is_empty = self._is_empty
+        return clone
+
+    def _ordering_kwargs(self):
+        return {'lookup_adapter': self.lookup_adapter, 'using': self.using}
+
+    def _iter_matching(self):
+        if self._is_empty:
+            return
+
+        with evaluation_session():
+            for obj in self._objs:
+                if self._matches(obj):
+                    yield obj
+
+    def _find_first(self):
+        if self._is_empty:
+            return None
+
+        with evaluation_session():
+            for obj in self._objs:
+                if self._matches(obj):
+                    return obj
+        return None
+
+    def _matches(self, obj):
+        for q in self._filters:
+            if not obj_matches_q(obj, q, lookup_adapter=self.lookup_adapter, using=self.using):
+                return False
+        return True
+
+    def _fetch_all(self):
+        if self._result_cache is None:
+            matching = list(self._iter_matching())
+            if self._ordering:
+                matching = order_by_in_memory(matching, *self._ordering, **self._ordering_kwargs())
+            self._result_cache = matching
+        return self._result_cache
+
+
+def _is_q_method(queryset_class, name):
+    for klass in queryset_class.__mro__:
+        if name in vars(klass):
+            return isinstance(vars(klass)[name], q_method)
+    return False
@@ -0,0 +1,272 @@
+"""
+Incrementally maintained membership of a Q object
+
+A LiveFilteredSet finds the objects of a model matching a Q object once, then keeps the set current from the model
+signals instead of querying again:
+
+    delivered = LiveFilteredSet(Pizza, PizzaQuerySet.is_delivered.q())
+    delivered.count()
+    pizza.pk in delivered
+
+Only the objects a change can affect are evaluated again, with obj_matches_q. Whatever isn't loaded is checked
+with a single query for all of them (see `missing='query'`). A saved or deleted Pizza is checked
+by itself. A saved or deleted Order is followed back to the pizzas reaching it through the relations used by the Q
+object (`order` here), before and after the change, and `m2m_changed` does the same for the many-to-many relations the Q object uses.
+
+Every change in membership is recorded as a ChangeEvent and sent with the `membership_changed` signal:
+
+    for event in delivered.changes(since=last_version):
+        notify(event.pk, event.added)
+
+Bulk operations (`QuerySet.update`, `QuerySet.delete` on some backends, `bulk_create`, raw sql) do not send
+signals. Call `reload()` after running them. Changes rolled back with their transaction are not undone either.
+"""
+import threading
+from collections import deque, namedtuple
+
+from django.db import models
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query_utils import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal
+
+from .expressions import get_expression_paths, is_expression
+from .filterq import filter_by_q, get_model_field, obj_matches_q
+from .utils import get_related_model, RELATED_FIELD_CLASSES
+
+ChangeEvent = namedtuple('ChangeEvent', ['version', 'pk', 'added'])
+RelationStep = namedtuple('RelationStep', ['path', 'model', 'through'])
+
+membership_changed = Signal(providing_args=['event'])
+
+
+class LiveFilteredSet(object):
+    def __init__(self, model, q, lookup_adapter=None, history=1000):
+        self.model = model
+        self.q = q
+        self.lookup_adapter = lookup_adapter
+        self._steps = get_relation_steps(model, q)
+        self._through_models = set(step.through for step in self._steps if step.through is not None)
+        self._version = 0
+        self._pks = None
+        self._events = deque(maxlen=history)
+        self._pending = {}
+        self._lock = threading.RLock()
+        self.connect()
+
+    def connect(self):
+        pre_save.connect(self._handle_pre_save)
+        post_save.connect(self._handle_post_save)
+        pre_delete.connect(self._handle_pre_delete)
+        post_delete.connect(self._handle_post_delete)
+        m2m_changed.connect(self._handle_m2m_changed)
+
+    def disconnect(self):
+        pre_save.disconnect(self._handle_pre_save)
+        post_save.disconnect(self._handle_post_save)
+        pre_delete.disconnect(self._handle_pre_delete)
+        post_delete.disconnect(self._handle_post_delete)
+        m2m_changed.disconnect(self._handle_m2m_changed)
+
+    @property
+    def version(self):
+        """Changes every time an object enters or leaves the set"""
+        with self._lock:
+            self._load()
+            return self._version
+
+    @property
+    def pks(self):
+        """The pks of the matching objects"""
+        with self._lock:
+            self._load()
+            return frozenset(self._pks)
+
+    def __contains__(self, obj):
+        pk = obj.pk if isinstance(obj, models.Model) else obj
+        with self._lock:
+            self._load()
+            return pk in self._pks
+
+    def __len__(self):
+        return self.count()
+
+    def count(self):
+        with self._lock:
+            self._load()
+            return len(self._pks)
+
+    def changes(self, since=0):
+        """
+        Returns the ChangeEvents with a version above `since`, oldest first
+
+        Only the last `history` events are kept. Use reload() to start over when events were missed.
+        """
+        with self._lock:
+            return [event for event in self._events if event.version > since]
+
+    def reload(self):
+        """Query the full membership again. Use after bulk operations that bypass signals."""
+        pks = set(self.model._default_manager.filter(self.q).values_list('pk', flat=True))
+        with self._lock:
+            if self._pks is not None:
+                self._update(pks - self._pks, self._pks - pks)
+            self._pks = pks
+
+    def _load(self):
+        if self._pks is None:
+            self.reload()
+
+    def _update(self, added, removed):
+        events = []
+        with self._lock:
+            for pks, is_added in ((added, True), (removed, False)):
+                for pk in sorted(pks):
+                    self._version += 1
+                    events.append(ChangeEvent(self._version, pk, is_added))
+            self._pks.update(added)
+            self._pks.difference_update(removed)
+            self._events.extend(events)
+
+        for event in events:
+            membership_changed.send(sender=self, event=event)
+
+    def _reevaluate(self, pks):
+        """Evaluates the objects with the given pks again, the ones that no longer exist leave the set"""
+        if not pks:
+            return
+
+        objs = self.model._default_manager.filter(pk__in=pks)
+        matching = filter_by_q(objs, self.q, lookup_adapter=self.lookup_adapter, missing='query', project=True)
+        matching = set(obj.pk for obj in matching)
+        self._apply(pks, matching)
+
+    def _apply(self, pks, matching):
+        with self._lock:
+            self._update(matching - self._pks, (set(pks) - matching) & self._pks)
+
+    def _related_pks(self, model, pks):
+        """Returns the pks of the objects reaching any of the `model` objects through the relations of the Q object"""
+        q = Q()
+        for step in self._steps:
+            if issubclass(model, step.model):
+                q |= Q(**{step.path + '__in': list(pks)})
+        if not q or not pks:
+            return set()
+        return set(self.model._default_manager.filter(q).values_list('pk', flat=True))
+
+    def _handle_pre_save(self, sender, instance, **kwargs):
+        with self._lock:
+            if self._pks is None or instance.pk is None:
+                return
+
+        # the objects reaching instance through its old relations can't be found once it is saved
+        affected = self._related_pks(type(instance), [instance.pk])
+        if affected:
+            with self._lock:
+                self._pending[(sender, 'save', instance.pk)] = affected
+
+    def _handle_post_save(self, sender, instance, **kwargs):
+        with self._lock:
+            if self._pks is None:
+                return
+            affected = self._pending.pop((sender, 'save', instance.pk), set())
+
+        affected |= self._related_pks(type(instance), [instance.pk])
+        if isinstance(instance, self.model):
+            # the saved object is evaluated as it is in memory
+            is_match = obj_matches_q(instance, self.q, lookup_adapter=self.lookup_adapter, missing='query')
+            self._apply([instance.pk], set([instance.pk]) if is_match else set())
+            affected.discard(instance.pk)
+        self._reevaluate(affected)
+
+    def _handle_pre_delete(self, sender, instance, **kwargs):
+        with self._lock:
+            if self._pks is None:
+                return
+
+        # the objects reaching instance can't be found once it is gone
+        affected = self._related_pks(type(instance), [instance.pk])
+        if affected:
+            with self._lock:
+                self._pending[(sender, instance.pk)] = affected
+
+    def _handle_post_delete(self, sender, instance, **kwargs):
+        with self._lock:
+            if self._pks is None:
+                return
+            affected = self._pending.pop((sender, instance.pk), set())
+
+        if isinstance(instance, self.model):
+            self._apply([instance.pk], set())
+            affected.discard(instance.pk)
+        self._reevaluate(affected)
+
+    def _handle_m2m_changed(self, sender, instance, action, model, pk_set, **kwargs):
+        if sender not in self._through_models:
+            return
+        with self._lock:
+            if self._pks is None:
+                return
+
+        affected = self._related_pks(type(instance), [instance.pk])
+        if isinstance(instance, self.model):
+            affected.add(instance.pk)
+        if pk_set:
+            affected |= self._related_pks(model, pk_set)
+            if issubclass(model, self.model):
+                affected.update(pk_set)
+
+        key = (sender, action.split('_', 1)[1], id(instance))
+        if action.startswith('pre_'):
+            # remember who was related before the change, clear() doesn't say who is removed
+            with self._lock:
+                self._pending[key] = affected
+            return
+
+        with self._lock:
+            affected |= self._pending.pop(key, set())
+        self._reevaluate(affected)
+
+
+def get_relation_steps(model, q):
+    """
+    Returns a RelationStep for every relation the Q object traverses from `model`
+
+    `path` is the filter path to the related model and `through` the intermediate model of many-to-many relations.
+    """
+    steps = []
+    for filter_statement in _iter_filter_statements(q):
+        path, current_model = [], model
+        for token in filter_statement.split('__'):
+            try:
+                field = get_model_field(current_model, token)
+            except (FieldDoesNotExist, KeyError):
+                break
+
+            if isinstance(field, RELATED_FIELD_CLASSES):
+                current_model = get_related_model(field)
+                through = field.field.rel.through if isinstance(field.field, models.ManyToManyField) else None
+            elif getattr(field, 'rel', None) is not None:
+                current_model = field.rel.to
+                through = field.rel.through if isinstance(field, models.ManyToManyField) else None
+            else:
+                break
+
+            path.append(token)
+            step = RelationStep('__'.join(path), current_model, through)
+            if step not in steps:
+                steps.append(step)
+    return steps
+
+
+def _iter_filter_statements(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            for filter_statement in _iter_filter_statements(child):
+                yield filter_statement
+        else:
+            yield child[0]
+            if is_expression(child[1]):
+                for path in get_expression_paths(child[1]):
+                    yield path
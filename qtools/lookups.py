@@ -11,18 +11,49 @@ These are made to mimic how a SQL query would respond. Some things to note:
    we do further testing.
 """
 import datetime
+import functools
 import logging
+import operator
 import re
 from decimal import Decimal
 
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.dispatch import receiver
 from django.utils import six
 
 from .exceptions import InvalidLookupValue, InvalidLookupUsage
-from .utils import to_str, typecast_timestamp, django_instances_to_keys_for_comparison, date_lookup, limit_float_to_digits, remove_trailing_spaces_if_string
+from .expressions import combine_values
+from .utils import setting_changed, to_str, typecast_timestamp, django_instances_to_keys, django_instances_to_keys_for_comparison, date_lookup, limit_float_to_digits, remove_trailing_spaces_if_string
 
 logger = logging.getLogger(__name__)
 
+COMPARISON_OPERATORS = {
+    'gt':  operator.gt,
+    'gte': operator.ge,
+    'lt':  operator.lt,
+    'lte': operator.le,
+}
+
+
+def normalizes_obj_value(lookup_name):
+    """
+    Lookup functions decorated with this take the object value as it is and normalize it first
+
+    The undecorated function, taking an object value normalized already, is kept as the `normalized` attribute.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(cls, obj_value, query_value, simple_field_type=None, **kwargs):
+            normalization = cls.get_obj_value_normalization(lookup_name)
+            obj_value = cls.normalize_obj_value(normalization, obj_value, simple_field_type)
+            return fn(cls, obj_value, query_value, simple_field_type, **kwargs)
+
+        wrapper.normalized = fn
+        return wrapper
+
+    return decorator
+
 
 class PythonLookups(object):
     SUPPORTED_LOOKUP_NAMES = [
@@ -37,15 +68,39 @@ class PythonLookups(object):
         'search': 'contains'
     }
 
+    # The lookup functions compare the object value in these forms. Lookups that share a normalization share the
+    # normalized object value within an evaluation session.
+    OBJ_VALUE_NORMALIZATIONS = {
+        'iexact':      'lower',
+        'icontains':   'lower',
+        'istartswith': 'lower',
+        'iendswith':   'lower',
+        'startswith':  'str',
+        'endswith':    'str',
+        'regex':       'str',
+        'iregex':      'str',
+        'year':        'timestamp',
+        'month':       'timestamp',
+        'day':         'timestamp',
+        'week_day':    'timestamp',
+        'hour':        'timestamp',
+        'minute':      'timestamp',
+        'second':      'timestamp',
+    }
+
+    # where ORDER BY puts NULL when sorting ascending
+    NULLS_FIRST = True
+
     @classmethod
     def exact(cls, a, b, simple_field_type=None):
         return a is not None and a == b
 
     @classmethod
+    @normalizes_obj_value('iexact')
     def iexact(cls, a, b, simple_field_type=None):
         if a is None:
             return False
-        return to_str(a).lower() == to_str(b).lower()
+        return a == to_str(b).lower()
 
     @classmethod
     def contains(cls, haystack, needle, simple_field_type=None):
@@ -63,14 +118,12 @@ class PythonLookups(object):
         return needle in haystack
 
     @classmethod
+    @normalizes_obj_value('icontains')
     def icontains(cls, haystack, needle, simple_field_type=None):
         if haystack is None:
             return False
 
-        haystack = to_str(haystack)
-        needle = to_str(needle)
-
-        return needle.lower() in haystack.lower()
+        return to_str(needle).lower() in haystack
 
     @classmethod
     def in_func(cls, needle, haystack, simple_field_type=None):
@@ -78,6 +131,13 @@ class PythonLookups(object):
             # mirrors how sql treats null values
             return False
 
+        if isinstance(haystack, frozenset):
+            # sets of values fetched from the database already have the type of the field
+            try:
+                return needle in haystack
+            except TypeError:
+                pass
+
         if simple_field_type == 'boolean':
             haystack = [bool(v) for v in haystack]
         elif simple_field_type == 'number':
@@ -127,38 +187,38 @@ class PythonLookups(object):
         return rng[0] <= value <= rng[1]
 
     @classmethod
+    @normalizes_obj_value('endswith')
     def endswith(cls, text, ending, simple_field_type=None):
         if text is None:
             return False
 
-        text = to_str(text)
         ending = to_str(ending)
         return text.endswith(ending)
 
     @classmethod
+    @normalizes_obj_value('iendswith')
     def iendswith(cls, text, ending, simple_field_type=None):
         if text is None:
             return False
 
-        text = to_str(text).lower()
         ending = to_str(ending).lower()
         return text.endswith(ending)
 
     @classmethod
+    @normalizes_obj_value('startswith')
     def startswith(cls, text, beginning, simple_field_type=None):
         if text is None:
             return False
 
-        text = to_str(text)
         beginning = to_str(beginning)
         return text.startswith(beginning)
 
     @classmethod
+    @normalizes_obj_value('istartswith')
     def istartswith(cls, text, beginning, simple_field_type=None):
         if text is None:
             return False
 
-        text = to_str(text).lower()
         beginning = to_str(beginning).lower()
         return text.startswith(beginning)
 
@@ -214,6 +274,7 @@ class PythonLookups(object):
         return (val is None) == bool(is_null)
 
     @classmethod
+    @normalizes_obj_value('regex')
     def regex(cls, text, pattern, simple_field_type=None, flags=0):
         REGEX_TYPE = type(re.compile(''))
         if not isinstance(pattern, (REGEX_TYPE, six.string_types)):
@@ -222,8 +283,6 @@ class PythonLookups(object):
         if text is None:
             return False
 
-        text = to_str(text)
-
         return re.search(pattern, text, flags=flags) is not None
 
     @classmethod
@@ -231,23 +290,147 @@ class PythonLookups(object):
         return cls.regex(text, pattern, flags=re.IGNORECASE)
 
     @classmethod
-    def get_lookup_function(cls, lookup_name):
+    def combine_values(cls, connector, lhs, rhs):
+        """Applies the arithmetic of an F() expression, integers are divided like sqlite and PostgreSQL do"""
+        if connector == '/' and isinstance(lhs, six.integer_types) and isinstance(rhs, six.integer_types) and rhs:
+            quotient = abs(lhs) // abs(rhs)
+            return quotient if (lhs < 0) == (rhs < 0) else -quotient
+        return combine_values(connector, lhs, rhs)
+
+    @classmethod
+    def order_key(cls, value, simple_field_type=None):
+        """Returns the key ORDER BY sorts the value by, NULL goes first or last as NULLS_FIRST says"""
+        if value is None:
+            return (not cls.NULLS_FIRST,)
+        if isinstance(value, six.binary_type) and simple_field_type == 'string':
+            value = to_str(value)
+        return (cls.NULLS_FIRST, value)
+
+    @classmethod
+    def get_lookup_function(cls, lookup_name, obj_value_normalized=False):
+        """Returns the lookup function, with `obj_value_normalized` the one taking a normalized object value"""
         lookup_func_name = cls.LOOKUP_FUNC_OVERRIDES.get(lookup_name, lookup_name)
-        return getattr(cls, lookup_func_name)
+        lookup_func = getattr(cls, lookup_func_name)
+        normalized = getattr(lookup_func, 'normalized', None)
+        if obj_value_normalized and normalized is not None:
+            return functools.partial(normalized, cls)
+        return lookup_func
+
+    @classmethod
+    def get_obj_value_normalization(cls, lookup_name):
+        return cls.OBJ_VALUE_NORMALIZATIONS.get(lookup_name)
+
+    @classmethod
+    def normalize_obj_value(cls, normalization, obj_value, simple_field_type=None):
+        """Converts an object value to the form the lookup functions compare"""
+        if obj_value is None or normalization is None:
+            return obj_value
+
+        if normalization == 'lower':
+            return to_str(obj_value).lower()
+        elif normalization == 'str':
+            return to_str(obj_value)
+        elif normalization == 'timestamp':
+            try:
+                return typecast_timestamp(obj_value)
+            except Exception:
+                # leave it to the lookup function to raise, after it has validated the query value
+                return obj_value
+
+        raise ValueError('Unknown normalization: %s' % normalization)
 
     @classmethod
     def prep_values(cls, lookup_name, obj_value, query_value, simple_field_type):
         return obj_value, query_value
 
     @classmethod
-    def evaluate_lookup(cls, lookup_name, obj_value, query_value, simple_field_type=None):
+    def compile_lookup(cls, lookup_name, query_value, simple_field_type=None):
+        """
+        Returns a function that evaluates the lookup against a normalized object value
+
+        Adapters may return kernels specialized for the lookup and field type, with the query value prepared once.
+        """
+        def kernel(obj_value):
+            return cls.evaluate_lookup(lookup_name, obj_value, query_value, simple_field_type, obj_value_normalized=True)
+
+        return kernel
+
+    @classmethod
+    def evaluate_lookup(cls, lookup_name, obj_value, query_value, simple_field_type=None, obj_value_normalized=False):
+        if not obj_value_normalized:
+            normalization = cls.get_obj_value_normalization(lookup_name)
+            obj_value = cls.normalize_obj_value(normalization, obj_value, simple_field_type)
         obj_value, query_value = cls.prep_values(lookup_name, obj_value, query_value, simple_field_type)
-        lookup_func = cls.get_lookup_function(lookup_name)
+        lookup_func = cls.get_lookup_function(lookup_name, obj_value_normalized=True)
         return lookup_func(obj_value, query_value, simple_field_type=simple_field_type)
 
 
+ASCII_LOWERCASE_MAP = dict((ord(c), ord(c.lower())) for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+
+
+def ascii_lower(text):
+    """Lowercases A-Z only, like sqlite's LIKE operator"""
+    if isinstance(text, six.text_type):
+        return text.translate(ASCII_LOWERCASE_MAP)
+    return text.lower()
+
+
 class SqLiteCompatibleLookups(PythonLookups):
-    pass
+    """
+    Mimics django's sqlite backend
+
+    contains, startswith, endswith and the case insensitive lookups are done with LIKE, which ignores case for
+    ASCII characters only. sqlite has no full-text search, `search` is evaluated like `contains`.
+    """
+    OBJ_VALUE_NORMALIZATIONS = dict(
+        PythonLookups.OBJ_VALUE_NORMALIZATIONS,
+        iexact='ascii_lower',
+        contains='ascii_lower',
+        search='ascii_lower',
+        icontains='ascii_lower',
+        startswith='ascii_lower',
+        istartswith='ascii_lower',
+        endswith='ascii_lower',
+        iendswith='ascii_lower',
+    )
+
+    @classmethod
+    def normalize_obj_value(cls, normalization, obj_value, simple_field_type=None):
+        if obj_value is not None and normalization == 'ascii_lower':
+            return ascii_lower(to_str(obj_value))
+        return super(SqLiteCompatibleLookups, cls).normalize_obj_value(normalization, obj_value, simple_field_type)
+
+    @classmethod
+    @normalizes_obj_value('iexact')
+    def iexact(cls, a, b, simple_field_type=None):
+        if a is None:
+            return False
+        return a == ascii_lower(to_str(b))
+
+    @classmethod
+    @normalizes_obj_value('icontains')
+    def icontains(cls, haystack, needle, simple_field_type=None):
+        if haystack is None:
+            return False
+        return ascii_lower(to_str(needle)) in haystack
+
+    @classmethod
+    @normalizes_obj_value('istartswith')
+    def istartswith(cls, text, beginning, simple_field_type=None):
+        if text is None:
+            return False
+        return text.startswith(ascii_lower(to_str(beginning)))
+
+    @classmethod
+    @normalizes_obj_value('iendswith')
+    def iendswith(cls, text, ending, simple_field_type=None):
+        if text is None:
+            return False
+        return text.endswith(ascii_lower(to_str(ending)))
+
+    contains = icontains
+    startswith = istartswith
+    endswith = iendswith
 
 
 class MySqlCompatibleLookups(PythonLookups):
@@ -258,11 +441,60 @@ class MySqlCompatibleLookups(PythonLookups):
         'search': 'contains',
     }
 
+    OBJ_VALUE_NORMALIZATIONS = dict(
+        PythonLookups.OBJ_VALUE_NORMALIZATIONS,
+        exact='mysql_exact',
+        gt='mysql_collation',
+        gte='mysql_collation',
+        lt='mysql_collation',
+        lte='mysql_collation',
+        **{'in': 'mysql_collation'}
+    )
+
     @classmethod
-    def in_func(cls, needle, haystack, simple_field_type=None):
-        if isinstance(needle, six.string_types):
-            needle = needle.lower()
+    def get_obj_value_normalization(cls, lookup_name):
+        # floats are truncated for every lookup
+        return cls.OBJ_VALUE_NORMALIZATIONS.get(lookup_name, 'float')
+
+    @classmethod
+    def normalize_obj_value(cls, normalization, obj_value, simple_field_type=None):
+        if obj_value is None:
+            return obj_value
+
+        # mysql only returned values with 15 digits so we truncate our python floats to the same length
+        if isinstance(obj_value, float):
+            obj_value = limit_float_to_digits(obj_value, 15)
+
+        if normalization == 'float':
+            return obj_value
+        elif normalization == 'mysql_exact':
+            if simple_field_type == 'string':
+                obj_value = to_str(obj_value).lower()
+            return remove_trailing_spaces_if_string(obj_value)
+        elif normalization == 'mysql_collation':
+            # when doing string comparisons mysql is not case sensitive in the most commonly used collations
+            if isinstance(obj_value, six.string_types):
+                obj_value = obj_value.lower()
+            return remove_trailing_spaces_if_string(obj_value)
+
+        return super(MySqlCompatibleLookups, cls).normalize_obj_value(normalization, obj_value, simple_field_type)
+
+    @classmethod
+    def order_key(cls, value, simple_field_type=None):
+        # strings sort like the comparisons, ignoring case and trailing spaces
+        value = cls.normalize_obj_value('mysql_collation', value, simple_field_type)
+        return super(MySqlCompatibleLookups, cls).order_key(value, simple_field_type)
 
+    @classmethod
+    def combine_values(cls, connector, lhs, rhs):
+        # MySQL divides integers exactly
+        if connector == '/' and isinstance(lhs, six.integer_types) and isinstance(rhs, six.integer_types):
+            lhs = Decimal(lhs)
+        return super(MySqlCompatibleLookups, cls).combine_values(connector, lhs, rhs)
+
+    @classmethod
+    @normalizes_obj_value('in')
+    def in_func(cls, needle, haystack, simple_field_type=None):
         if isinstance(haystack, six.string_types):
             haystack = haystack.lower()
 
@@ -275,7 +507,6 @@ class MySqlCompatibleLookups(PythonLookups):
         else:
             haystack = [v for v in haystack]
 
-        needle = remove_trailing_spaces_if_string(needle)
         haystack = remove_trailing_spaces_if_string(haystack)
 
         if isinstance(haystack, list):
@@ -299,24 +530,17 @@ class MySqlCompatibleLookups(PythonLookups):
         return super(MySqlCompatibleLookups, cls).year(dt, yr, simple_field_type)
 
     @classmethod
+    @normalizes_obj_value('exact')
     def exact(cls, obj_value, query_value, simple_field_type=None):
         if simple_field_type == 'string':
             if query_value is not None:
                 query_value = to_str(query_value).lower()
-            if obj_value is not None:
-                obj_value = to_str(obj_value).lower()
 
-        obj_value = remove_trailing_spaces_if_string(obj_value)
         query_value = remove_trailing_spaces_if_string(query_value)
         return super(MySqlCompatibleLookups, cls).exact(obj_value, query_value, simple_field_type)
 
     @classmethod
     def prep_values(cls, lookup_name, obj_value, query_value, simple_field_type):
-
-        # mysql only returned values with 15 digits so we truncate our python floats to the same length
-        if isinstance(obj_value, float):
-            obj_value = limit_float_to_digits(obj_value, 15)
-
         if isinstance(query_value, float):
             query_value = limit_float_to_digits(query_value, 15)
 
@@ -327,34 +551,321 @@ class MySqlCompatibleLookups(PythonLookups):
             if simple_field_type == 'string':
                 raise InvalidLookupUsage('Comparing strings in python can have different results than you would get in MySql due to python not being aware of the collation.')
 
-            if isinstance(obj_value, six.string_types):
-                # when doing string comparisons mysql is not case sensitive in the most commonly used collations
-                obj_value = obj_value.lower()
-
-            obj_value = remove_trailing_spaces_if_string(obj_value)
             query_value = remove_trailing_spaces_if_string(query_value)
 
         return obj_value, query_value
 
+    KERNEL_BUILDERS = {
+        'exact':       'exact_kernel',
+        'iexact':      'iexact_kernel',
+        'in':          'in_kernel',
+        'gt':          'comparison_kernel',
+        'gte':         'comparison_kernel',
+        'lt':          'comparison_kernel',
+        'lte':         'comparison_kernel',
+        'isnull':      'isnull_kernel',
+        'contains':    'contains_kernel',
+        'search':      'contains_kernel',
+        'icontains':   'icontains_kernel',
+        'startswith':  'startswith_kernel',
+        'istartswith': 'startswith_kernel',
+        'endswith':    'endswith_kernel',
+        'iendswith':   'endswith_kernel',
+    }
+
+    @classmethod
+    def compile_lookup(cls, lookup_name, query_value, simple_field_type=None):
+        generic_kernel = super(MySqlCompatibleLookups, cls).compile_lookup(lookup_name, query_value, simple_field_type)
+
+        builder_name = cls.KERNEL_BUILDERS.get(lookup_name)
+        if builder_name is None:
+            return generic_kernel
+
+        try:
+            query_value = cls.prep_query_value(lookup_name, query_value)
+            return getattr(cls, builder_name)(lookup_name, query_value, simple_field_type)
+        except Exception:
+            # the generic kernel raises the same error, but only once it's evaluated, as evaluate_lookup does
+            return generic_kernel
+
+    @classmethod
+    def prep_query_value(cls, lookup_name, query_value):
+        if isinstance(query_value, float):
+            query_value = limit_float_to_digits(query_value, 15)
+
+        if isinstance(query_value, datetime.datetime):
+            query_value = query_value.replace(microsecond=0)
+
+        return query_value
+
+    @classmethod
+    def exact_kernel(cls, lookup_name, query_value, simple_field_type):
+        if simple_field_type == 'string' and query_value is not None:
+            query_value = to_str(query_value).lower()
+        query_value = remove_trailing_spaces_if_string(query_value)
+
+        return lambda obj_value: obj_value is not None and obj_value == query_value
+
+    @classmethod
+    def iexact_kernel(cls, lookup_name, query_value, simple_field_type):
+        query_value = to_str(query_value).lower()
+        return lambda obj_value: obj_value is not None and obj_value == query_value
+
     @classmethod
-    def evaluate_lookup(cls, lookup_name, obj_value, query_value, simple_field_type=None):
+    def in_kernel(cls, lookup_name, haystack, simple_field_type):
+        if isinstance(haystack, six.string_types):
+            haystack = haystack.lower()
+
+        if simple_field_type == 'boolean':
+            haystack = [bool(v) for v in haystack]
+        elif simple_field_type == 'number':
+            haystack = [Decimal(v) for v in haystack]
+        elif simple_field_type == 'string':
+            haystack = [to_str(v).lower().rstrip(' ') for v in haystack]
+        else:
+            haystack = [remove_trailing_spaces_if_string(v) for v in haystack]
+
+        if simple_field_type in ('boolean', 'string'):
+            hashed_haystack = frozenset(haystack)
+
+            def kernel(needle):
+                if needle is None:
+                    return False
+                try:
+                    return needle in hashed_haystack
+                except TypeError:
+                    return needle in haystack
+        else:
+            def kernel(needle):
+                return needle is not None and needle in haystack
+
+        return kernel
+
+    @classmethod
+    def comparison_kernel(cls, lookup_name, query_value, simple_field_type):
+        if query_value is None:
+            return lambda obj_value: False
+
+        if simple_field_type == 'string':
+            raise InvalidLookupUsage('Comparing strings in python can have different results than you would get in MySql due to python not being aware of the collation.')
+
+        query_value, = django_instances_to_keys(remove_trailing_spaces_if_string(query_value))
+        if query_value is None:
+            return lambda obj_value: False
+
+        compare = COMPARISON_OPERATORS[lookup_name]
+        return lambda obj_value: obj_value is not None and compare(obj_value, query_value)
+
+    @classmethod
+    def isnull_kernel(cls, lookup_name, is_null, simple_field_type):
+        is_null = bool(is_null)
+        return lambda obj_value: (obj_value is None) == is_null
+
+    @classmethod
+    def contains_kernel(cls, lookup_name, needle, simple_field_type):
+        str_needle = to_str(needle)
+
+        def kernel(haystack):
+            if haystack is None:
+                return False
+            if isinstance(haystack, six.string_types):
+                return str_needle in haystack
+            return cls.contains(haystack, needle, simple_field_type)
+
+        return kernel
+
+    @classmethod
+    def icontains_kernel(cls, lookup_name, needle, simple_field_type):
+        needle = to_str(needle).lower()
+        return lambda haystack: haystack is not None and needle in haystack
+
+    @classmethod
+    def startswith_kernel(cls, lookup_name, beginning, simple_field_type):
+        beginning = to_str(beginning)
+        if lookup_name == 'istartswith':
+            beginning = beginning.lower()
+        return lambda text: text is not None and text.startswith(beginning)
+
+    @classmethod
+    def endswith_kernel(cls, lookup_name, ending, simple_field_type):
+        ending = to_str(ending)
+        if lookup_name == 'iendswith':
+            ending = ending.lower()
+        return lambda text: text is not None and text.endswith(ending)
+
+    @classmethod
+    def evaluate_lookup(cls, lookup_name, obj_value, query_value, simple_field_type=None, obj_value_normalized=False):
         if lookup_name in ['gt', 'gte', 'lt', 'lte']:
             if query_value is None:
                 return False
-        return super(MySqlCompatibleLookups, cls).evaluate_lookup(lookup_name, obj_value, query_value, simple_field_type)
+        return super(MySqlCompatibleLookups, cls).evaluate_lookup(lookup_name, obj_value, query_value, simple_field_type, obj_value_normalized)
+
+
+POSIX_CHARACTER_CLASSES = {
+    'alpha':  'a-zA-Z',
+    'digit':  '0-9',
+    'alnum':  'a-zA-Z0-9',
+    'upper':  'A-Z',
+    'lower':  'a-z',
+    'space':  r'\s',
+    'xdigit': '0-9A-Fa-f',
+    'word':   r'\w',
+    'punct':  re.escape('!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'),
+}
+
+POSIX_ESCAPES = {
+    'm': r'\b(?=\w)',
+    'M': r'\b(?<=\w)',
+    'y': r'\b',
+    'Y': r'\B',
+}
+
+
+def pg_upper(text):
+    """
+    UPPER() as PostgreSQL does it: characters whose uppercase form is longer (like the German sharp s) are left alone
+    """
+    upper = text.upper()
+    if len(upper) == len(text):
+        return upper
+    return ''.join(c if len(c.upper()) != 1 else c.upper() for c in text)
+
+
+def posix_regex_to_python(pattern):
+    """
+    Translate the parts of a PostgreSQL regex that python spells differently
+
+    Handles bracket character classes like [[:digit:]] and the \\m, \\M, \\y and \\Y word boundaries. Everything
+    else is passed to python's re as is.
+    """
+    pattern = re.sub(r'\[:(\w+):\]', lambda m: POSIX_CHARACTER_CLASSES.get(m.group(1), m.group(0)), pattern)
+    return re.sub(r'\\(\\|[mMyY])', lambda m: POSIX_ESCAPES.get(m.group(1), m.group(0)), pattern)
+
+
+class PostgresCompatibleLookups(PythonLookups):
+    """
+    Mimics django's postgresql backend
+
+     - case insensitive lookups compare UPPER() of both sides
+     - regex lookups use the POSIX dialect (~ and ~*)
+     - string comparisons and ordering depend on the database collation, so they are refused
+     - NULL sorts last in ascending order
+     - django doesn't implement full-text search for postgres
+    """
+    LOOKUP_FUNC_OVERRIDES = {
+        'in':     'in_func',
+        'range':  'range_func',
+        'search': 'search_func',
+    }
+
+    NULLS_FIRST = False
+
+    OBJ_VALUE_NORMALIZATIONS = dict(
+        PythonLookups.OBJ_VALUE_NORMALIZATIONS,
+        iexact='upper',
+        icontains='upper',
+        istartswith='upper',
+        iendswith='upper',
+    )
+
+    @classmethod
+    def normalize_obj_value(cls, normalization, obj_value, simple_field_type=None):
+        if obj_value is not None and normalization == 'upper':
+            return pg_upper(to_str(obj_value))
+        return super(PostgresCompatibleLookups, cls).normalize_obj_value(normalization, obj_value, simple_field_type)
+
+    @classmethod
+    @normalizes_obj_value('iexact')
+    def iexact(cls, a, b, simple_field_type=None):
+        if a is None:
+            return False
+        return a == pg_upper(to_str(b))
+
+    @classmethod
+    @normalizes_obj_value('icontains')
+    def icontains(cls, haystack, needle, simple_field_type=None):
+        if haystack is None:
+            return False
+        return pg_upper(to_str(needle)) in haystack
+
+    @classmethod
+    @normalizes_obj_value('istartswith')
+    def istartswith(cls, text, beginning, simple_field_type=None):
+        if text is None:
+            return False
+        return text.startswith(pg_upper(to_str(beginning)))
+
+    @classmethod
+    @normalizes_obj_value('iendswith')
+    def iendswith(cls, text, ending, simple_field_type=None):
+        if text is None:
+            return False
+        return text.endswith(pg_upper(to_str(ending)))
+
+    @classmethod
+    def order_key(cls, value, simple_field_type=None):
+        if simple_field_type == 'string' and value is not None:
+            raise InvalidLookupUsage('Ordering strings in python can have different results than you would get in PostgreSQL due to python not being aware of the collation.')
+        return super(PostgresCompatibleLookups, cls).order_key(value, simple_field_type)
+
+    @classmethod
+    def search_func(cls, text, query, simple_field_type=None):
+        raise InvalidLookupUsage('Django does not implement full-text search for postgresql.')
+
+    @classmethod
+    def regex(cls, text, pattern, simple_field_type=None, flags=0):
+        if isinstance(pattern, six.string_types):
+            pattern = posix_regex_to_python(pattern)
+        return super(PostgresCompatibleLookups, cls).regex(text, pattern, simple_field_type=simple_field_type, flags=flags)
+
+    @classmethod
+    def prep_values(cls, lookup_name, obj_value, query_value, simple_field_type):
+        if lookup_name in ['gt', 'gte', 'lt', 'lte', 'range'] and simple_field_type == 'string':
+            raise InvalidLookupUsage('Comparing strings in python can have different results than you would get in PostgreSQL due to python not being aware of the collation.')
+        if lookup_name == 'iexact' and query_value is not None and not isinstance(query_value, six.string_types):
+            raise InvalidLookupValue('PostgreSQL has no UPPER() for %s values.' % type(query_value).__name__)
+        return obj_value, query_value
 
 
 ENGINE_ADAPTER_MAPPING = {
-    'django.db.backends.mysql':   MySqlCompatibleLookups,
-    'django.db.backends.sqlite3': SqLiteCompatibleLookups,
-    'python':                     PythonLookups,
-    'mysql':                      MySqlCompatibleLookups,
-    'sqlite':                     SqLiteCompatibleLookups
+    'django.db.backends.mysql':               MySqlCompatibleLookups,
+    'django.db.backends.sqlite3':             SqLiteCompatibleLookups,
+    'django.db.backends.postgresql_psycopg2': PostgresCompatibleLookups,
+    'django.db.backends.postgresql':          PostgresCompatibleLookups,
+    'django.contrib.gis.db.backends.postgis': PostgresCompatibleLookups,
+    'python':                                 PythonLookups,
+    'mysql':                                  MySqlCompatibleLookups,
+    'sqlite':                                 SqLiteCompatibleLookups,
+    'postgres':                               PostgresCompatibleLookups,
+    'postgresql':                             PostgresCompatibleLookups,
 }
 
 
-def get_lookup_adapter(db_engine=None):
-    if not db_engine or not isinstance(db_engine, six.string_types):
-        db_engine = settings.DATABASES['default']['ENGINE']
+_ADAPTERS_BY_ALIAS = {}
+
+
+def get_lookup_adapter(db_engine=None, using=None):
+    """
+    Returns the lookup adapter class
+
+    `db_engine` can be an adapter class, an engine path or one of the short names in ENGINE_ADAPTER_MAPPING. Without
+    it, the adapter is picked from the engine of the `using` database alias (`default` if not given).
+    """
+    if isinstance(db_engine, type) and issubclass(db_engine, PythonLookups):
+        return db_engine
+
+    if db_engine and isinstance(db_engine, six.string_types):
+        return ENGINE_ADAPTER_MAPPING.get(db_engine, PythonLookups)
+
+    using = using or DEFAULT_DB_ALIAS
+    try:
+        return _ADAPTERS_BY_ALIAS[using]
+    except KeyError:
+        adapter = _ADAPTERS_BY_ALIAS[using] = ENGINE_ADAPTER_MAPPING.get(settings.DATABASES[using]['ENGINE'], PythonLookups)
+        return adapter
+
 
-    return ENGINE_ADAPTER_MAPPING.get(db_engine, PythonLookups)
+@receiver(setting_changed)
+def _clear_adapters_by_alias(setting, **kwargs):
+    if setting == 'DATABASES':
+        _ADAPTERS_BY_ALIAS.clear()
@@ -0,0 +1,165 @@
+"""
+In-memory copies of small, frequently read tables
+
+A TableMirror loads every row of a model once and answers Q filters against those rows in python. It keeps
+itself current by listening to the model signals, reloading a saved row with one query, so reads never touch the
+database:
+
+    toppings = TableMirror(Topping, fields=['name', 'is_gluten_free'])
+    toppings.filter(Q(is_gluten_free=True))
+    toppings.get(name='cheese')
+    toppings.count(Q(name__startswith='p'))
+
+The mirror is iterable and has a `version` that changes with every update, so it can be used with a QResultCache:
+
+    filter_by_q(toppings, Q(is_gluten_free=True), cache=cache)
+
+Pass a QResultCache as `cache` to cache the results of `filter`, `get` and `count`. Narrower filters are then answered
+from the cached results of wider ones.
+
+Bulk operations (`QuerySet.update`, `QuerySet.delete` on some backends, `bulk_create`, raw sql) do not send
+signals. Call `reload()` after running them.
+"""
+import threading
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .filterq import filter_by_q
+from .utils import get_m2m_through_models
+
+
+class TableMirror(object):
+    def __init__(self, model, fields=None, lookup_adapter=None, cache=None):
+        self.model = model
+        self.fields = list(fields) if fields else None
+        self.lookup_adapter = lookup_adapter
+        self.cache = cache
+        self._version = 0
+        self._objects = None
+        self._lock = threading.RLock()
+        self._through_models = get_m2m_through_models(model)
+        self.connect()
+
+    def connect(self):
+        post_save.connect(self._handle_post_save)
+        post_delete.connect(self._handle_post_delete)
+        m2m_changed.connect(self._handle_m2m_changed)
+
+    def disconnect(self):
+        post_save.disconnect(self._handle_post_save)
+        post_delete.disconnect(self._handle_post_delete)
+        m2m_changed.disconnect(self._handle_m2m_changed)
+
+    @property
+    def version(self):
+        """Changes every time the mirrored rows change"""
+        with self._lock:
+            if self._objects is None:
+                self.reload()
+            return self._version
+
+    def __iter__(self):
+        return iter(self.all())
+
+    def __len__(self):
+        return len(self.all())
+
+    def get_queryset(self):
+        qs = self.model._default_manager.all()
+        if self.fields:
+            qs = qs.only(*self.fields)
+        return qs
+
+    def reload(self):
+        """Reload the full table. Use after bulk operations that bypass signals."""
+        objects = OrderedDict((obj.pk, obj) for obj in self.get_queryset())
+        with self._lock:
+            self._objects = objects
+            self._version += 1
+
+    def all(self):
+        with self._lock:
+            if self._objects is None:
+                self.reload()
+            return list(self._objects.values())
+
+    def filter(self, q=None, **kwargs):
+        q = _build_q(q, kwargs)
+        if q is None:
+            return self.all()
+        if self.cache is not None:
+            return filter_by_q(self, q, lookup_adapter=self.lookup_adapter, cache=self.cache)
+        return filter_by_q(self.all(), q, lookup_adapter=self.lookup_adapter)
+
+    def count(self, q=None, **kwargs):
+        return len(self.filter(q, **kwargs))
+
+    def get(self, q=None, **kwargs):
+        objs = self.filter(q, **kwargs)
+        if len(objs) == 1:
+            return objs[0]
+
+        if not objs:
+            raise self.model.DoesNotExist('%s matching query does not exist.' % self.model._meta.object_name)
+
+        raise self.model.MultipleObjectsReturned(
+            'get() returned more than one %s -- it returned %s!' % (self.model._meta.object_name, len(objs))
+        )
+
+    def _handle_post_save(self, sender, instance, **kwargs):
+        if not isinstance(instance, self.model):
+            return
+
+        with self._lock:
+            if self._objects is None:
+                return
+            # a copy with only the mirrored fields, later changes to the saved instance stay out of the mirror
+            for obj in self.get_queryset().filter(pk=instance.pk):
+                self._objects[obj.pk] = obj
+            self._version += 1
+
+    def _handle_post_delete(self, sender, instance, **kwargs):
+        if not isinstance(instance, self.model):
+            return
+
+        with self._lock:
+            if self._objects is None:
+                return
+            self._objects.pop(instance.pk, None)
+            self._version += 1
+
+    def _handle_m2m_changed(self, sender, instance, action, model, pk_set, **kwargs):
+        if sender not in self._through_models or not action.startswith('post_'):
+            return
+
+        with self._lock:
+            if self._objects is None:
+                return
+
+            if isinstance(instance, self.model):
+                self._refresh([instance.pk])
+            elif issubclass(model, self.model):
+                if pk_set is None:
+                    # a clear() from the other side doesn't tell us which rows changed
+                    self.reload()
+                else:
+                    self._refresh(pk_set)
+
+    def _refresh(self, pks):
+        """Re-fetch rows whose m2m relations changed so no stale prefetched relations are kept"""
+        pks = [pk for pk in pks if pk in self._objects]
+        if not pks:
+            return
+
+        for obj in self.get_queryset().filter(pk__in=pks):
+            self._objects[obj.pk] = obj
+        self._version += 1
+
+
+def _build_q(q, kwargs):
+    if kwargs:
+        kwargs_q = Q(**kwargs)
+        q = kwargs_q if q is None else q & kwargs_q
+    return q
@@ -0,0 +1,138 @@
+"""
+Ordering collections in memory like ORDER BY does
+
+    delivered = filter_by_q(orders, OrderQuerySet.is_delivered.q())
+    newest_first = order_by_in_memory(delivered, '-delivered_time', 'pk')
+    three_cheapest = top_k(delivered, 3, 'price')
+
+Fields are given like to `QuerySet.order_by`, with `-` for descending order and `__` to follow relations. Ordering by
+a relation orders by the related model's `Meta.ordering`, or its pk. Without fields the model's `Meta.ordering` is
+used. The values are compared the way the lookup adapter says the database would: where NULL goes, MySQL's case
+insensitive collation and trailing spaces. The PostgreSQL adapter refuses to order strings, the result depends on the
+collation of the database.
+
+The sort keys are computed once per object and the sort is stable, objects with equal keys keep their order.
+"""
+import heapq
+from collections import namedtuple
+
+from .filterq import get_obj_db, get_path_values
+from .lookups import get_lookup_adapter
+from .rows import get_path_fields, get_row_value
+from .session import evaluation_session
+from .utils import get_field_simple_datatype, get_related_model
+
+OrderField = namedtuple('OrderField', ['path', 'fields', 'descending', 'simple_type'])
+
+
+def order_by_in_memory(objs, *fields, **kwargs):
+    """
+    Returns a list of the objs sorted by the fields
+
+    Takes the `lookup_adapter`, `using` and `model` keyword arguments of filter_by_q. With `model` the objs are
+    `values()` rows.
+    """
+    objs = list(objs)
+    keys, descending = _get_sort_keys(objs, fields, kwargs)
+    if keys is None:
+        return objs
+
+    if len(set(descending)) == 1:
+        order = sorted(range(len(objs)), key=keys.__getitem__, reverse=descending[0])
+    else:
+        order = sorted(range(len(objs)), key=lambda i: SortKey(keys[i], descending))
+    return [objs[i] for i in order]
+
+
+def top_k(objs, k, *fields, **kwargs):
+    """Returns the first k objs in the order of order_by_in_memory, keeping only k of them in a heap"""
+    objs = list(objs)
+    keys, descending = _get_sort_keys(objs, fields, kwargs)
+    if keys is None:
+        return objs[:k]
+
+    if len(set(descending)) == 1:
+        select = heapq.nlargest if descending[0] else heapq.nsmallest
+        order = select(k, range(len(objs)), key=keys.__getitem__)
+    else:
+        order = heapq.nsmallest(k, range(len(objs)), key=lambda i: SortKey(keys[i], descending))
+    return [objs[i] for i in order]
+
+
+class SortKey(object):
+    """Orders tuples of sort keys where some of the positions are descending"""
+    __slots__ = ('keys', 'descending')
+
+    def __init__(self, keys, descending):
+        self.keys = keys
+        self.descending = descending
+
+    def __lt__(self, other):
+        for key, other_key, desc in zip(self.keys, other.keys, self.descending):
+            if key != other_key:
+                return key > other_key if desc else key < other_key
+        return False
+
+
+def get_ordering(model, fields, using=None):
+    """Returns an OrderField for each field to sort by, relations are replaced by the fields that order them"""
+    ordering = []
+    for field in fields or model._meta.ordering:
+        if field == '?':
+            raise ValueError("Random ordering can't be done in memory")
+        _add_order_fields(model, field.lstrip('-').split('__'), field.startswith('-'), using, ordering)
+    return ordering
+
+
+def _add_order_fields(model, path, descending, using, ordering):
+    fields = get_path_fields(model, path)[1]
+    field = fields[-1]
+    related_model = get_related_model(field)
+    if related_model is None:
+        ordering.append(OrderField(path, fields, descending, get_field_simple_datatype(field, using)))
+        return
+
+    for related_field in related_model._meta.ordering or ['pk']:
+        related_descending = descending != related_field.startswith('-')
+        related_path = related_field.lstrip('-').split('__')
+        if related_path == ['pk']:
+            # the value of a relation is the related pk
+            simple_type = get_field_simple_datatype(related_model._meta.pk, using)
+            ordering.append(OrderField(path, fields, related_descending, simple_type))
+        else:
+            _add_order_fields(model, path + related_path, related_descending, using, ordering)
+
+
+def _get_sort_keys(objs, fields, kwargs):
+    """Returns the tuple of sort keys of each obj and whether each position is descending, None without ordering"""
+    lookup_adapter = kwargs.pop('lookup_adapter', None)
+    using = kwargs.pop('using', None)
+    model = kwargs.pop('model', None)
+    if kwargs:
+        raise TypeError('Unexpected keyword arguments: %s' % ', '.join(sorted(kwargs)))
+    if not objs:
+        return None, None
+
+    using = using or get_obj_db(objs[0])
+    ordering = get_ordering(model or type(objs[0]), fields, using)
+    if not ordering:
+        return None, None
+
+    adapter = get_lookup_adapter(lookup_adapter, using=using)
+    with evaluation_session():
+        keys = [
+            tuple(adapter.order_key(_get_value(obj, order_field, model), order_field.simple_type)
+                  for order_field in ordering)
+            for obj in objs
+        ]
+    return keys, [order_field.descending for order_field in ordering]
+
+
+def _get_value(obj, order_field, model):
+    if model is not None:
+        return get_row_value(obj, order_field.path, order_field.fields)
+
+    values = get_path_values(obj, '__'.join(order_field.path))
+    if len(values) > 1:
+        raise ValueError("Can't order by %s, %r has %s of them" % ('__'.join(order_field.path), obj, len(values)))
+    return values[0] if values else None
@@ -0,0 +1,244 @@
+"""
+Splits the evaluation of a Q object between loaded data and the database
+
+By default `filter_by_q` and `obj_matches_q` load every field and relation the Q object needs, one lazy query per
+missing attribute and object. With `missing='query'` they plan the evaluation instead:
+
+    pizzas = list(Pizza.objects.only('id', 'diameter'))
+    q = Q(diameter__gt=12) & Q(order__delivered_time__isnull=False)
+    big_and_delivered = filter_by_q(pizzas, q, missing='query')
+
+Every leaf that can be decided from loaded data is evaluated in memory, using three-valued logic for the leaves that
+can't. The objects whose result still depends on missing data are checked with one query per model and database:
+
+    Pizza.objects.filter(residual_q, pk__in=undecided_pks)
+
+`residual_q` is the Q object with the leaves that are already known for all of the undecided objects replaced by
+their values and simplified away. Here, the pizzas smaller than 12 inches never reach the database.
+
+With `missing='unknown'`, `obj_matches_q` doesn't query at all and returns UNKNOWN when loaded data isn't enough:
+
+    result = obj_matches_q(pizza, q, missing='unknown')
+    if result == UNKNOWN:
+        print(result.missing_fields)  # ('order',)
+"""
+from collections import OrderedDict
+
+from django.db import models
+from django.db.models.query_utils import Q
+
+from .expressions import get_expression_paths, is_expression
+from .filterq import get_key_attname, get_model_attribute_values_by_db_name, get_obj_field, obj_matches_leaf, \
+    obj_matches_q, process_filter_statement
+from .session import evaluation_session
+from .utils import RELATED_FIELD_CLASSES
+
+
+class Unknown(object):
+    """
+    The result of a Q object that depends on data that isn't loaded
+
+    `missing_fields` are the paths of the fields and relations, relative to the object, that decide the result. All
+    unknown results are equal to UNKNOWN. They can't be used as booleans, so they aren't mistaken for False.
+    """
+    def __init__(self, missing_fields=()):
+        self.missing_fields = tuple(missing_fields)
+
+    def __eq__(self, other):
+        return isinstance(other, Unknown)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(Unknown)
+
+    def __bool__(self):
+        raise TypeError('The result is unknown, %s is not loaded' % ', '.join(self.missing_fields or ['data']))
+    __nonzero__ = __bool__
+
+    def __repr__(self):
+        if self.missing_fields:
+            return 'UNKNOWN(%s)' % ', '.join(self.missing_fields)
+        return 'UNKNOWN'
+
+
+UNKNOWN = Unknown()
+
+
+def planned_matches(objs, q, lookup_adapter=None, using=None):
+    """
+    Returns a list of booleans in the order of `objs`, True for the objects matching the Q object
+
+    Objects that can't be decided from loaded data are checked in the database, `using` or the database they were
+    loaded from. Unsaved objects can't be, they load what is missing instead.
+    """
+    objs = list(objs)
+    results = [None] * len(objs)
+    undecided = OrderedDict()
+
+    with evaluation_session():
+        for i, obj in enumerate(objs):
+            leaf_values = {}
+            result = partial_obj_matches_q(obj, q, lookup_adapter, using, leaf_values)
+            if result == UNKNOWN and getattr(obj, 'pk', None) is None:
+                result = obj_matches_q(obj, q, lookup_adapter=lookup_adapter, using=using)
+
+            if result == UNKNOWN:
+                indexes, group_leaf_values = undecided.setdefault((type(obj), using or obj._state.db), ([], {}))
+                indexes.append(i)
+                for path, value in leaf_values.items():
+                    group_leaf_values.setdefault(path, set()).add(value)
+            else:
+                results[i] = result
+
+    for (model, db), (indexes, leaf_values) in undecided.items():
+        residual = residual_q(q, leaf_values)
+        if isinstance(residual, bool):
+            matching = set(objs[i].pk for i in indexes) if residual else set()
+        else:
+            matching = set(matching_pks(model, db, residual, [objs[i].pk for i in indexes]))
+        for i in indexes:
+            results[i] = objs[i].pk in matching
+
+    return results
+
+
+def partial_obj_matches_q(obj, q, lookup_adapter=None, using=None, leaf_values=None, path=()):
+    """
+    Evaluates the Q object against the loaded data of obj without loading anything
+
+    Returns True or False, or an Unknown when the result depends on data that isn't loaded. AND, OR and negation
+    follow three-valued (Kleene) logic. If `leaf_values` is given, the result of every evaluated leaf is stored in
+    it, keyed by the position of the leaf in the Q tree.
+    """
+    is_and = q.connector == q.AND
+    result = is_and
+    missing_fields = []
+    for i, child in enumerate(q.children):
+        child_path = path + (i,)
+        if isinstance(child, Q):
+            r = partial_obj_matches_q(obj, child, lookup_adapter, using, leaf_values, child_path)
+        else:
+            filter_statement, value = child
+            missing_field = get_missing_field_path(obj, filter_statement)
+            expression_paths = get_expression_paths(value) if is_expression(value) else []
+            for expression_path in expression_paths if missing_field is None else []:
+                missing_field = get_missing_field_path(obj, expression_path)
+                if missing_field is not None:
+                    break
+            if missing_field is None:
+                r = obj_matches_leaf(obj, filter_statement, value, lookup_adapter, using)
+                # an F() expression that is NULL is left to the database, which knows how to negate it
+                r = Unknown() if r is None else bool(r)
+            else:
+                r = Unknown([missing_field])
+            if leaf_values is not None:
+                leaf_values[child_path] = r
+
+        if isinstance(r, Unknown):
+            missing_fields.extend(f for f in r.missing_fields if f not in missing_fields)
+        elif r != is_and:
+            # False decides an AND, True decides an OR
+            result = r
+            break
+    else:
+        if missing_fields:
+            result = Unknown(missing_fields)
+
+    if q.negated and isinstance(result, bool):
+        result = not result
+
+    return result
+
+
+def residual_q(q, leaf_values, path=()):
+    """
+    Returns the part of the Q object that is left to evaluate
+
+    `leaf_values` maps the positions of the leaves to the set of results they had. Leaves with a single known result
+    are replaced by it and the Q object is simplified. Returns True or False if nothing is left to evaluate.
+    """
+    is_and = q.connector == q.AND
+    children = []
+    for i, child in enumerate(q.children):
+        child_path = path + (i,)
+        if isinstance(child, Q):
+            r = residual_q(child, leaf_values, child_path)
+        else:
+            values = leaf_values.get(child_path, ())
+            r = child
+            if len(values) == 1 and UNKNOWN not in values:
+                r = next(iter(values))
+
+        if isinstance(r, bool):
+            if r != is_and:
+                return r != q.negated
+            # True in an AND and False in an OR change nothing
+            continue
+        children.append(r)
+
+    if not children:
+        return is_and != q.negated
+    if len(children) == 1 and isinstance(children[0], Q) and not q.negated:
+        return children[0]
+
+    residual = q.clone()
+    residual.children = children
+    return residual
+
+
+def get_missing_field_path(obj, filter_statement):
+    """
+    Returns the path of the first field or relation the filter statement needs that isn't loaded on obj
+
+    Returns None when the filter statement can be evaluated against obj without querying the database.
+    """
+    if not isinstance(obj, models.Model):
+        return None
+
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    if len(remaining_statement_parts) == 1:
+        attname = get_key_attname(get_obj_field(obj, next_token))
+        if attname is not None:
+            # the related object is compared by the key the object holds
+            return None if attname in obj.__dict__ else next_token
+    if not is_field_loaded(obj, next_token):
+        return next_token
+    if len(remaining_statement_parts) == 1:
+        return None
+
+    remaining_statement = '__'.join(remaining_statement_parts)
+    for o in get_model_attribute_values_by_db_name(obj, next_token):
+        missing = get_missing_field_path(o, remaining_statement)
+        if missing is not None:
+            return next_token + '__' + missing
+    return None
+
+
+def is_field_loaded(obj, name):
+    """Returns True if reading the field or relation `name` of obj doesn't query the database"""
+    field = get_obj_field(obj, name)
+    if isinstance(field, RELATED_FIELD_CLASSES):
+        descriptor = getattr(type(obj), field.get_accessor_name())
+        if hasattr(descriptor, 'cache_name'):
+            # reverse one to one
+            return hasattr(obj, descriptor.cache_name)
+        return field.field.related_query_name() in getattr(obj, '_prefetched_objects_cache', {})
+
+    if isinstance(field, models.ManyToManyField):
+        # traversing forward many to many relations is only supported in the database
+        return False
+
+    if field.attname not in obj.__dict__:
+        return False
+
+    if getattr(field, 'rel', None) is not None:
+        return getattr(obj, field.attname) is None or hasattr(obj, field.get_cache_name())
+
+    return True
+
+
+def matching_pks(model, db, q, pks):
+    """Returns the pks of the saved objects that match the Q object in the `db` database"""
+    return list(model._default_manager.using(db).filter(q, pk__in=pks).values_list('pk', flat=True))
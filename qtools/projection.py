@@ -0,0 +1,165 @@
+"""
+Loading only the fields a Q object needs
+
+    required_fields(Pizza, Q(diameter__gt=12) & Q(order__delivered_time__isnull=False))
+    # ['diameter', 'order__delivered_time']
+
+`filter_by_q(queryset, q, project=True)` loads the objects with `project_queryset` first. Only the fields the Q
+object reads are loaded, with `only()`. The single-valued relations it follows (foreign keys and one to ones) are
+joined with `select_related()`, unless the Q object only compares the key the object holds like `Q(order=order)`, and the multi-valued ones are prefetched with a `Prefetch` whose queryset is limited
+the same way:
+
+    Pizza.objects.only('diameter', 'order__delivered_time').select_related('order')
+
+The other fields of the returned objects are deferred, reading them runs a query per object. QuerySets that already
+use `only()`, `defer()`, `select_related()` or `prefetch_related()`, or that return values() rows, are left as they
+are.
+"""
+from collections import OrderedDict
+
+from django.db import models
+from django.db.models import Prefetch
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query_utils import Q
+
+from .expressions import get_expression_paths, is_expression
+from .filterq import get_key_attname, get_model_field
+from .utils import get_related_model, RELATED_FIELD_CLASSES
+
+try:
+    from django.db.models.query import ValuesQuerySet
+except ImportError:
+    # django 1.9+
+    ValuesQuerySet = None
+
+
+def required_fields(model, q):
+    """
+    Returns the paths of the fields the Q object reads, from `model`
+
+    Paths end at a local field of the model they reach, or at a relation when the Q object compares the related
+    objects themselves, like `Q(order=order)` or `Q(order__isnull=True)`. F() references are included.
+    """
+    paths = []
+    for path in _iter_paths(q):
+        field_path = '__'.join(get_field_path(model, path))
+        if field_path not in paths:
+            paths.append(field_path)
+    return paths
+
+
+def get_field_path(model, path):
+    """Returns the leading names of the path that are fields, `pk` replaced by the name of the primary key"""
+    field_path = []
+    for name in path.split('__'):
+        try:
+            field = get_model_field(model, name)
+        except (FieldDoesNotExist, KeyError):
+            # a lookup or a transform
+            break
+
+        field_path.append(field.name if name == 'pk' else name)
+        model = get_related_model(field)
+        if model is None:
+            break
+    return field_path
+
+
+def project_queryset(queryset, q):
+    """Returns the queryset limited to loading the fields the Q object needs, see required_fields"""
+    if not can_project(queryset):
+        return queryset
+
+    only, select_related, prefetches = _plan(queryset.model, required_fields(queryset.model, q), '', '')
+    queryset = queryset.only(*only or [queryset.model._meta.pk.name])
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+def can_project(queryset):
+    """Returns True for unevaluated querysets of model instances that don't pick their fields or relations yet"""
+    if queryset._result_cache is not None or queryset._prefetch_related_lookups:
+        return False
+    if queryset.query.select_related:
+        # True or the dict of the joined relations
+        return False
+    if queryset.query.deferred_loading != (set(), True):
+        return False
+    if ValuesQuerySet is not None:
+        return not isinstance(queryset, ValuesQuerySet)
+    from django.db.models.query import ModelIterable
+    return queryset._iterable_class is ModelIterable
+
+
+def _plan(model, paths, prefix, lookup_prefix):
+    """
+    Returns the only(), select_related() and prefetch_related() arguments loading the paths from model
+
+    `prefix` is the path from the model of the queryset to `model`, `lookup_prefix` the prefetch lookup to it.
+    """
+    only, select_related, prefetches = [], [], []
+    by_name = OrderedDict()
+    for path in paths:
+        name, _, rest = path.partition('__')
+        by_name.setdefault(name, [])
+        if rest:
+            by_name[name].append(rest)
+
+    for name, rest in by_name.items():
+        field = get_model_field(model, name)
+        related_model = get_related_model(field)
+        if related_model is None:
+            only.append(prefix + name)
+            continue
+
+        if not rest and get_key_attname(field) is not None:
+            # a relation compared by itself is compared by the key the object holds
+            only.append(prefix + name)
+            continue
+
+        related_paths = rest or [related_model._meta.pk.name]
+        is_reverse = isinstance(field, RELATED_FIELD_CLASSES)
+        if _is_single_valued(field):
+            # django needs the one to one field of a reverse relation to follow it
+            only.append(prefix + name + ('__' + field.field.name if is_reverse else ''))
+            select_related.append(prefix + name)
+            related_plan = _plan(related_model, related_paths, prefix + name + '__', lookup_prefix + name + '__')
+            only.extend(related_plan[0])
+            select_related.extend(related_plan[1])
+            prefetches.extend(related_plan[2])
+            continue
+
+        accessor_name = field.get_accessor_name() if is_reverse else name
+        related_only, related_select, related_prefetches = _plan(related_model, related_paths, '',
+                                                                 lookup_prefix + accessor_name + '__')
+        if is_reverse and not isinstance(field.field, models.ManyToManyField):
+            # the foreign key pointing back, to match the prefetched objects to theirs
+            related_only.append(field.field.name)
+
+        related_queryset = related_model._default_manager.only(*related_only)
+        if related_select:
+            related_queryset = related_queryset.select_related(*related_select)
+        prefetches.append(Prefetch(lookup_prefix + accessor_name, queryset=related_queryset))
+        prefetches.extend(related_prefetches)
+    return only, select_related, prefetches
+
+
+def _is_single_valued(field):
+    if isinstance(field, RELATED_FIELD_CLASSES):
+        return isinstance(field.field, models.OneToOneField)
+    return not isinstance(field, models.ManyToManyField)
+
+
+def _iter_paths(q):
+    for child in q.children:
+        if isinstance(child, Q):
+            for path in _iter_paths(child):
+                yield path
+        else:
+            yield child[0]
+            if is_expression(child[1]):
+                for path in get_expression_paths(child[1]):
+                    yield path
@@ -0,0 +1,153 @@
+"""
+Filtering values() and values_list() rows without creating model instances
+
+    rows = Pizza.objects.values('id', 'diameter', 'order__price')
+    expensive = filter_by_q(rows, Q(order__price__gt=10), model=Pizza)
+
+Rows are dicts or named tuples keyed like values() rows: by field name, or by the path of the field for fields of
+related models (`order__price`). Foreign keys may also be keyed by their attname (`order_id`). The field types come
+from the model, so the lookups behave the same as they do for model instances.
+
+A row holds one value per field, so filtering over a multi-valued relation matches row by row, like the rows of a
+values() query over that relation do.
+"""
+from django.db import models
+from django.db.models.query import QuerySet
+from django.db.models.query_utils import Q
+
+from .expressions import evaluate_expression, is_expression
+from .filterq import get_compiled_leaf, get_model_field, get_queryset_values, process_filter_statement
+from .lookups import get_lookup_adapter
+from .session import evaluation_session
+from .utils import get_related_model
+
+
+def filter_rows_by_q(rows, q, model, lookup_adapter=None, using=None):
+    """Filters values() rows of `model` by a Q object"""
+    with evaluation_session():
+        return [row for row in rows if row_matches_q(row, q, model, lookup_adapter, using)]
+
+
+def row_matches_q(row, q, model, lookup_adapter=None, using=None):
+    """Returns True if a values() row of `model` matches the Q object"""
+    if hasattr(row, '_asdict'):
+        row = row._asdict()
+
+    with evaluation_session():
+        return bool(_row_matches_q(row, q, model, lookup_adapter, using))
+
+
+def _row_matches_q(row, q, model, lookup_adapter, using):
+    is_and = q.connector == q.AND
+    does_it_match = is_and
+    is_unknown = False
+    for child in q.children:
+        if isinstance(child, Q):
+            r = _row_matches_q(row, child, model, lookup_adapter, using)
+        else:
+            filter_statement, value = child
+            r = row_matches_leaf(row, model, filter_statement, value, lookup_adapter, using)
+
+        if r is None:
+            # compared with NULL, decided by the other children like in SQL
+            is_unknown = True
+        elif is_and and not r:
+            does_it_match = False
+            break
+        elif not is_and and r:
+            does_it_match = True
+            break
+    else:
+        if is_unknown:
+            does_it_match = None
+
+    if q.negated and does_it_match is not None:
+        does_it_match = not does_it_match
+
+    return does_it_match
+
+
+def row_matches_leaf(row, model, filter_statement, filter_value, lookup_adapter=None, using=None):
+    """Returns True if the row matches a leaf of a Q object, F() references are read from the row"""
+    if not is_expression(filter_value):
+        return bool(row_matches_filter_statement(row, model, filter_statement, filter_value, lookup_adapter, using))
+
+    def get_path_values(path):
+        path = path.split('__')
+        return [get_row_value(row, path, get_path_fields(model, path)[1])]
+
+    adapter = get_lookup_adapter(lookup_adapter, using=using)
+    values = [v for v in evaluate_expression(filter_value, get_path_values, adapter) if v is not None]
+    for value in values:
+        if row_matches_filter_statement(row, model, filter_statement, value, adapter, using):
+            return True
+    if values:
+        return False
+
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    path = [next_token] + remaining_statement_parts[:-1]
+    # django negates the filter with `OR field IS NULL`
+    return None if get_row_value(row, path, get_path_fields(model, path)[1]) is not None else False
+
+
+def row_matches_filter_statement(row, model, filter_statement, filter_value, lookup_adapter=None, using=None):
+    """Returns True if the values() row of `model` matches the filter statement"""
+    next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+    path = [next_token] + remaining_statement_parts[:-1]
+    lookup = remaining_statement_parts[-1]
+    adapter = get_lookup_adapter(lookup_adapter, using=using)
+
+    field_model, fields = get_path_fields(model, path)
+    row_value = get_row_value(row, path, fields)
+
+    if isinstance(filter_value, QuerySet):
+        filter_value = get_queryset_values(filter_value, _get_compared_field_name(fields[-1]))
+
+    # the statement relative to the model of the field, like the last step of traversing model instances
+    field_statement = '__'.join(filter_statement.split('__')[len(path) - 1:])
+    leaf = get_compiled_leaf(field_model, path[-1], field_statement, filter_value, lookup, adapter, using)
+    if leaf is None:
+        # the filter was a no-op
+        return True
+
+    normalization = adapter.get_obj_value_normalization(leaf.lookup)
+    return leaf.kernel(adapter.normalize_obj_value(normalization, row_value, leaf.simple_type))
+
+
+def get_path_fields(model, path):
+    """Returns the model holding the last field of the path and the fields along the path, starting on `model`"""
+    fields = []
+    for name in path:
+        if fields:
+            related_model = get_related_model(fields[-1])
+            if related_model is None:
+                raise ValueError("Can't follow %s of %s, it isn't a relation" % (fields[-1].name, model.__name__))
+            model = related_model
+        fields.append(get_model_field(model, name))
+    return model, fields
+
+
+def _get_compared_field_name(field):
+    """Returns the field of the related model whose value a row holds for the field, 'pk' if it isn't a foreign key"""
+    if isinstance(field, models.ForeignKey):
+        return field.rel.get_related_field().name
+    return 'pk'
+
+
+def get_row_value(row, path, fields):
+    for key in _row_keys(path, fields):
+        if key in row:
+            return row[key]
+    raise KeyError('The row has no value for %s' % '__'.join(path))
+
+
+def _row_keys(path, fields):
+    field = fields[-1]
+    for name in (path[-1], field.name, getattr(field, 'attname', None)):
+        if name is not None:
+            yield '__'.join(path[:-1] + [name])
+
+    # the field a foreign key points to is stored in the foreign key's own column
+    if len(fields) > 1 and isinstance(fields[-2], models.ForeignKey) and fields[-2].rel.get_related_field() == field:
+        for key in _row_keys(path[:-1], fields[:-1]):
+            yield key
@@ -0,0 +1,170 @@
+"""
+Canonical serialization of Q objects
+
+    data = serialize_q(Q(price__gte=10) & Q(order__in=[o1, o2]))
+    q = deserialize_q(data)
+    fingerprint_q(q)
+
+The serialized form is compact json and deterministic:
+ - the children of AND/OR nodes are sorted and nested nodes with the same connector are flattened, so
+   `Q(a=1) & Q(b=2)` and `Q(b=2) & Q(a=1)` serialize the same
+ - aware datetimes are converted to UTC
+ - sets are sorted
+ - model instances are stored as (app_label.model_name, pk) and come back as unsaved instances holding only the pk
+ - QuerySets are evaluated to the pks they contain and come back as `pk__in` QuerySets. values() and values_list()
+   QuerySets are evaluated to the values of their first field and come back as `values_list` QuerySets of that field.
+"""
+import datetime
+import hashlib
+import json
+import uuid
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import models
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils import six, timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from .utils import model_label
+
+
+class QSerializer(object):
+    def serialize(self, q):
+        return _dumps(self.to_data(q))
+
+    def deserialize(self, data):
+        if isinstance(data, six.string_types):
+            data = json.loads(data)
+        return self.from_data(data)
+
+    def to_data(self, q):
+        if not isinstance(q, Q):
+            raise ValueError('Not a Q object')
+        return self._node_to_data(q)
+
+    def from_data(self, data):
+        tag, connector, negated, children = data
+        q = Q()
+        q.connector = str(connector)
+        q.negated = negated
+        q.children = [self._child_from_data(child) for child in children]
+        return q
+
+    def _node_to_data(self, q):
+        children = []
+        for child in q.children:
+            if isinstance(child, Q):
+                if not child.negated and (child.connector == q.connector or len(child.children) == 1):
+                    children.extend(self._node_to_data(child)[3])
+                else:
+                    children.append(self._node_to_data(child))
+            else:
+                statement, value = child
+                children.append([statement, self.encode_value(value)])
+
+        children.sort(key=_dumps)
+        return ['Q', q.connector, q.negated, children]
+
+    def _child_from_data(self, child):
+        if child[0] == 'Q' and len(child) == 4:
+            return self.from_data(child)
+        statement, value = child
+        return str(statement), self.decode_value(value)
+
+    def encode_value(self, value):
+        if value is None or isinstance(value, (bool, six.string_types)):
+            return value
+        if isinstance(value, six.integer_types + (float,)):
+            return value
+        if isinstance(value, Decimal):
+            return {'$decimal': str(value)}
+        if isinstance(value, datetime.datetime):
+            if timezone.is_aware(value):
+                value = value.astimezone(timezone.utc)
+            return {'$datetime': value.isoformat()}
+        if isinstance(value, datetime.date):
+            return {'$date': value.isoformat()}
+        if isinstance(value, datetime.time):
+            return {'$time': value.isoformat()}
+        if isinstance(value, datetime.timedelta):
+            return {'$timedelta': [value.days, value.seconds, value.microseconds]}
+        if isinstance(value, uuid.UUID):
+            return {'$uuid': str(value)}
+        if isinstance(value, models.Model):
+            return {'$model': [model_label(value), self.encode_value(value.pk)]}
+        if isinstance(value, QuerySet):
+            # like in the database, values() and values_list() querysets stand for their first field
+            fields = getattr(value, '_fields', None)
+            if not fields:
+                pks = [self.encode_value(pk) for pk in value.values_list('pk', flat=True)]
+                return {'$queryset': [model_label(value.model), sorted(pks, key=_dumps)]}
+            values = [self.encode_value(v) for v in value.values_list(fields[0], flat=True)]
+            # repeated values don't change an `__in` comparison
+            values = sorted(dict((_dumps(v), v) for v in values).values(), key=_dumps)
+            return {'$queryset': [model_label(value.model), values, fields[0]]}
+        if isinstance(value, list):
+            return {'$list': [self.encode_value(v) for v in value]}
+        if isinstance(value, tuple):
+            return {'$tuple': [self.encode_value(v) for v in value]}
+        if isinstance(value, (set, frozenset)):
+            return {'$set': sorted([self.encode_value(v) for v in value], key=_dumps)}
+
+        raise ValueError('Unable to serialize %s values in a Q object.' % type(value).__name__)
+
+    def decode_value(self, value):
+        if not isinstance(value, dict):
+            return value
+
+        (tag, data), = value.items()
+        if tag == '$decimal':
+            return Decimal(data)
+        if tag == '$datetime':
+            return parse_datetime(data)
+        if tag == '$date':
+            return parse_date(data)
+        if tag == '$time':
+            return parse_time(data)
+        if tag == '$timedelta':
+            return datetime.timedelta(*data)
+        if tag == '$uuid':
+            return uuid.UUID(data)
+        if tag == '$model':
+            label, pk = data
+            return apps.get_model(label)(pk=self.decode_value(pk))
+        if tag == '$queryset':
+            manager = apps.get_model(data[0])._default_manager
+            values = [self.decode_value(v) for v in data[1]]
+            if len(data) == 2:
+                return manager.filter(pk__in=values)
+            field = data[2]
+            return manager.filter(**{field + '__in': values}).values_list(field, flat=True)
+        if tag == '$list':
+            return [self.decode_value(v) for v in data]
+        if tag == '$tuple':
+            return tuple(self.decode_value(v) for v in data)
+        if tag == '$set':
+            return set(self.decode_value(v) for v in data)
+
+        raise ValueError('Unknown serialized value %s' % repr(value))
+
+
+def _dumps(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+def serialize_q(q):
+    """Returns a compact, deterministic json representation of the Q object"""
+    return QSerializer().serialize(q)
+
+
+def deserialize_q(data):
+    """Rebuilds a Q object from the output of serialize_q"""
+    return QSerializer().deserialize(data)
+
+
+def fingerprint_q(q, serializer=None):
+    """Returns a hash of the structure of the Q object. Equivalent Q objects have the same fingerprint."""
+    serializer = serializer or QSerializer()
+    return hashlib.sha1(serializer.serialize(q).encode('utf-8')).hexdigest()
@@ -0,0 +1,64 @@
+"""
+Evaluation sessions
+
+Work that only depends on the objects being filtered is remembered for the length of a session, so evaluating
+many Q objects over the same objects doesn't repeat it. `filter_by_q` and `obj_matches_q` open a session when none
+is active. Open one yourself to share the work across several calls:
+
+    with evaluation_session():
+        delivered = filter_by_q(pizzas, PizzaQuerySet.is_delivered.q())
+        recent = filter_by_q(pizzas, PizzaQuerySet.delivered_in_last_x_days.q(5))
+
+Objects are assumed not to change while a session is open. Everything remembered is released when the outermost
+session ends.
+"""
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class EvaluationSession(object):
+    def __init__(self):
+        self._memo = {}
+
+    def memoize(self, key, owner, compute):
+        """
+        Returns the result of compute(), computing it once per session for the key
+
+        `owner` is the object whose id is part of the key. It is kept with the result so its id can't be reused by
+        another object during the session.
+        """
+        try:
+            cached_owner, value = self._memo[key]
+            if cached_owner is owner:
+                return value
+        except KeyError:
+            pass
+
+        value = compute()
+        self._memo[key] = (owner, value)
+        return value
+
+    def clear(self):
+        self._memo.clear()
+
+
+def get_current_session():
+    return getattr(_local, 'session', None)
+
+
+@contextmanager
+def evaluation_session():
+    """Opens a session, or joins the session that is already open"""
+    session = get_current_session()
+    if session is not None:
+        yield session
+        return
+
+    session = _local.session = EvaluationSession()
+    try:
+        yield session
+    finally:
+        _local.session = None
+        session.clear()
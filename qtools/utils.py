@@ -1,8 +1,9 @@
 import datetime
 
-from django.db import connection, models
+from django.db import connections, models, DEFAULT_DB_ALIAS
 from django.db.backends.utils import typecast_timestamp as django_typecast_timestamp
 from django.db.models.fields.related import ForeignObjectRel
+from django.dispatch import receiver
 from django.utils import six
 
 RELATED_FIELD_CLASSES = [ForeignObjectRel]
@@ -15,6 +16,12 @@ except ImportError:
 
 RELATED_FIELD_CLASSES = tuple(RELATED_FIELD_CLASSES)
 
+try:
+    from django.core.signals import setting_changed
+except ImportError:
+    # django 1.7
+    from django.test.signals import setting_changed
+
 from .exceptions import InvalidFieldLookupCombo
 
 
@@ -27,6 +34,25 @@ def limit_float_to_digits(num, digits):
     return num
 
 
+def model_label(model):
+    """Returns the lowercase 'app_label.model_name' of a model class or instance"""
+    opts = model._meta
+    return '%s.%s' % (opts.app_label, opts.model_name)
+
+
+def get_related_model(field):
+    """
+    Returns the model a relation leads to, None for fields that aren't relations
+
+    Reverse relations are ForeignObjectRels, or RelatedObjects on django 1.7, which have no `related_model`.
+    """
+    if isinstance(field, RELATED_FIELD_CLASSES):
+        return field.related_model if hasattr(field, 'related_model') else field.model
+    if getattr(field, 'rel', None) is not None:
+        return field.rel.to
+    return None
+
+
 def django_instances_to_keys(*objs):
     """Convert django instances to keys"""
     return_objs = []
@@ -101,7 +127,11 @@ def remove_trailing_spaces_if_string(val):
 
 _DB_TYPES_SIMPLE_MAP = {
     'bool':             'boolean',
+    'boolean':          'boolean',
     'integer':          'number',
+    'serial':           'number',
+    'smallint':         'number',
+    'bigint':           'number',
     'float':            'number',
     'double precision': 'number',
     'real':             'number',
@@ -112,10 +142,29 @@ _DB_TYPES_SIMPLE_MAP = {
 }
 
 
-def get_field_simple_datatype(field):
+_FIELD_SIMPLE_DATATYPES = {}
+
+
+def get_field_simple_datatype(field, using=None):
+    """Returns the simple datatype of the field in the `using` database, cached per database alias"""
     if isinstance(field, RELATED_FIELD_CLASSES):
         return 'number'
 
+    key = (using or DEFAULT_DB_ALIAS, field.model, field.name)
+    try:
+        return _FIELD_SIMPLE_DATATYPES[key]
+    except KeyError:
+        simple_type = _FIELD_SIMPLE_DATATYPES[key] = _get_field_simple_datatype(field, connections[key[0]])
+        return simple_type
+
+
+@receiver(setting_changed)
+def _clear_field_simple_datatypes(setting, **kwargs):
+    if setting == 'DATABASES':
+        _FIELD_SIMPLE_DATATYPES.clear()
+
+
+def _get_field_simple_datatype(field, connection):
     db_field_type = field.db_type(connection)
 
     if 'varchar' in db_field_type:
@@ -124,7 +173,7 @@ def get_field_simple_datatype(field):
     if 'numeric' in db_field_type:
         return 'number'
     
-    if 'datetime' in db_field_type:
+    if 'datetime' in db_field_type or db_field_type.startswith('timestamp'):
         return 'datetime'
 
     return _DB_TYPES_SIMPLE_MAP.get(db_field_type, db_field_type)
@@ -147,3 +196,20 @@ def nested_q(prefix, q_obj):
         key, value = q_obj
         return prefix + '__' + key, value
     raise Exception("Not a Q object")
+
+
+def get_m2m_through_models(model):
+    """Returns the intermediate models of every many-to-many relation on either side of `model`"""
+    opts = model._meta
+    m2m_fields = list(opts.many_to_many)
+    if hasattr(opts, 'get_fields'):
+        m2m_fields += [f.field for f in opts.get_fields() if f.auto_created and f.many_to_many]
+    else:
+        # django 1.7
+        m2m_fields += [r.field for r in opts.get_all_related_many_to_many_objects()]
+
+    through_models = set()
+    for field in m2m_fields:
+        rel = getattr(field, 'remote_field', None) or field.rel
+        through_models.add(rel.through)
+    return through_models
@@ -0,0 +1,141 @@
+"""
+Warming up and validating q_methods at startup
+
+The first evaluation in a fresh process resolves the lookup adapter of each database, the model fields and their
+types. Invalid field and lookup combinations are only found then. `warm_up()` does that work up front for every
+installed model:
+
+    from qtools.warmup import warm_up
+    warm_up()
+
+It resolves the adapters and field types of every database, and runs every q_method and as_property/as_method
+descriptor that takes no arguments, compiling each filter of the Q object it returns. Invalid ones raise
+ImproperlyConfigured. No queries are run. Add `qtools.apps.QToolsConfig` to INSTALLED_APPS to warm up in `ready()`.
+
+Run it before the server forks (gunicorn's `preload_app = True`) so every worker starts with the warmed state.
+"""
+import gc
+import inspect
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query import QuerySet
+from django.db.models.query_utils import Q
+
+from .decorator import QToMethodDescriptor, q_method
+from .exceptions import InvalidLookupUsage
+from .expressions import is_expression
+from .filterq import compile_leaf, get_model_field, process_filter_statement
+from .lookups import get_lookup_adapter
+from .rows import get_path_fields
+from .utils import get_field_simple_datatype
+
+
+def warm_up(using=None, freeze=False):
+    """
+    Warms the caches for the `using` databases (all of them by default) and validates the q_methods
+
+    Returns the names of the validated q_methods and descriptors. With `freeze`, the objects created so far are moved
+    out of the garbage collector's reach (python 3.7+), so forked workers don't copy the memory pages holding them.
+    """
+    aliases = [using] if using else list(connections)
+    for alias in aliases:
+        get_lookup_adapter(using=alias)
+
+    validated = []
+    errors = []
+    for model in apps.get_models():
+        warm_up_model(model, aliases)
+        for name, q_func in iter_parameterless_q_funcs(model):
+            validated.append(name)
+            try:
+                q = q_func()
+                for alias in aliases:
+                    validate_q(model, q, using=alias)
+            except (InvalidLookupUsage, FieldDoesNotExist, ValueError) as e:
+                errors.append('%s: %s' % (name, e))
+
+    if errors:
+        raise ImproperlyConfigured('Invalid q_methods:\n%s' % '\n'.join(errors))
+
+    if freeze and hasattr(gc, 'freeze'):
+        gc.freeze()
+    return validated
+
+
+def warm_up_model(model, aliases):
+    """Resolves the fields of the model and the type of its columns in each database"""
+    opts = model._meta
+    for field in opts.concrete_fields:
+        get_model_field(model, field.name)
+        for alias in aliases:
+            get_field_simple_datatype(field, alias)
+
+
+def validate_q(model, q, using=None):
+    """Compiles every filter of the Q object, raising InvalidLookupUsage for the ones that can't be evaluated"""
+    adapter = get_lookup_adapter(using=using)
+    for child in q.children:
+        if isinstance(child, Q):
+            validate_q(model, child, using)
+            continue
+
+        filter_statement, filter_value = child
+        if isinstance(filter_value, QuerySet) or is_expression(filter_value):
+            # evaluating the queryset would query the database, expressions are evaluated per object
+            continue
+
+        next_token, remaining_statement_parts = process_filter_statement(filter_statement)
+        path = [next_token] + remaining_statement_parts[:-1]
+        field_model, fields = get_path_fields(model, path)
+        field_statement = '__'.join(filter_statement.split('__')[len(path) - 1:])
+        lookup = remaining_statement_parts[-1]
+        compile_leaf(field_model, path[-1], field_statement, filter_value, lookup, adapter, using)
+
+
+def iter_parameterless_q_funcs(model):
+    """Yields (name, q_func) for the q_methods of the model's querysets and its descriptors that take no arguments"""
+    for queryset_class in _iter_queryset_classes(model):
+        for name, attr in _iter_class_attributes(queryset_class, q_method):
+            if _takes_no_arguments(attr.fn, skip=1):
+                yield '%s.%s' % (queryset_class.__name__, name), getattr(queryset_class, name).q
+
+    for name, attr in _iter_class_attributes(model, QToMethodDescriptor):
+        if attr._is_property or _takes_no_arguments(attr._q_func.fn, skip=1):
+            yield '%s.%s' % (model.__name__, name), attr._q_func
+
+
+def _iter_queryset_classes(model):
+    opts = model._meta
+    if hasattr(opts, 'concrete_managers'):
+        # django < 1.10
+        managers = [manager for _, _, manager in opts.concrete_managers + opts.abstract_managers]
+    else:
+        managers = opts.managers
+
+    seen = []
+    for manager in managers:
+        queryset_class = getattr(manager, '_queryset_class', None)
+        if queryset_class is not None and queryset_class not in seen:
+            seen.append(queryset_class)
+            yield queryset_class
+
+
+def _iter_class_attributes(cls, attr_type):
+    seen = set()
+    for klass in cls.__mro__:
+        for name, attr in vars(klass).items():
+            if name not in seen:
+                seen.add(name)
+                if isinstance(attr, attr_type):
+                    yield name, attr
+
+
+def _takes_no_arguments(fn, skip=0):
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    spec = getargspec(fn)
+    required = len(spec.args) - skip - len(spec.defaults or ())
+    required_kwonly = set(getattr(spec, 'kwonlyargs', None) or ()) - set(getattr(spec, 'kwonlydefaults', None) or ())
+    return required <= 0 and not required_kwonly
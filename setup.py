@@ -1,3 +1,5 @@
+import sys
+from distutils.command.build_py import build_py
 from distutils.core import setup
 
 long_description = """
@@ -6,6 +8,16 @@ querying related objects).  This repetition makes is hard to maintain and defini
 This library allows a piece of filtering logic to be written once and then used in many different contexts.
 """
 
+
+class BuildPy(build_py):
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            # qtools.aio uses async def, a syntax error before python 3.5
+            modules = [module for module in modules if module[:2] != ('qtools', 'aio')]
+        return modules
+
+
 setup(
     name='django-qtools',
     version='1.0',
@@ -18,4 +30,5 @@ setup(
     license='MIT',
     description='Write DRY, composable filtering logic for data queries and instance methods.',
     long_description=long_description,
+    cmdclass={'build_py': BuildPy},
 )
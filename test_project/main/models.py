@@ -28,6 +28,9 @@ class Order(models.Model):
 
     objects = OrderQuerySet.as_manager()
 
+    is_delivered = OrderQuerySet.is_delivered.as_property()
+    is_affordable = OrderQuerySet.cost_between.as_property()
+
 
 class Topping(models.Model):
     name = models.CharField(max_length=50)
@@ -47,6 +50,10 @@ class PizzaQuerySet(QuerySet):
     def is_delivered_using_cls(cls):
         return cls.is_delivered()
 
+    @q_method
+    def has_gluten_free_toppings(cls):
+        return Q(toppings__is_gluten_free=True)
+
     def is_delivered_using_self(self):
         return self.filter(self.is_delivered.q())
 
@@ -60,6 +67,12 @@ class Pizza(models.Model):
 
     is_delivered = PizzaQuerySet.is_delivered.as_property(execute_in_memory=True)
     is_delivered_method = PizzaQuerySet.is_delivered.as_method(execute_in_memory=True)
+    is_delivered_planned = PizzaQuerySet.is_delivered.as_property(execute_in_memory=True, missing='query')
+    is_delivered_in_db = PizzaQuerySet.is_delivered.as_property()
+    has_gluten_free_toppings = PizzaQuerySet.has_gluten_free_toppings.as_property()
+    ais_delivered = PizzaQuerySet.is_delivered.as_async_property(execute_in_memory=True)
+    ais_delivered_in_db = PizzaQuerySet.is_delivered.as_async_property()
+    adelivered_in_last_x_days = PizzaQuerySet.delivered_in_last_x_days.as_async_method()
 
 
 class MiscModel(models.Model):
@@ -1,20 +1,24 @@
 # coding=utf-8
 from __future__ import print_function
 import datetime
+import multiprocessing
+import os
+import shutil
+import tempfile
 from decimal import InvalidOperation
 
 from django.core.exceptions import ValidationError
-from django.db import transaction, IntegrityError
+from django.core.management import call_command
+from django.db import connection, transaction, IntegrityError
 from django.db.models import Q
 from django.db.utils import DataError
 from django.utils import six, timezone
-from qtools import filter_by_q
-from qtools.exceptions import InvalidLookupUsage, InvalidLookupValue, InvalidFieldLookupCombo
+from qtools import filter_by_q, obj_matches_q, evaluation_session
+from qtools.exceptions import InvalidLookupUsage
 from qtools.filterq import obj_matches_filter_statement
 
 from main.models import MiscModel
 
-MATCHES_NOTHING = object()
 NOT_SET = object()
 
 
@@ -108,72 +112,48 @@ class QInPythonTestCaseMixin(object):
                 sql=e.sql
             )
 
-    def assert_lookups_work(self, field_names, lookup_names, test_values, fail_fast=False, skip_first=0):
-        does_not_match_db_exceptions = []
-        invalid_usage_exception_count = 0
-        invalid_db_state_count = 0
-        tested_and_passed_count = 0
-        status_msg = '\rTesting %s__%s.  Total Progress: %i/%i  Invalid DB State: %i  Invalid Usage: %i  DBMatchProblem: %i  Passed: %i  Off By: %i               '
-        test_count = 0
-        num_tests = len(test_values) * len(test_values) * len(lookup_names) * len(field_names)
-        print("Running %i tests total" % num_tests)
-        print("Running %i tests for per lookup" % (len(test_values) * len(test_values) * len(field_names)))
-        for lookup_name in lookup_names:
-            for field_name in field_names:
-                skip_field_name = MATCHES_NOTHING
-                print('')
-                for obj_value in test_values:
-                    skip_obj_value = MATCHES_NOTHING
-                    for filter_value in test_values:
-                        test_count += 1
-
-                        if lookup_name == 'search' and field_name == 'text':
-                            # doesn't work.
-                            continue
-
-                        if test_count < skip_first:
-                            continue
-
-                        if obj_value == skip_obj_value:
-                            # this value cannot be saved to db in this type of field, skip it
-                            invalid_db_state_count += 1
-                            continue
-
-                        if field_name == skip_field_name:
-                            # this field_name / lookup combo is not valid, skip it
-                            invalid_usage_exception_count += 1
-                            continue
-                        checksum = invalid_db_state_count + invalid_usage_exception_count + len(does_not_match_db_exceptions) + tested_and_passed_count
-                        discrepency = test_count - checksum
-                        print(status_msg % (
-                            field_name, lookup_name, test_count, num_tests, invalid_db_state_count,
-                            invalid_usage_exception_count, len(does_not_match_db_exceptions), tested_and_passed_count,
-                            discrepency
-                        ), end='')
-                        try:
-                            self.assert_lookup_matches_db_execution(lookup_name, field_name, obj_value, filter_value, fail_fast=fail_fast)
-                        except InvalidDbState:
-                            invalid_db_state_count += 1
-                            skip_obj_value = obj_value
-                        except InvalidLookupValue:
-                            invalid_usage_exception_count += 1
-                        except InvalidFieldLookupCombo:
-                            skip_field_name = field_name
-                            invalid_usage_exception_count += 1
-                        except InvalidLookupUsage:
-                            invalid_usage_exception_count += 1
-                        except DoesNotMatchDbExecution as e:
-                            does_not_match_db_exceptions.append(e)
-                            print('')
-                            print(e)
-                            if fail_fast:
-                                raise
-                        else:
-                            tested_and_passed_count += 1
-        print('')
-        print("Passed %s lookup tests and failed %s tests." % (tested_and_passed_count, len(does_not_match_db_exceptions)))
-        if does_not_match_db_exceptions:
-            raise Exception(',\n'.join([str(e) for e in does_not_match_db_exceptions]))
+    def assert_lookups_work(self, field_names, lookup_names, test_values, fail_fast=False, processes=None):
+        """
+        Compare every field/lookup/object value/filter value combination in python and in the db
+
+        Objects holding each of the test values are saved once per field. Each (lookup, filter value) then runs as a
+        single query and is compared object by object to the in-memory evaluation. On sqlite the fields are spread
+        across forked worker processes that each use their own database file. Where processes can't be forked they
+        run one after the other.
+        """
+        if processes is None:
+            processes = multiprocessing.cpu_count() if connection.vendor == 'sqlite' else 1
+        if not can_fork_workers():
+            processes = 1
+
+        jobs = [(field_name, lookup_names, test_values, fail_fast) for field_name in field_names]
+        print("Running %i tests total" % (len(test_values) * len(test_values) * len(lookup_names) * len(field_names)))
+
+        if processes > 1 and len(jobs) > 1 and connection.vendor == 'sqlite':
+            db_dir = tempfile.mkdtemp()
+            pool = multiprocessing.Pool(min(processes, len(jobs)), initializer=use_own_sqlite_file, initargs=(db_dir,))
+            try:
+                results = pool.map(check_field_lookups, jobs)
+            finally:
+                pool.terminate()
+                shutil.rmtree(db_dir, ignore_errors=True)
+        else:
+            results = [check_field_lookups(job) for job in jobs]
+
+        failures = []
+        counts = dict.fromkeys(['passed', 'invalid_db_state', 'invalid_usage', 'not_in_db'], 0)
+        for field_name, field_counts, field_failures in results:
+            print('Tested %s.  Invalid DB State: %i  Invalid Usage: %i  Not In DB: %i  DBMatchProblem: %i  Passed: %i' % (
+                field_name, field_counts['invalid_db_state'], field_counts['invalid_usage'], field_counts['not_in_db'],
+                len(field_failures), field_counts['passed']
+            ))
+            for key in counts:
+                counts[key] += field_counts[key]
+            failures.extend(field_failures)
+
+        print("Passed %s lookup tests and failed %s tests." % (counts['passed'], len(failures)))
+        if failures:
+            raise Exception(',\n'.join(failures))
 
     def run_through_lookup_test_cases(self, field_name, lookup_name, test_values_and_expectations):
         for obj_value, filter_value, expected, expected_mysql in test_values_and_expectations:
@@ -289,7 +269,9 @@ class QInPythonTestCaseMixin(object):
 
         try:
             qs = model.objects.filter(q)
-            db_result = list(qs)
+            # a savepoint so a failing query doesn't abort the surrounding transaction (postgres)
+            with transaction.atomic():
+                db_result = list(qs)
         except Exception as e:
             db_result = e
 
@@ -312,7 +294,7 @@ class QInPythonTestCaseMixin(object):
             if isinstance(mem_result, Exception):
                 raise mem_result
 
-        if set(db_result) != set(mem_result):
+        if isinstance(db_result, Exception) or isinstance(mem_result, Exception) or set(db_result) != set(mem_result):
             try:
                 sql = str(qs.query)
             except:
@@ -329,6 +311,124 @@ class QInPythonTestCaseMixin(object):
             raise Exception('Did not behave as expected.')
 
 
+def check_field_lookups(job):
+    """
+    Saves an object for each test value in the field, then compares each lookup/filter value in python and in the db
+
+    Returns the field name, the counts of each outcome and the failure messages.
+    """
+    field_name, lookup_names, test_values, fail_fast = job
+    counts = dict.fromkeys(['passed', 'invalid_db_state', 'invalid_usage', 'not_in_db'], 0)
+    failures = []
+
+    MiscModel.objects.all().delete()
+    filter_values = [create_test_value(value) for value in test_values]
+
+    obj_values = {}
+    for obj_value in test_values:
+        obj_value = create_test_value(obj_value)
+        try:
+            with transaction.atomic():
+                m = MiscModel(**{field_name: obj_value})
+                m.save()
+        except (IntegrityError, ValueError, ValidationError, TypeError, InvalidOperation, DataError):
+            # we aren't testing which field values are valid to save in the db, so we'll skip these cases
+            counts['invalid_db_state'] += len(test_values) * len(lookup_names)
+            continue
+        obj_values[m.pk] = obj_value
+
+    objs = list(MiscModel.objects.all())
+
+    with evaluation_session():
+        for lookup_name in lookup_names:
+            if lookup_name == 'search' and field_name == 'text' and connection.vendor == 'mysql':
+                # needs a fulltext index
+                continue
+
+            for filter_value in filter_values:
+                q = Q(**{field_name + '__' + lookup_name: filter_value})
+                db_result = run_db_query(MiscModel, q)
+                py_results = evaluate_in_memory(objs, q)
+
+                for obj in objs:
+                    if obj.pk not in obj_values:
+                        # rows created for model test values
+                        continue
+
+                    db_matches = db_result if isinstance(db_result, Exception) else obj.pk in db_result
+                    py_matches = py_results[obj.pk]
+
+                    if isinstance(py_matches, InvalidLookupUsage):
+                        counts['invalid_usage'] += 1
+                    elif isinstance(db_matches, NotImplementedError):
+                        # the backend doesn't have the lookup (search on sqlite), nothing to compare with
+                        counts['not_in_db'] += 1
+                    elif isinstance(db_matches, Exception) and isinstance(py_matches, Exception):
+                        counts['passed'] += 1
+                    elif isinstance(db_matches, Exception) or isinstance(py_matches, Exception) or db_matches != py_matches:
+                        try:
+                            sql = str(MiscModel.objects.filter(q).query)
+                        except:
+                            sql = ''
+                        failures.append(str(LookupDoesNotMatchDbExecution(
+                            lookup_name=lookup_name,
+                            field_name=field_name,
+                            obj_value=obj_values[obj.pk],
+                            filter_value=filter_value,
+                            db_result=db_matches,
+                            py_result=py_matches,
+                            saved_db_value=getattr(obj, field_name, None),
+                            sql=sql
+                        )))
+                        if fail_fast:
+                            return field_name, counts, failures
+                    else:
+                        counts['passed'] += 1
+
+    return field_name, counts, failures
+
+
+def run_db_query(model, q):
+    """Returns the set of matching pks, or the exception the query raised"""
+    try:
+        # a savepoint so a failing query doesn't abort the surrounding transaction (postgres)
+        with transaction.atomic():
+            return set(model.objects.filter(q).values_list('pk', flat=True))
+    except Exception as e:
+        return e
+
+
+def evaluate_in_memory(objs, q):
+    """Returns whether each object matches (or the exception it raised) keyed by pk"""
+    try:
+        matched = set(obj.pk for obj in filter_by_q(objs, q))
+    except Exception:
+        # find out which objects raised
+        return dict((obj.pk, _obj_matches_q_or_exception(obj, q)) for obj in objs)
+    return dict((obj.pk, obj.pk in matched) for obj in objs)
+
+
+def _obj_matches_q_or_exception(obj, q):
+    try:
+        return obj_matches_q(obj, q)
+    except Exception as e:
+        return e
+
+
+def can_fork_workers():
+    """The pool workers rely on inheriting the configured django and test settings from a fork"""
+    if hasattr(multiprocessing, 'get_start_method'):
+        return multiprocessing.get_start_method() == 'fork'
+    return hasattr(os, 'fork')
+
+
+def use_own_sqlite_file(db_dir):
+    """Pool initializer: points the forked worker at a fresh sqlite database file"""
+    connection.settings_dict['NAME'] = os.path.join(db_dir, 'worker-%i.sqlite3' % os.getpid())
+    connection.close()
+    call_command('migrate', verbosity=0, interactive=False)
+
+
 def create_test_value(value):
     if isinstance(value, six.string_types) and value.startswith('TestValue: '):
         value_type = value.replace('TestValue: ', '')
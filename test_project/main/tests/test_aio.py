@@ -0,0 +1,74 @@
+import sys
+import unittest
+from datetime import timedelta
+
+from django.db.models import Q
+from django.test.testcases import TransactionTestCase
+from django.utils import timezone
+from qtools import filter_by_q
+
+from main.models import MiscModel, Order, Pizza, PizzaQuerySet
+
+HAS_ASYNC = sys.version_info >= (3, 5)
+
+# qtools.aio uses async def, a syntax error before python 3.5
+if HAS_ASYNC:
+    import asyncio
+    from qtools.aio import afilter_by_q, aobj_matches_q, amatches_q_in_db, get_relation_paths
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+# the queries run on other threads, so the test data has to be committed
+@unittest.skipUnless(HAS_ASYNC, 'qtools.aio requires python 3.5+')
+class AsyncTests(TransactionTestCase):
+    def create_pizzas(self):
+        now = timezone.now()
+        delivered = Order.objects.create(price=10, delivered_time=now - timedelta(days=1))
+        old = Order.objects.create(price=10, delivered_time=now - timedelta(days=10))
+        pending = Order.objects.create(price=10)
+        return [Pizza.objects.create(diameter=12, created=now, order=order) for order in [delivered, old, pending, None]]
+
+    def test_relation_paths(self):
+        q = Q(order__delivered_time__isnull=False) | Q(toppings__name='cheese', diameter__gt=3)
+        self.assertEqual(['order', 'toppings'], get_relation_paths(Pizza, q))
+        self.assertEqual(['foreign__extra_info'], get_relation_paths(MiscModel, Q(foreign__extra_info__text='a')))
+        self.assertEqual(['pizza_set'], get_relation_paths(Order, Q(pizza__diameter=12)))
+
+    def test_afilter_by_q(self):
+        self.create_pizzas()
+        pizzas = list(Pizza.objects.all())
+        q = PizzaQuerySet.is_delivered.q()
+
+        result = run(afilter_by_q(pizzas, q))
+        self.assertEqual(pizzas[:2], result)
+
+        # the orders were prefetched, filtering again doesn't touch the database
+        with self.assertNumQueries(0):
+            self.assertEqual(result, filter_by_q(pizzas, q))
+
+    def test_aobj_matches_q(self):
+        pizzas = self.create_pizzas()
+        q = PizzaQuerySet.delivered_in_last_x_days.q(5)
+        self.assertEqual([True, False, False, False], [run(aobj_matches_q(pizza, q)) for pizza in pizzas])
+
+    def test_amatches_q_in_db(self):
+        pizzas = self.create_pizzas()
+        q = Q(order__delivered_time__isnull=False)
+        self.assertEqual([True, True, False, False], run(amatches_q_in_db(pizzas, q)))
+        self.assertEqual([False, False, True, True], run(amatches_q_in_db(pizzas[::-1], q, chunk_size=1)))
+
+    def test_async_descriptors(self):
+        pizzas = self.create_pizzas()
+        self.assertTrue(run(pizzas[0].ais_delivered))
+        self.assertFalse(run(pizzas[2].ais_delivered))
+        self.assertTrue(run(pizzas[1].ais_delivered_in_db))
+        self.assertFalse(run(pizzas[3].ais_delivered_in_db))
+        self.assertTrue(run(pizzas[0].adelivered_in_last_x_days(5)))
+        self.assertFalse(run(pizzas[1].adelivered_in_last_x_days(5)))
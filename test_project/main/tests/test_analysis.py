@@ -0,0 +1,158 @@
+import datetime
+from decimal import Decimal
+
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import filter_by_q
+from qtools.analysis import is_satisfiable, q_implies
+
+from main.models import MiscModel, Order, OrderQuerySet, Pizza, PizzaQuerySet
+
+
+class SatisfiabilityTests(TestCase):
+    def assert_unsatisfiable(self, model, q):
+        self.assertFalse(is_satisfiable(q, model))
+        self.assertEqual([], list(model.objects.filter(q)))
+
+    def assert_satisfiable(self, model, q):
+        self.assertTrue(is_satisfiable(q, model))
+
+    def test_contradictions(self):
+        self.assert_unsatisfiable(Order, Q(pk__in=[]))
+        self.assert_unsatisfiable(Order, Q(price__gt=10) & Q(price__lt=5))
+        self.assert_unsatisfiable(Order, Q(price__gt=10, price__lte=10))
+        self.assert_unsatisfiable(Order, Q(price__range=(10, 5)))
+        self.assert_unsatisfiable(Order, Q(delivered_time__isnull=True) & Q(delivered_time__year=2015) & Q(delivered_time=timezone.now()))
+        self.assert_unsatisfiable(Order, Q(name_on_order='Bob') & Q(name_on_order='Sue'))
+        self.assert_unsatisfiable(Order, Q(price=Decimal('10.5')) & Q(price__in=[1, 2, 3]))
+        self.assert_unsatisfiable(Order, Q(price__in=[1, 2]) & Q(price__in=[3, 4]))
+        self.assert_unsatisfiable(Order, Q(price__in=[1, 20]) & Q(price__gt=5) & Q(price__lt=10))
+        self.assert_unsatisfiable(MiscModel, Q(boolean=True) & Q(boolean=False))
+        self.assert_unsatisfiable(MiscModel, Q(integer=None) & Q(integer=3))
+        self.assert_unsatisfiable(MiscModel, Q(integer__isnull=True) & Q(integer__isnull=False))
+        self.assert_unsatisfiable(Pizza, Q(order__price=10) & (Q(order__price=20) & Q(diameter=12)))
+        self.assert_unsatisfiable(Pizza, (Q(diameter=1) | Q(diameter__in=[])) & Q(diameter=2))
+        self.assert_unsatisfiable(MiscModel, Q(extra_info__integer__gt=2) & Q(extra_info__integer__lt=1))
+        self.assert_unsatisfiable(Pizza, Q(order__price__gt=5) & (Q(toppings__in=[]) | Q(order__price__lt=2)))
+
+    def test_satisfiable(self):
+        self.assert_satisfiable(Order, Q(price__gte=10) & Q(price__lte=10))
+        self.assert_satisfiable(Order, Q(price=10) & Q(price=Decimal('10.0')) & Q(price=10.0))
+        self.assert_satisfiable(Order, Q(price__gt=10) | Q(price__lt=5))
+        self.assert_satisfiable(Order, ~(Q(price__gt=10) & Q(price__lt=5)))
+        self.assert_satisfiable(Order, ~Q(pk__in=[]))
+        self.assert_satisfiable(Order, Q())
+        # matching depends on the database's collation
+        self.assert_satisfiable(Order, Q(name_on_order='Bob') & Q(name_on_order='bob '))
+        self.assert_satisfiable(Order, Q(name_on_order__gt='b') & Q(name_on_order__lt='a'))
+        self.assert_satisfiable(Order, Q(name_on_order=u'\xe9') & Q(name_on_order='e'))
+        # values of different types that the database may convert to the same value
+        self.assert_satisfiable(Order, Q(price='10') & Q(price=10))
+        self.assert_satisfiable(Order, Q(delivered_time__gte=datetime.date(2015, 1, 1)) & Q(delivered_time__lt='2014-01-01'))
+        # one pizza can have many toppings, one order many pizzas
+        self.assert_satisfiable(Pizza, Q(toppings__name='cheese') & Q(toppings__name='ham'))
+        self.assert_satisfiable(Pizza, Q(toppings__pk=1) & Q(toppings__pk=2))
+        self.assert_satisfiable(Order, Q(pizza__diameter=10) & Q(pizza__diameter=12))
+        # nothing is known about the fields without the model
+        self.assertTrue(is_satisfiable(Q(price__gt=10) & Q(price__lt=5)))
+        self.assertFalse(is_satisfiable(Q(pk__in=[]) & Q(price=1)))
+
+    def test_values_are_converted_by_the_field(self):
+        obj = MiscModel.objects.create(integer=1, date=datetime.date(2015, 1, 1))
+        morning, noon = datetime.datetime(2015, 1, 1, 9), datetime.datetime(2015, 1, 1, 12)
+        for q in [
+            Q(integer=1.5) & Q(integer=1.2),
+            Q(integer__in=[1.5, 3]) & Q(integer='1'),
+            Q(date=morning) & Q(date=noon),
+            Q(date__gte=noon) & Q(date__lte=morning),
+        ]:
+            self.assertTrue(is_satisfiable(q, MiscModel))
+            self.assertEqual([obj], list(MiscModel.objects.filter(q)))
+            self.assertEqual([obj], filter_by_q([obj], q))
+        # django rounds 1.5 up for gte
+        self.assert_unsatisfiable(MiscModel, Q(integer__gte=1.5) & Q(integer__lte=1.2))
+
+    def test_q_method_skips_the_database(self):
+        with self.assertNumQueries(0):
+            self.assertEqual([], list(Order.objects.cost_between(20, 10)))
+            self.assertEqual([], list(Order.objects.cost_between(20, 10).is_delivered()))
+        self.assertEqual(0, Order.objects.cost_between(10, 20).count())
+
+        order = Order.objects.create(price=15)
+        self.assertEqual([order], list(Order.objects.cost_between(10, 20)))
+
+    def test_in_memory_skips_evaluation(self):
+        order = Order.objects.create(price=15, delivered_time=timezone.now())
+        Pizza.objects.create(diameter=12, created=timezone.now(), order=order)
+        pizzas = list(Pizza.objects.all())
+        q = PizzaQuerySet.is_delivered.q() & Q(order__price__in=[])
+        with self.assertNumQueries(0):
+            self.assertEqual([], filter_by_q(pizzas, q))
+            self.assertEqual([], filter_by_q(pizzas, Q(order__price__gt=20, order__price__lt=10)))
+        self.assertEqual(pizzas, filter_by_q(pizzas, PizzaQuerySet.is_delivered.q()))
+
+        rows = list(Order.objects.values('price'))
+        self.assertEqual([], filter_by_q(rows, OrderQuerySet.cost_between.q(20, 10), model=Order))
+
+
+class ImplicationTests(TestCase):
+    def assert_implies(self, model, q_narrow, q_wide):
+        self.assertTrue(q_implies(q_narrow, q_wide, model))
+
+    def assert_not_implies(self, model, q_narrow, q_wide):
+        self.assertFalse(q_implies(q_narrow, q_wide, model))
+
+    def test_ranges_and_comparisons(self):
+        self.assert_implies(Order, OrderQuerySet.cost_between.q(100, 500), OrderQuerySet.cost_between.q(0, 1000))
+        self.assert_implies(Order, Q(price__range=(100, 500)), Q(price__gt=50))
+        self.assert_implies(Order, Q(price__gt=10), Q(price__gte=10))
+        self.assert_implies(Order, Q(price__gte=10.5), Q(price__gt=10))
+        self.assert_implies(Order, Q(price=10), Q(price__lte=10) & Q(price__isnull=False))
+        self.assert_not_implies(Order, Q(price__gte=10), Q(price__gt=10))
+        self.assert_not_implies(Order, OrderQuerySet.cost_between.q(0, 1000), OrderQuerySet.cost_between.q(100, 500))
+        self.assert_not_implies(Order, Q(price__gt=10), Q(price__isnull=True))
+        self.assert_implies(Order, Q(delivered_time__isnull=True), Q(delivered_time=None))
+        self.assert_implies(MiscModel, Q(integer=1.2), Q(integer=1))
+        self.assert_implies(MiscModel, Q(date=datetime.datetime(2015, 1, 1, 12)), Q(date__lte=datetime.date(2015, 1, 1)))
+
+    def test_in_sets(self):
+        self.assert_implies(Order, Q(pk__in=[1, 2]), Q(pk__in=[1, 2, 3]))
+        self.assert_implies(Order, Q(pk__in=[1, 2, 3]) & Q(pk__gt=1), Q(pk__in=[2, 3]))
+        self.assert_implies(Order, Q(price=5), Q(price__in=[Decimal('5'), 6]))
+        self.assert_implies(Order, Q(pk__in=[2, 3]), Q(pk__range=(2, 3)))
+        self.assert_not_implies(Order, Q(pk__in=[1, 2, 3]), Q(pk__in=[1, 2]))
+        self.assert_not_implies(Order, Q(pk__in=[1, 2]), Q(pk=1))
+
+    def test_structure(self):
+        wide = OrderQuerySet.cost_between.q(0, 1000)
+        self.assert_implies(Order, wide & OrderQuerySet.is_delivered.q(), wide)
+        self.assert_implies(Order, Q(price=1) | Q(price=2), Q(price__lt=5))
+        self.assert_implies(Order, Q(price=1), Q(price=1) | Q(name_on_order='Bob'))
+        self.assert_implies(Order, (Q(price=1) | Q(price=2)) & Q(name_on_order='Bob'), Q(price__in=[1, 2]))
+        self.assert_implies(Order, Q(price=1), ~Q(price=2))
+        self.assert_implies(Order, ~Q(name_on_order__contains='x'), ~Q(name_on_order__contains='x'))
+        self.assert_implies(Order, Q(price__gt=5, price__lt=1), Q(name_on_order='anything'))
+        self.assert_implies(Order, Q(price=1), Q())
+        self.assert_not_implies(Order, Q(price=1) | Q(price=20), Q(price__lt=5))
+        self.assert_not_implies(Order, Q(), Q(price=1))
+        self.assert_not_implies(Order, ~Q(price=2), Q(price=1))
+
+    def test_strings(self):
+        self.assert_implies(Order, Q(name_on_order='Bob'), Q(name_on_order__in=['Bob', 'Sue']))
+        self.assert_implies(Order, Q(name_on_order__startswith='B'), Q(name_on_order__startswith='B') | Q(price=1))
+        # 'bob' matches 'Bob' in a case insensitive database
+        self.assert_not_implies(Order, Q(name_on_order='Bob'), Q(name_on_order='bob'))
+        self.assert_not_implies(Order, Q(name_on_order='Bob') & Q(name_on_order='bob'), Q(name_on_order='Sue'))
+        self.assert_not_implies(Order, Q(name_on_order='b'), Q(name_on_order__gt='a'))
+
+    def test_multi_valued_relations(self):
+        self.assert_implies(Pizza, Q(toppings__pk=1), Q(toppings__pk__in=[1, 2]))
+        self.assert_implies(Pizza, Q(order__price__gt=10), Q(order__price__gt=5))
+        # two different toppings can match the two filters
+        self.assert_not_implies(Pizza, Q(toppings__pk__gt=1) & Q(toppings__pk__lt=3), Q(toppings__pk=2))
+        self.assert_implies(Pizza, Q(order__price__gt=1) & Q(order__price__lt=3), Q(order__price__range=(1, 3)))
+
+    def test_without_model(self):
+        self.assertTrue(q_implies(Q(price__gt=10), Q(price__gt=5)))
+        self.assertFalse(q_implies(Q(price__gt=10) & Q(price__lt=20), Q(price__range=(10, 20))))
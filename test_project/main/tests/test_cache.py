@@ -0,0 +1,139 @@
+import time
+from datetime import timedelta
+
+from django.db.models import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import QResultCache, TableMirror, filter_by_q, obj_matches_q
+from qtools.cache import q_cache_key
+
+from main.models import Order, OrderQuerySet, Pizza, Topping
+
+
+class QResultCacheTests(TestCase):
+    def setUp(self):
+        Order(price=10, delivered_time=timezone.now()).save()
+        Order(price=20).save()
+        Order(price=30, delivered_time=timezone.now() - timedelta(days=3)).save()
+        self.orders = list(Order.objects.all())
+
+    def test_hits_and_misses(self):
+        cache = QResultCache()
+        q = OrderQuerySet.is_delivered.q()
+        self.assertEqual(2, len(filter_by_q(self.orders, q, cache=cache, version=1)))
+        self.assertEqual(2, len(filter_by_q(self.orders, OrderQuerySet.is_delivered.q(), cache=cache, version=1)))
+        self.assertEqual((1, 1), cache.info()[:2])
+
+        # a new version is a new entry
+        filter_by_q(self.orders, q, cache=cache, version=2)
+        self.assertEqual((1, 2), cache.info()[:2])
+
+        # without a version nothing is cached
+        filter_by_q(self.orders, q, cache=cache)
+        filter_by_q(self.orders, q, cache=cache)
+        self.assertEqual((1, 4, 128, 2), tuple(cache.info()))
+
+    def test_obj_matches_q(self):
+        cache = QResultCache()
+        q = Q(price__gt=15)
+        self.assertFalse(obj_matches_q(self.orders[0], q, cache=cache, version=1))
+        self.assertTrue(obj_matches_q(self.orders[1], q, cache=cache, version=1))
+        self.assertFalse(obj_matches_q(self.orders[0], q, cache=cache, version=1))
+        self.assertEqual(1, cache.hits)
+
+    def test_lru_eviction(self):
+        cache = QResultCache(maxsize=2)
+        filter_by_q(self.orders, Q(price=10), cache=cache, version=1)
+        filter_by_q(self.orders, Q(price=20), cache=cache, version=1)
+        filter_by_q(self.orders, Q(price=10), cache=cache, version=1)
+        filter_by_q(self.orders, Q(price=30), cache=cache, version=1)
+        self.assertEqual(2, cache.info().currsize)
+
+        filter_by_q(self.orders, Q(price=10), cache=cache, version=1)
+        self.assertEqual(2, cache.hits)
+        filter_by_q(self.orders, Q(price=20), cache=cache, version=1)
+        self.assertEqual(2, cache.hits)
+
+    def test_time_dependent_q(self):
+        q = OrderQuerySet.delivered_in_last_x_days.q(1)
+
+        cache = QResultCache()
+        filter_by_q(self.orders, q, cache=cache, version=1)
+        filter_by_q(self.orders, q, cache=cache, version=1)
+        self.assertEqual(0, cache.hits)
+
+        cache = QResultCache(time_tolerance=timedelta(minutes=10))
+        filter_by_q(self.orders, q, cache=cache, version=1)
+        filter_by_q(self.orders, q, cache=cache, version=1)
+        self.assertEqual(1, cache.hits)
+
+        cache = QResultCache(time_tolerance=0.01)
+        filter_by_q(self.orders, q, cache=cache, version=1)
+        time.sleep(0.02)
+        filter_by_q(self.orders, q, cache=cache, version=1)
+        self.assertEqual(0, cache.hits)
+
+    def test_key_ignores_child_order(self):
+        self.assertEqual(
+            q_cache_key(Q(price=1) & Q(name_on_order='a')),
+            q_cache_key(Q(name_on_order='a') & Q(price=1))
+        )
+        self.assertNotEqual(q_cache_key(Q(price=1)), q_cache_key(Q(price=True)))
+        self.assertNotEqual(q_cache_key(Q(price=1)), q_cache_key(~Q(price=1)))
+
+    def test_mirror_version(self):
+        Topping(name='cheese', is_gluten_free=True).save()
+        mirror = TableMirror(Topping)
+        cache = QResultCache()
+        q = Q(is_gluten_free=True)
+        try:
+            self.assertEqual(1, len(filter_by_q(mirror, q, cache=cache)))
+            self.assertEqual(1, len(filter_by_q(mirror, q, cache=cache)))
+            self.assertEqual(1, cache.hits)
+
+            Topping(name='ham', is_gluten_free=True).save()
+            self.assertEqual(2, len(filter_by_q(mirror, q, cache=cache)))
+        finally:
+            mirror.disconnect()
+
+
+class SupersetTests(TestCase):
+    def setUp(self):
+        orders = [Order.objects.create(price=price) for price in (50, 150, 300, 700, 1500)]
+        for order in orders:
+            Pizza.objects.create(diameter=float(order.price) / 50, created=timezone.now(), order=order)
+        self.pizzas = list(Pizza.objects.order_by('pk'))
+
+    def test_narrower_q_filters_the_cached_superset(self):
+        cache = QResultCache()
+        wide = Q(diameter__gte=2, diameter__lte=14)
+        self.assertEqual(self.pizzas[1:4], filter_by_q(self.pizzas, wide, cache=cache, version=1))
+
+        # only the pizzas in the cached result load their order
+        narrow = wide & Q(order__price__gt=200)
+        with self.assertNumQueries(3):
+            self.assertEqual(self.pizzas[2:4], filter_by_q(self.pizzas, narrow, cache=cache, version=1))
+
+        # the narrowest cached result is used, its orders are already loaded
+        with self.assertNumQueries(0):
+            result = filter_by_q(self.pizzas, Q(diameter__range=(5, 6)) & Q(order__price__gt=0), cache=cache, version=1)
+        self.assertEqual([self.pizzas[2]], result)
+
+    def test_other_versions_are_not_used(self):
+        cache = QResultCache()
+        filter_by_q(self.pizzas, Q(diameter__lte=3), cache=cache, version=1)
+        self.assertEqual(self.pizzas[:2], filter_by_q(self.pizzas, Q(diameter__lte=3), cache=cache, version=2))
+        self.assertEqual(self.pizzas[:1], filter_by_q(self.pizzas, Q(diameter__lte=1), cache=cache, version=2))
+
+    def test_mirror(self):
+        mirror = TableMirror(Order, cache=QResultCache())
+        try:
+            self.assertEqual(3, mirror.count(Q(price__lt=500)))
+            self.assertEqual(2, mirror.count(Q(price__lt=200)))
+            self.assertEqual(2, mirror.count(Q(price__lt=200)))
+            self.assertEqual(1, mirror.cache.info().hits)
+
+            Order.objects.create(price=100)
+            self.assertEqual(3, mirror.count(Q(price__lt=200)))
+        finally:
+            mirror.disconnect()
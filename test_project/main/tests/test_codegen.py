@@ -0,0 +1,108 @@
+import linecache
+import traceback
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import codegen, compile_q, filter_by_q
+from qtools.codegen import clear_compiled_q_cache, compiled_q_cache
+
+from main.models import MiscModel, Order, OrderQuerySet, Pizza, PizzaQuerySet
+
+
+class CompileQTests(TestCase):
+    def setUp(self):
+        clear_compiled_q_cache()
+        now = timezone.now()
+        self.bob = Order.objects.create(name_on_order='Bob', price=10, delivered_time=now - timedelta(days=1))
+        self.sue = Order.objects.create(name_on_order='sue ', price=25)
+        for diameter, order in ((10, self.bob), (14, self.sue), (18, None), (12, self.bob)):
+            Pizza.objects.create(diameter=diameter, created=now, order=order)
+        MiscModel.objects.create(text='Hello', integer=3, decimal=Decimal('1.5'), datetime=now)
+        MiscModel.objects.create(text='hi world', integer=None, float=2.0)
+
+    def assert_same_as_the_database(self, model, q):
+        objs = list(model.objects.order_by('pk'))
+        compiled = compile_q(model, q)
+        self.assertEqual(list(model.objects.filter(q).order_by('pk')), compiled.filter(objs), compiled.source)
+        self.assertEqual(filter_by_q(objs, q), [obj for obj in objs if compiled(obj)])
+
+    def test_same_results_as_the_database(self):
+        for q in [
+            OrderQuerySet.is_delivered.q(),
+            OrderQuerySet.cost_between.q(5, 20),
+            Q(name_on_order__iexact='SUE ') | ~Q(price__gte=20),
+            Q(pk__in=[self.bob.pk]) & ~(Q(delivered_time__isnull=True) | Q(name_on_order__startswith='B')),
+            Q(),
+            Q(pk__in=[]),
+            Q(Q(Q(price__gt=20) | Q(name_on_order='Bob')), price__lt=20),
+        ]:
+            self.assert_same_as_the_database(Order, q)
+
+        for q in [
+            PizzaQuerySet.is_delivered.q(),
+            Q(order=self.bob) | Q(order__isnull=True),
+            Q(diameter__gt=11, order__price__lt=20),
+            Q(order__in=Order.objects.filter(price__gt=20)),
+            Q(diameter__gt=F('order__price')),
+        ]:
+            self.assert_same_as_the_database(Pizza, q)
+
+        for q in [
+            Q(text__icontains='WORLD') | Q(integer__isnull=True),
+            Q(text__regex=r'^H\w+$', datetime__year=timezone.now().year),
+            ~Q(decimal__lt=2),
+        ]:
+            self.assert_same_as_the_database(MiscModel, q)
+
+    def test_generated_source(self):
+        compiled = compile_q(Pizza, Q(diameter__gt=12) & ~(Q(order=self.bob) | Q(order__price__gt=20)))
+        self.assertIn('obj.diameter', compiled.source)
+        self.assertIn('obj.order_id', compiled.source)
+        self.assertIn(' and not (_k', compiled.source)
+        self.assertIn('_leaf', compiled.source)
+
+        pizzas = list(Pizza.objects.only('id', 'diameter', 'order'))
+        with self.assertNumQueries(0):
+            compile_q(Pizza, Q(diameter__gt=12) & ~Q(order=self.bob)).filter(pizzas)
+
+    def test_cached_per_fingerprint_and_adapter(self):
+        compiled = compile_q(Order, Q(price__gt=10) & Q(name_on_order='Bob'))
+        self.assertIs(compiled, compile_q(Order, Q(name_on_order='Bob') & Q(price__gt=10)))
+        self.assertIsNot(compiled, compile_q(Order, Q(price__gt=10) & Q(name_on_order='Bob'), lookup_adapter='mysql'))
+        self.assertEqual(2, len(compiled_q_cache()))
+
+        self.assertIsNot(compile_q(Pizza, Q(order__in=Order.objects.all())),
+                         compile_q(Pizza, Q(order__in=Order.objects.all())))
+        self.assertEqual(2, len(compiled_q_cache()))
+
+    def test_adapter_semantics(self):
+        orders = [Order(name_on_order='SUE', price=1), Order(name_on_order='sue  ', price=1)]
+        self.assertEqual(orders, compile_q(Order, Q(name_on_order='sue'), lookup_adapter='mysql').filter(orders))
+        self.assertEqual([], compile_q(Order, Q(name_on_order='sue'), lookup_adapter='sqlite').filter(orders))
+
+    def test_tracebacks_show_the_source(self):
+        compiled = compile_q(MiscModel, Q(integer__gt=1))
+        try:
+            compiled(object())
+        except AttributeError:
+            self.assertIn('return _k', traceback.format_exc())
+        else:
+            self.fail('AttributeError not raised')
+
+    def test_source_lines_are_dropped_with_the_cache(self):
+        compiled = compile_q(MiscModel, Q(integer__gt=1))
+        self.assertIn(compiled.filename, linecache.cache)
+        uncached = compile_q(MiscModel, Q(integer__gt=F('float')))
+        self.assertNotIn(uncached.filename, linecache.cache)
+
+        for i in range(codegen.CODEGEN_CACHE_SIZE):
+            compile_q(MiscModel, Q(integer__lt=i))
+        self.assertNotIn(compiled.filename, linecache.cache)
+
+        compiled = compiled_q_cache()[0]
+        clear_compiled_q_cache()
+        self.assertNotIn(compiled.filename, linecache.cache)
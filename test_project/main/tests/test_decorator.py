@@ -1,11 +1,19 @@
 from __future__ import unicode_literals
 
-from django.db import models
-from django.test.testcases import TestCase
+from django.db import connections, models, DatabaseError
+from django.test.testcases import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
-from qtools import nested_q
+from qtools import evaluate_flags, nested_q
+from qtools.decorator import clear_flags
 
-from main.models import Order, Pizza, OrderQuerySet
+from main.models import Order, Pizza, OrderQuerySet, Topping
+
+try:
+    from django.db.models import Case
+except ImportError:
+    # django 1.7, evaluate_flags runs a query per database flag
+    Case = None
 
 
 class QMethodDecoratorTests(TestCase):
@@ -120,3 +128,63 @@ class QMethodDecoratorTests(TestCase):
         assert hasattr(Order.objects.all(), 'cost_between')  # on queryset
         assert not hasattr(Pizza.objects, 'cost_between')  # on manager
         assert not hasattr(Pizza.objects.all(), 'cost_between')  # on queryset
+
+
+class EvaluateFlagsTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(price=100, delivered_time=timezone.now())
+        self.pizza = Pizza.objects.create(diameter=12, order=self.order, created=timezone.now())
+        self.pizza.toppings.add(Topping.objects.create(name='cheese', is_gluten_free=True))
+        self.pizza.toppings.add(Topping.objects.create(name='crouton', is_gluten_free=False))
+
+    def test_one_query(self):
+        pizza = Pizza.objects.get(pk=self.pizza.pk)
+        names = ['is_delivered_in_db', 'has_gluten_free_toppings', 'is_delivered']
+        with self.assertNumQueries(2 if Case else 3):
+            # one for all the database flags, one to load the order for the in-memory flag
+            flags = evaluate_flags(pizza, names)
+        self.assertEqual({'is_delivered_in_db': True, 'has_gluten_free_toppings': True, 'is_delivered': True}, flags)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(pizza.is_delivered_in_db)
+            self.assertTrue(pizza.has_gluten_free_toppings)
+
+    def test_results_are_kept_until_cleared(self):
+        order = Order.objects.get(pk=self.order.pk)
+        with self.assertNumQueries(1 if Case else 2):
+            self.assertEqual({'is_delivered': True, 'is_affordable': True},
+                             evaluate_flags(order, ['is_delivered', 'is_affordable']))
+
+        Order.objects.update(delivered_time=None, price=200000)
+        self.assertTrue(order.is_delivered)
+        clear_flags(order)
+        self.assertFalse(order.is_delivered)
+        self.assertEqual({'is_delivered': False, 'is_affordable': False},
+                         evaluate_flags(order, ['is_delivered', 'is_affordable']))
+        self.assertTrue(Order.objects.get(pk=order.pk).is_delivered is False)
+
+    def test_invalid_names(self):
+        for name in ('diameter', 'is_delivered_method', 'ais_delivered', 'nope'):
+            with self.assertRaises(ValueError):
+                evaluate_flags(self.pizza, [name])
+
+
+# the replica alias reads the committed data of the default database
+class EvaluateFlagsDatabaseTests(TransactionTestCase):
+    def setUp(self):
+        try:
+            Order.objects.using('replica').exists()
+        except DatabaseError:
+            # python 2's sqlite can't share an in-memory database between connections
+            self.skipTest('the replica alias has no test database')
+
+    def test_queries_the_database_of_the_instance(self):
+        order = Order.objects.create(price=100, delivered_time=timezone.now())
+        order = Order.objects.using('replica').get(pk=order.pk)
+        with CaptureQueriesContext(connections['default']) as default_queries:
+            with CaptureQueriesContext(connections['replica']) as replica_queries:
+                flags = evaluate_flags(order, ['is_delivered', 'is_affordable'])
+
+        self.assertEqual({'is_delivered': True, 'is_affordable': True}, flags)
+        self.assertEqual([], default_queries.captured_queries)
+        self.assertEqual(1 if Case else 2, len(replica_queries))
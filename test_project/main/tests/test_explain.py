@@ -0,0 +1,68 @@
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools.explain import explain_q, RelationHop
+
+from main.models import Order, Pizza, PizzaQuerySet, Topping
+
+
+class ExplainTests(TestCase):
+    def setUp(self):
+        order = Order.objects.create(name_on_order='Bob', price=10, delivered_time=timezone.now())
+        for diameter in (10, 12):
+            Pizza.objects.create(diameter=diameter, created=timezone.now(), order=order)
+
+    def test_leaves(self):
+        explanation = explain_q(Pizza, PizzaQuerySet.is_delivered.q() & Q(diameter__in=[10, 12]) & Q(pk=1))
+        delivered, diameter, pk = explanation.leaves
+
+        self.assertEqual('order__delivered_time', delivered.field_path)
+        self.assertEqual('datetime', delivered.simple_type)
+        self.assertEqual('isnull', delivered.lookup)
+        self.assertEqual('isnull', delivered.lookup_function)
+        self.assertEqual([RelationHop('order', 'forward', Order, None)], delivered.relations)
+
+        self.assertEqual(('number', 'in', 'in_func', []), (diameter.simple_type, diameter.lookup,
+                                                           diameter.lookup_function, diameter.relations))
+        self.assertEqual('id', pk.field_path)
+
+    def test_relation_kinds(self):
+        explanation = explain_q(Order, Q(pizza__toppings__name='cheese'))
+        self.assertEqual(
+            [RelationHop('pizza', 'reverse', Pizza, None), RelationHop('pizza__toppings', 'm2m', Topping, None)],
+            explanation.leaves[0].relations
+        )
+        self.assertEqual(2, explanation.estimated_queries)
+
+    def test_loaded_relations(self):
+        q = Q(order__price__gt=5) & Q(order__delivered_time__isnull=False) & Q(created__year=2000)
+        pizzas = list(Pizza.objects.order_by('pk'))
+        self.assertEqual(2, explain_q(Pizza, q, objs=pizzas).estimated_queries)
+
+        pizzas[0].order
+        explanation = explain_q(Pizza, q, objs=pizzas)
+        self.assertEqual([RelationHop('order', 'forward', Order, (1, 2))], explanation.leaves[0].relations)
+        self.assertEqual(1, explanation.estimated_queries)
+
+        pizzas = list(Pizza.objects.select_related('order').only('id', 'order__price'))
+        # the deferred fields of both pizzas and orders
+        self.assertEqual(4, explain_q(Pizza, q, objs=pizzas).estimated_queries)
+
+        orders = list(Order.objects.prefetch_related('pizza_set'))
+        explanation = explain_q(Order, Q(pizza__diameter=10), objs=orders)
+        self.assertEqual((1, 1), explanation.leaves[0].relations[0].loaded)
+        self.assertEqual(0, explanation.estimated_queries)
+
+    def test_estimate_matches_in_memory_evaluation(self):
+        from qtools import filter_by_q
+        q = Q(order__price__gt=5) & Q(order__name_on_order='Bob')
+        pizzas = list(Pizza.objects.all())
+        estimate = explain_q(Pizza, q, objs=pizzas).estimated_queries
+        with self.assertNumQueries(estimate):
+            filter_by_q(pizzas, q)
+
+    def test_sql(self):
+        explanation = explain_q(Pizza, PizzaQuerySet.is_delivered.q())
+        self.assertIn('delivered_time', explanation.sql)
+        self.assertIn('IS NOT NULL', str(explanation))
+        self.assertIsNone(explain_q(Pizza, Q(pk__in=[])).sql)
@@ -1,5 +1,8 @@
 # coding=utf-8
+from datetime import timedelta
+from decimal import Decimal
 
+from django.db.models import F
 from django.db.models.query_utils import Q
 from django.test.testcases import TestCase
 from django.utils import timezone
@@ -149,3 +152,79 @@ class TestFilteringOverRelationships(TestCase, QInPythonTestCaseMixin):
         for q in q_to_test:
             filter_by_q(all_models, q)
             self.assert_q_executes_the_same_in_python_and_sql(MiscModel, q)
+
+
+class TestQuerySetFilterValues(TestCase, QInPythonTestCaseMixin):
+    def setUp(self):
+        delivered = Order.objects.create(price=1, delivered_time=timezone.now())
+        pending = Order.objects.create(price=2)
+        for diameter, order in ((1, delivered), (2, pending), (3, None)):
+            Pizza.objects.create(diameter=diameter, created=timezone.now(), order=order)
+
+    def test_same_results_as_sql(self):
+        for q in [
+            Q(order__in=Order.objects.is_delivered()),
+            Q(order__pk__in=Order.objects.filter(price=2)),
+            Q(order__in=Order.objects.filter(price=2).values('pk')),
+            Q(pk__in=Pizza.objects.filter(diameter__gt=1)),
+            Q(order__price__in=Order.objects.values_list('price', flat=True)),
+            ~Q(order__in=Order.objects.is_delivered()),
+            Q(order__in=Order.objects.none()),
+        ]:
+            self.assert_q_executes_the_same_in_python_and_sql(Pizza, q)
+
+    def test_queried_once_per_call(self):
+        pizzas = list(Pizza.objects.select_related('order').order_by('pk'))
+        q = Q(order__in=Order.objects.is_delivered()) | Q(order__in=Order.objects.filter(price=2), diameter=3)
+        with self.assertNumQueries(2):
+            self.assertEqual(pizzas[:1], filter_by_q(pizzas, q))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(pizzas[1:], filter_by_q(pizzas, Q(pk__in=Pizza.objects.filter(diameter__gt=1))))
+
+
+class TestFExpressions(TestCase, QInPythonTestCaseMixin):
+    def setUp(self):
+        now = timezone.now()
+        parent = MiscModel.objects.create(integer=3, float=1.5, decimal=Decimal('1.5'), datetime=now)
+        MiscModel.objects.create(integer=7, float=2.0, decimal=Decimal('2.5'), datetime=now, foreign=parent)
+        MiscModel.objects.create(integer=5, float=3.0, decimal=Decimal('1.0'), datetime=now + timedelta(days=2),
+                                 foreign=parent)
+        MiscModel.objects.create(integer=-7, foreign=parent)
+        MiscModel.objects.create(integer=None, float=0.0, foreign=parent)
+
+    def test_same_results_as_sql(self):
+        for q in [
+            Q(integer__gt=F('foreign__integer') * 2),
+            Q(integer__lt=F('foreign__integer') + 1),
+            Q(decimal__gte=F('float')),
+            Q(float__lt=F('decimal') - 1),
+            Q(datetime__gt=F('foreign__datetime') + timedelta(days=1)),
+            Q(integer=F('integer')),
+            Q(integer__gte=F('foreign__integer') / 2),
+            Q(integer=F('foreign__integer') / 2),
+            Q(integer__gte=F('extra_info__integer')),
+            Q(integer__gt=F('foreign__integer') * 2) | Q(float=F('decimal')),
+            ~Q(integer__gt=F('foreign__integer') * 2),
+            ~Q(decimal__gte=F('float')),
+            ~(Q(integer__gt=F('foreign__integer') * 2) & Q(integer=3)),
+            ~(Q(integer__gt=F('foreign__integer') * 2) | Q(integer=3)),
+        ]:
+            self.assert_q_executes_the_same_in_python_and_sql(MiscModel, q)
+
+    def test_across_relations(self):
+        order = Order.objects.create(price=10, delivered_time=timezone.now())
+        Pizza.objects.create(diameter=12, order=order, created=order.delivered_time - timedelta(hours=1))
+        Pizza.objects.create(diameter=14, order=order, created=order.delivered_time + timedelta(hours=1))
+        for q in [
+            Q(order__delivered_time__gt=F('created')),
+            Q(diameter__gt=F('order__price')),
+            Q(order__price__lt=F('diameter') - 3),
+        ]:
+            self.assert_q_executes_the_same_in_python_and_sql(Pizza, q)
+
+    def test_evaluated_without_queries(self):
+        objs = list(MiscModel.objects.select_related('foreign'))
+        with self.assertNumQueries(0):
+            matching = filter_by_q(objs, Q(integer__gt=F('foreign__integer') * 2))
+        self.assertEqual([7], [obj.integer for obj in matching])
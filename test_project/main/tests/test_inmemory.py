@@ -0,0 +1,77 @@
+from django.db.models import F
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import InMemoryQuerySet
+
+from main.models import MiscModel, Order, OrderQuerySet, Pizza, PizzaQuerySet
+
+
+class InMemoryQuerySetTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.delivered = Order.objects.create(name_on_order='Bob', price=10, delivered_time=now)
+        self.pending = Order.objects.create(name_on_order='Sue', price=25)
+        for diameter, order in ((10, self.delivered), (16, self.delivered), (12, self.pending), (14, None)):
+            Pizza.objects.create(diameter=diameter, created=now, order=order)
+
+    def assert_same_as_the_database(self, build):
+        pizzas = InMemoryQuerySet(Pizza.objects.select_related('order').order_by('pk'), queryset_class=PizzaQuerySet)
+        expected = build(Pizza.objects.order_by('pk'))
+        result = build(pizzas)
+        self.assertEqual(list(expected), list(result))
+        self.assertEqual(expected.count(), result.count())
+        self.assertEqual(expected.exists(), result.exists())
+        self.assertEqual(expected.first(), result.first())
+
+    def test_chains_like_the_database(self):
+        self.assert_same_as_the_database(lambda qs: qs.is_delivered())
+        self.assert_same_as_the_database(lambda qs: qs.is_delivered().filter(diameter__gt=12))
+        self.assert_same_as_the_database(lambda qs: qs.filter(Q(diameter__lt=12) | Q(order__price=25)).all())
+        self.assert_same_as_the_database(lambda qs: qs.exclude(order__price__gt=20).exclude(diameter=10))
+        self.assert_same_as_the_database(lambda qs: qs.delivered_in_last_x_days(5).order_by('-diameter'))
+        self.assert_same_as_the_database(lambda qs: qs.filter(diameter__gt=100))
+        self.assert_same_as_the_database(lambda qs: qs.none())
+        self.assert_same_as_the_database(lambda qs: qs.filter(pk__in=[]))
+
+    def test_exclude_with_null_expressions(self):
+        # the pizza without an order compares its diameter with NULL
+        self.assert_same_as_the_database(lambda qs: qs.exclude(diameter__gt=F('order__price')))
+        self.assert_same_as_the_database(lambda qs: qs.exclude(diameter__lt=F('order__price')).filter(diameter__gt=10))
+
+        parent = MiscModel.objects.create(integer=None)
+        for integer in (None, 1, 3):
+            MiscModel.objects.create(integer=integer, foreign=parent)
+        objs = InMemoryQuerySet(MiscModel.objects.select_related('foreign').order_by('pk'))
+        self.assertEqual(list(MiscModel.objects.exclude(integer__gt=F('foreign__integer')).order_by('pk')),
+                         list(objs.exclude(integer__gt=F('foreign__integer'))))
+
+    def test_separate_filter_calls_on_multi_valued_relations(self):
+        orders = InMemoryQuerySet(Order.objects.prefetch_related('pizza_set'), queryset_class=OrderQuerySet)
+        chained = orders.filter(pizza__diameter__gt=12).filter(pizza__diameter__lt=12)
+        self.assertEqual([self.delivered], list(Order.objects.filter(pizza__diameter__gt=12)
+                                                .filter(pizza__diameter__lt=12)))
+        self.assertEqual([self.delivered], list(chained))
+
+        excluded = orders.exclude(pizza__diameter__gt=14)
+        self.assertEqual(list(Order.objects.exclude(pizza__diameter__gt=14)), list(excluded))
+
+    def test_lazy_single_pass(self):
+        pizzas = list(Pizza.objects.select_related('order').order_by('pk'))
+        with self.assertNumQueries(0):
+            qs = InMemoryQuerySet(pizzas).is_delivered().filter(diameter__gt=12)
+            self.assertEqual(1, qs.count())
+            self.assertTrue(qs.exists())
+            self.assertEqual(pizzas[1], qs.first())
+            self.assertEqual([16.0], qs.values_list('diameter', flat=True))
+            self.assertEqual([(pizzas[1].pk, self.delivered.pk)], qs.values_list('pk', 'order'))
+
+        with self.assertRaises(AttributeError):
+            InMemoryQuerySet(pizzas).delivered_in_last_x_days_q
+
+    def test_values_list_rows_per_related_value(self):
+        orders = InMemoryQuerySet(Order.objects.order_by('pk'))
+        self.assertEqual(list(Order.objects.order_by('pk', 'pizza__diameter').values_list('name_on_order',
+                                                                                           'pizza__diameter')),
+                         sorted(orders.values_list('name_on_order', 'pizza__diameter')))
+        self.assertEqual(list(Order.objects.order_by('pk').values_list()), orders.values_list())
@@ -0,0 +1,157 @@
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import LiveFilteredSet
+from qtools.live import ChangeEvent, get_relation_steps, membership_changed
+
+from main.models import MiscModel, Order, Pizza, PizzaQuerySet, Topping
+
+
+class LiveFilteredSetTests(TestCase):
+    def setUp(self):
+        self.delivered = Order.objects.create(name_on_order='Bob', price=10, delivered_time=timezone.now())
+        self.pending = Order.objects.create(name_on_order='Sue', price=20)
+        self.pizzas = [
+            Pizza.objects.create(diameter=10, created=timezone.now(), order=self.delivered),
+            Pizza.objects.create(diameter=14, created=timezone.now(), order=self.pending),
+            Pizza.objects.create(diameter=16, created=timezone.now(), order=self.pending),
+        ]
+        self.live = LiveFilteredSet(Pizza, PizzaQuerySet.is_delivered.q())
+        self.live.count()
+
+    def tearDown(self):
+        self.live.disconnect()
+
+    def test_reads_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(1, self.live.count())
+            self.assertEqual(frozenset([self.pizzas[0].pk]), self.live.pks)
+            self.assertIn(self.pizzas[0], self.live)
+            self.assertNotIn(self.pizzas[1].pk, self.live)
+
+    def test_saving_the_model(self):
+        pizza = self.pizzas[1]
+        pizza.order = self.delivered
+        with self.assertNumQueries(1):
+            pizza.save()
+        self.assertIn(pizza, self.live)
+
+        pizza.delete()
+        self.assertEqual(frozenset([self.pizzas[0].pk]), self.live.pks)
+
+        pizza = Pizza.objects.create(diameter=20, created=timezone.now(), order=self.delivered)
+        self.assertIn(pizza, self.live)
+
+    def test_related_changes(self):
+        self.pending.delivered_time = timezone.now()
+        self.pending.save()
+        self.assertEqual(3, self.live.count())
+
+        self.delivered.delivered_time = None
+        self.delivered.save()
+        self.assertEqual(2, self.live.count())
+
+        # the pizzas of the deleted order are deleted with it
+        self.pending.delete()
+        self.assertEqual(0, self.live.count())
+
+        # unrelated models don't query
+        with self.assertNumQueries(1):
+            Topping.objects.create(name='cheese', is_gluten_free=True)
+
+    def test_moving_related_objects(self):
+        big = LiveFilteredSet(Order, Q(pizza__diameter__gt=12))
+        try:
+            self.assertEqual(frozenset([self.pending.pk]), big.pks)
+            for pizza in self.pizzas[1:]:
+                pizza.order = self.delivered
+                pizza.save()
+            # the order the pizzas left is evaluated again too
+            self.assertEqual(frozenset([self.delivered.pk]), big.pks)
+        finally:
+            big.disconnect()
+
+    def test_change_events(self):
+        received = []
+
+        def receiver(sender, event, **kwargs):
+            if sender is self.live:
+                received.append(event)
+
+        membership_changed.connect(receiver)
+        try:
+            version = self.live.version
+            deleted_pk = self.pizzas[0].pk
+            self.pending.delivered_time = timezone.now()
+            self.pending.save()
+            self.pizzas[0].delete()
+        finally:
+            membership_changed.disconnect(receiver)
+
+        expected = [
+            ChangeEvent(version + 1, self.pizzas[1].pk, True),
+            ChangeEvent(version + 2, self.pizzas[2].pk, True),
+            ChangeEvent(version + 3, deleted_pk, False),
+        ]
+        self.assertEqual(expected, self.live.changes(since=version))
+        self.assertEqual(expected, received)
+        self.assertEqual(expected[2:], self.live.changes(since=version + 2))
+
+    def test_reload_after_bulk_update(self):
+        Order.objects.update(delivered_time=timezone.now())
+        self.assertEqual(1, self.live.count())
+
+        version = self.live.version
+        self.live.reload()
+        self.assertEqual(3, self.live.count())
+        self.assertEqual(2, len(self.live.changes(since=version)))
+
+
+class LiveManyToManyTests(TestCase):
+    def setUp(self):
+        self.cheese = Topping.objects.create(name='cheese', is_gluten_free=True)
+        self.pizza = Pizza.objects.create(diameter=10, created=timezone.now())
+        self.live = LiveFilteredSet(Pizza, Q(toppings__name='cheese'))
+        self.live.count()
+
+    def tearDown(self):
+        self.live.disconnect()
+
+    def test_m2m_changes(self):
+        self.pizza.toppings.add(self.cheese)
+        self.assertIn(self.pizza, self.live)
+
+        self.pizza.toppings.remove(self.cheese)
+        self.assertNotIn(self.pizza, self.live)
+
+        self.cheese.pizza_set.add(self.pizza)
+        self.assertIn(self.pizza, self.live)
+
+        # clear() doesn't say which pizzas lost the topping
+        self.cheese.pizza_set.clear()
+        self.assertNotIn(self.pizza, self.live)
+
+    def test_related_object_changes(self):
+        self.pizza.toppings.add(self.cheese)
+        self.cheese.name = 'mozzarella'
+        self.cheese.save()
+        self.assertNotIn(self.pizza, self.live)
+
+        self.cheese.delete()
+        Topping.objects.create(name='cheese', is_gluten_free=True)
+        self.assertEqual(0, self.live.count())
+
+
+class RelationStepsTests(TestCase):
+    def test_relation_steps(self):
+        steps = get_relation_steps(Pizza, Q(order__price=1) | Q(toppings__name='x', diameter=2))
+        self.assertEqual(['order', 'toppings'], [step.path for step in steps])
+        self.assertEqual([Order, Topping], [step.model for step in steps])
+        self.assertEqual([None, Pizza.toppings.through], [step.through for step in steps])
+
+        steps = get_relation_steps(Order, Q(pizza__toppings__name='x'))
+        self.assertEqual(['pizza', 'pizza__toppings'], [step.path for step in steps])
+        self.assertEqual([None, Pizza.toppings.through], [step.through for step in steps])
+
+        steps = get_relation_steps(MiscModel, Q(extra_info__integer=1))
+        self.assertEqual([('extra_info', MiscModel, None)], steps)
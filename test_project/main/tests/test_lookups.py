@@ -1,13 +1,17 @@
 # coding=utf-8
-import unittest
+import warnings
 from datetime import timedelta
 
+from django.conf import settings
 from django.db.models.query_utils import Q
 from django.test.testcases import TransactionTestCase, TestCase
+from django.test.utils import override_settings
 from django.utils import timezone
 from qtools import obj_matches_q, filter_by_q
-from qtools.exceptions import InvalidLookupUsage
-from qtools.lookups import get_lookup_adapter
+from qtools.exceptions import InvalidLookupUsage, InvalidLookupValue
+from qtools.lookups import get_lookup_adapter, MySqlCompatibleLookups, PostgresCompatibleLookups, posix_regex_to_python, \
+    PythonLookups, SqLiteCompatibleLookups
+from qtools.utils import get_field_simple_datatype, limit_float_to_digits
 
 from main.models import MiscModel
 from .base import QInPythonTestCaseMixin
@@ -36,6 +40,20 @@ class TestLookups(TestCase, QInPythonTestCaseMixin):
         mem_results = filter_by_q(all_models, Q(miscmodel__in=a_models))
         self.assertEqual(set(db_results), set(mem_results))
 
+    def test_lookup_functions_normalize_the_obj_value(self):
+        self.assertTrue(PythonLookups.iexact('ABC', 'abc'))
+        self.assertTrue(PythonLookups.istartswith(u'Hello', 'HE'))
+        self.assertTrue(PythonLookups.endswith(12, '2'))
+        self.assertTrue(SqLiteCompatibleLookups.contains('HELLO', 'ell'))
+        self.assertTrue(PostgresCompatibleLookups.icontains('hello', 'ELL'))
+        self.assertTrue(MySqlCompatibleLookups.exact('Bob  ', 'bob', 'string'))
+        self.assertTrue(MySqlCompatibleLookups.in_func('BOB', ['bob'], 'string'))
+
+        # the compiled kernels take the normalized value
+        iexact = PythonLookups.get_lookup_function('iexact', obj_value_normalized=True)
+        self.assertTrue(iexact('abc', 'ABC'))
+        self.assertFalse(iexact('ABC', 'abc'))
+
     def test_invalid_usage_regex(self):
         m = MiscModel()
         m.save()
@@ -168,6 +186,12 @@ class TestLookupValues(TestCase, QInPythonTestCaseMixin):
             ]
         )
 
+    def test_text_search(self):
+        self.assert_lookup_matches('search', 'text', 'Pizza', 'Pizza', lookup_adapter='sqlite')
+        self.assert_lookup_matches('search', 'text', 'Pizza', 'pIZ', lookup_adapter='sqlite')
+        self.assert_lookup_does_not_match('search', 'text', None, 'Pizza', lookup_adapter='sqlite')
+        self.assert_lookup_matches('search', 'text', 12, 1, lookup_adapter='sqlite')
+
     def test_text_endswith(self):
         self.run_through_lookup_test_cases(
             field_name='text',
@@ -240,14 +264,134 @@ class TestLookupValues(TestCase, QInPythonTestCaseMixin):
         )
 
 
+class TestCompiledLookups(TestCase, QInPythonTestCaseMixin):
+    def assert_kernels_match_evaluate_lookup(self, lookup_adapter, lookup_names, simple_types):
+        test_values = self.generate_test_value_pairs()
+        for lookup_name in lookup_names:
+            normalization = lookup_adapter.get_obj_value_normalization(lookup_name)
+            for simple_type in simple_types:
+                for query_value in test_values:
+                    kernel = lookup_adapter.compile_lookup(lookup_name, query_value, simple_type)
+                    for obj_value in test_values:
+                        expected = self.run_lookup(lookup_adapter.evaluate_lookup, lookup_name, obj_value, query_value, simple_type)
+                        actual = self.run_lookup(lambda *args: kernel(lookup_adapter.normalize_obj_value(normalization, obj_value, simple_type)))
+                        if expected != actual:
+                            self.fail('Compiled %s lookup (%s)%s %s: %s != %s' % (
+                                lookup_name, simple_type, repr(obj_value), repr(query_value), repr(actual), repr(expected)))
+
+    def run_lookup(self, fn, *args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            return type(e)
+
+    def test_mysql_kernels_match_evaluate_lookup(self):
+        self.assert_kernels_match_evaluate_lookup(
+            MySqlCompatibleLookups,
+            lookup_names=sorted(MySqlCompatibleLookups.KERNEL_BUILDERS),
+            simple_types=[None, 'boolean', 'number', 'string', 'date', 'datetime']
+        )
+
+
+class TestLimitFloatToDigits(TestCase):
+    def test_boundaries(self):
+        for num, digits, expected in [
+            (0.0, 15, 0.0),
+            (1.5, 15, 1.5),
+            (0.30000000000000004, 15, 0.3),
+            (1e-4, 15, 1e-4),
+            (1.0000000000000002e-4, 15, 1e-4),
+            (1e16, 15, 1e16),
+            (1234567890123456.8, 15, 1234567890123456.0),
+            (-123.45678901234568, 15, -123.456789012345),
+            (-0.12345678901234568, 15, -0.123456789012345),
+            (3.14159, 3, 3.14),
+            (-2.718281828, 5, -2.7182),
+            (0.1 + 0.2, 14, 0.3),
+        ]:
+            self.assertEqual(repr(expected), repr(limit_float_to_digits(num, digits)), (num, digits))
+
+
+class TestPostgresLookups(TestCase, QInPythonTestCaseMixin):
+    def test_adapter_for_engine(self):
+        self.assertIs(get_lookup_adapter('django.db.backends.postgresql_psycopg2'), PostgresCompatibleLookups)
+        self.assertIs(get_lookup_adapter('postgres'), PostgresCompatibleLookups)
+
+    def test_posix_regex_to_python(self):
+        self.assertEqual(posix_regex_to_python('^[[:digit:]]+$'), '^[0-9]+$')
+        self.assertEqual(posix_regex_to_python('[[:alpha:]_]'), '[a-zA-Z_]')
+        self.assertEqual(posix_regex_to_python(r'\ypizza\y'), r'\bpizza\b')
+        self.assertEqual(posix_regex_to_python(r'a\\y'), r'a\\y')
+
+    def test_text_regex(self):
+        self.assert_lookup_matches('regex', 'text', 'pizza 42', '[[:digit:]]{2}$', lookup_adapter='postgres')
+        self.assert_lookup_matches('regex', 'text', 'a pizza', r'\mpizza', lookup_adapter='postgres')
+        self.assert_lookup_does_not_match('regex', 'text', 'apizza', r'\mpizza', lookup_adapter='postgres')
+
+    def test_text_iexact(self):
+        self.assert_lookup_matches('iexact', 'text', 'Pizza', 'pIZZA', lookup_adapter='postgres')
+        # UPPER() leaves characters with multi-character uppercase forms alone
+        self.assert_lookup_does_not_match('iexact', 'text', u'stra\xdfe', 'STRASSE', lookup_adapter='postgres')
+        self.assert_lookup_matches('iexact', 'text', '1', 1, lookup_adapter='postgres', expected=InvalidLookupValue)
+
+    def test_text_icontains(self):
+        self.assert_lookup_matches('icontains', 'text', 'Pepperoni Pizza', 'PIZ', lookup_adapter='postgres')
+        self.assert_lookup_does_not_match('icontains', 'text', u'\xdf', 'ss', lookup_adapter='postgres')
+
+    def test_invalid_usage(self):
+        self.assert_lookup_matches('search', 'text', 'pizza', 'pizza', lookup_adapter='postgres', expected=InvalidLookupUsage)
+        self.assert_lookup_matches('gt', 'text', 'b', 'a', lookup_adapter='postgres', expected=InvalidLookupUsage)
+        self.assert_lookup_matches('gt', 'integer', 2, 1, lookup_adapter='postgres')
+
+
+class TestDatabaseAliases(TestCase):
+    def replica_engine(self, engine):
+        databases = dict(settings.DATABASES)
+        databases['replica'] = dict(databases['replica'], ENGINE=engine)
+        return override_settings(DATABASES=databases)
+
+    def test_adapter_per_alias(self):
+        default_adapter = get_lookup_adapter()
+        with warnings.catch_warnings():
+            # django warns that overriding DATABASES doesn't change the connections, only the settings are needed here
+            warnings.simplefilter('ignore')
+            with self.replica_engine('django.db.backends.mysql'):
+                self.assertIs(MySqlCompatibleLookups, get_lookup_adapter(using='replica'))
+                self.assertIs(default_adapter, get_lookup_adapter())
+                self.assertIs(PostgresCompatibleLookups, get_lookup_adapter('postgres', using='replica'))
+
+        self.assertIs(default_adapter, get_lookup_adapter(using='replica'))
+
+    def test_evaluates_with_the_objects_database(self):
+        m = MiscModel(text='Hello')
+        # mysql compares strings case-insensitively
+        q = Q(text='HELLO')
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            with self.replica_engine('django.db.backends.mysql'):
+                self.assertFalse(obj_matches_q(m, q))
+                self.assertTrue(obj_matches_q(m, q, using='replica'))
+                self.assertEqual([m], filter_by_q([m], q, using='replica'))
+
+                m._state.db = 'replica'
+                self.assertTrue(obj_matches_q(m, q))
+                self.assertFalse(obj_matches_q(m, q, using='default'))
+                self.assertFalse(obj_matches_q(m, q, lookup_adapter='python'))
+
+    def test_field_types_per_alias(self):
+        field = MiscModel._meta.get_field('text')
+        self.assertEqual('string', get_field_simple_datatype(field, 'replica'))
+        self.assertEqual('string', get_field_simple_datatype(field))
+
+
 class TestLookupsBulk(TransactionTestCase, QInPythonTestCaseMixin):
-    @unittest.skip("Takes too long to run")
     def test_all_lookups_basic(self):
         """
+        Compares every lookup in python and in the database
 
-        This will return failures. Specifically:
+        Known differences:
           - python doesn't collate the same way as mysql so string comparisons will come out different  ('True' > '[]' for example)
-          - fulltext search will throw errors on sqlite because it isn't supported (hardcoded to skip these tests)
+          - fulltext search will throw errors on sqlite because it isn't supported (counted as not in db)
           - fulltext search will throw errors on mysql if there isn't a fulltext index (hardcoded to skip these tests)
         """
         lookup_adapter = get_lookup_adapter()
@@ -255,4 +399,4 @@ class TestLookupsBulk(TransactionTestCase, QInPythonTestCaseMixin):
         test_values = list(self.generate_test_value_pairs())
         lookup_names = lookup_adapter.SUPPORTED_LOOKUP_NAMES
 
-        self.assert_lookups_work(field_names, lookup_names, test_values, fail_fast=False, skip_first=0)
+        self.assert_lookups_work(field_names, lookup_names, test_values)
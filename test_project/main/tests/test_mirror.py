@@ -0,0 +1,78 @@
+from django.db.models import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import TableMirror
+
+from main.models import Topping, Pizza
+
+
+class TableMirrorTests(TestCase):
+    def setUp(self):
+        Topping(name='cheese', is_gluten_free=True).save()
+        Topping(name='pepperoni', is_gluten_free=True).save()
+        Topping(name='crouton', is_gluten_free=False).save()
+        self.mirror = TableMirror(Topping, fields=['name', 'is_gluten_free'])
+        self.mirror.all()
+
+    def tearDown(self):
+        self.mirror.disconnect()
+
+    def test_answers_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(2, self.mirror.count(Q(is_gluten_free=True)))
+            self.assertEqual('crouton', self.mirror.get(is_gluten_free=False).name)
+            self.assertEqual(['pepperoni'], [t.name for t in self.mirror.filter(Q(name__startswith='p'))])
+
+        with self.assertRaises(Topping.DoesNotExist):
+            self.mirror.get(name='anchovy')
+
+        with self.assertRaises(Topping.MultipleObjectsReturned):
+            self.mirror.get(Q(is_gluten_free=True))
+
+    def test_follows_signals(self):
+        version = self.mirror.version
+        anchovy = Topping(name='anchovy', is_gluten_free=True)
+        anchovy.save()
+        self.assertEqual(3, self.mirror.count(is_gluten_free=True))
+
+        anchovy.is_gluten_free = False
+        anchovy.save()
+        self.assertEqual(2, self.mirror.count(is_gluten_free=False))
+
+        anchovy.delete()
+        self.assertEqual(1, self.mirror.count(is_gluten_free=False))
+        self.assertEqual(version + 3, self.mirror.version)
+
+    def test_keeps_copies_of_saved_objects(self):
+        anchovy = Topping(name='anchovy', is_gluten_free=True)
+        anchovy.save()
+        anchovy.is_gluten_free = False
+        self.assertEqual(3, self.mirror.count(is_gluten_free=True))
+
+        mirrored = self.mirror.get(name='anchovy')
+        self.assertIsNot(anchovy, mirrored)
+        self.assertTrue(mirrored.is_gluten_free)
+
+        mirror = TableMirror(Topping, fields=['name'])
+        mirror.all()
+        try:
+            anchovy.save()
+            with self.assertNumQueries(1):
+                self.assertFalse(mirror.get(name='anchovy').is_gluten_free)
+        finally:
+            mirror.disconnect()
+
+    def test_m2m_changes_bump_version(self):
+        pizza = Pizza(diameter=12, created=timezone.now())
+        pizza.save()
+        version = self.mirror.version
+        pizza.toppings.add(self.mirror.get(name='cheese'))
+        self.assertEqual(version + 1, self.mirror.version)
+        self.assertEqual(1, self.mirror.count(pizza=pizza))
+
+    def test_reload_after_bulk_update(self):
+        Topping.objects.update(is_gluten_free=False)
+        self.assertEqual(2, self.mirror.count(is_gluten_free=True))
+
+        self.mirror.reload()
+        self.assertEqual(0, self.mirror.count(is_gluten_free=True))
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import order_by_in_memory, top_k
+from qtools.exceptions import InvalidLookupUsage
+
+from main.models import MiscModel, Order, Pizza
+
+
+class OrderByInMemoryTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        parent = MiscModel.objects.create(integer=2, float=2.5, decimal=Decimal('1.5'), datetime=now)
+        MiscModel.objects.create(integer=None, float=0.5, decimal=Decimal('2.25'), foreign=parent)
+        MiscModel.objects.create(integer=2, float=None, decimal=None, datetime=now - timedelta(days=1))
+        MiscModel.objects.create(integer=-1, float=1.0, decimal=Decimal('-3'), foreign=parent)
+        MiscModel.objects.create(integer=7, float=1.0, decimal=Decimal('0.5'), datetime=now + timedelta(days=1))
+
+    def assert_orders_like_the_database(self, *fields):
+        objs = list(MiscModel.objects.order_by('?'))
+        expected = list(MiscModel.objects.order_by(*fields))
+        self.assertEqual(expected, order_by_in_memory(objs, *fields))
+        for k in (0, 2, len(expected) + 1):
+            self.assertEqual(expected[:k], top_k(objs, k, *fields))
+
+    def test_same_order_as_the_database(self):
+        for fields in [
+            ('integer', 'pk'),
+            ('-integer', 'pk'),
+            ('-integer', '-pk'),
+            ('float', '-decimal', 'pk'),
+            ('-datetime', 'pk'),
+            ('decimal',),
+            ('foreign__integer', '-pk'),
+            ('-foreign', 'pk'),
+        ]:
+            self.assert_orders_like_the_database(*fields)
+
+    def test_relations_and_rows(self):
+        order = Order.objects.create(name_on_order='Bob', price=10)
+        created = timezone.now()
+        pizzas = [
+            Pizza.objects.create(diameter=10, created=created, order=order),
+            Pizza.objects.create(diameter=14, created=created),
+            Pizza.objects.create(diameter=12, created=created, order=Order.objects.create(price=5)),
+        ]
+        expected = list(Pizza.objects.order_by('order__price', 'pk'))
+        with self.assertNumQueries(0):
+            loaded = list(reversed(pizzas))
+            self.assertEqual(expected, order_by_in_memory(loaded, 'order__price', 'pk'))
+
+        rows = list(Pizza.objects.values('id', 'order__price'))
+        self.assertEqual(list(Pizza.objects.order_by('order__price', 'pk').values('id', 'order__price')),
+                         order_by_in_memory(rows, 'order__price', 'id', model=Pizza))
+
+        self.assertEqual([pizzas[2].order], top_k(Order.objects.all(), 1, '-pizza__diameter'))
+
+        # django would return the order once per pizza
+        Pizza.objects.create(diameter=16, created=created, order=order)
+        with self.assertRaises(ValueError):
+            order_by_in_memory(Order.objects.all(), 'pizza__diameter')
+
+    def test_mysql_collation(self):
+        names = ['bob', 'Alice ', 'alice', 'Carol', None]
+        orders = [Order(name_on_order=name, price=1) for name in names]
+        ordered = order_by_in_memory(orders, 'name_on_order', lookup_adapter='mysql')
+        self.assertEqual([None, 'Alice ', 'alice', 'bob', 'Carol'], [o.name_on_order for o in ordered])
+
+        ordered = order_by_in_memory(orders, 'name_on_order', lookup_adapter='sqlite')
+        self.assertEqual([None, 'Alice ', 'Carol', 'alice', 'bob'], [o.name_on_order for o in ordered])
+
+    def test_postgres_nulls_and_strings(self):
+        objs = [MiscModel(integer=i) for i in (3, None, 1)]
+        ordered = order_by_in_memory(objs, 'integer', lookup_adapter='postgres')
+        self.assertEqual([1, 3, None], [obj.integer for obj in ordered])
+        self.assertEqual([None, 3], [obj.integer for obj in top_k(objs, 2, '-integer', lookup_adapter='postgres')])
+
+        with self.assertRaises(InvalidLookupUsage):
+            order_by_in_memory([MiscModel(text='a'), MiscModel(text='b')], 'text', lookup_adapter='postgres')
+
+    def test_decimal_and_float_values(self):
+        objs = [MiscModel(decimal=Decimal('1.5')), MiscModel(decimal=1.25), MiscModel(decimal=Decimal('1.3'))]
+        self.assertEqual([1.25, Decimal('1.3'), Decimal('1.5')],
+                         [obj.decimal for obj in order_by_in_memory(objs, 'decimal', lookup_adapter='sqlite')])
+
+    def test_no_fields(self):
+        objs = [MiscModel(integer=2), MiscModel(integer=1)]
+        self.assertEqual(objs, order_by_in_memory(objs))
+        self.assertEqual(objs[:1], top_k(objs, 1))
+        with self.assertRaises(ValueError):
+            order_by_in_memory(objs, '?')
+
+    def test_string_ordering_in_this_database(self):
+        if connection.vendor == 'postgresql':
+            return
+        for text in ['b', 'a', 'B', None, 'ab']:
+            MiscModel.objects.create(text=text)
+        self.assert_orders_like_the_database('text', 'pk')
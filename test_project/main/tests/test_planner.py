@@ -0,0 +1,165 @@
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import filter_by_q, obj_matches_q, QResultCache, UNKNOWN
+from qtools.planner import get_missing_field_path, partial_obj_matches_q, residual_q
+
+from main.models import MiscModel, Order, Pizza, Topping
+
+
+class PlannerTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.delivered = Order.objects.create(name_on_order='Bob', price=10, delivered_time=now)
+        self.pending = Order.objects.create(name_on_order='Sue', price=20)
+        self.pizzas = [
+            Pizza.objects.create(diameter=10, created=now, order=self.delivered),
+            Pizza.objects.create(diameter=14, created=now, order=self.delivered),
+            Pizza.objects.create(diameter=16, created=now, order=self.pending),
+            Pizza.objects.create(diameter=18, created=now),
+        ]
+
+    def test_missing_field_path(self):
+        pizza = Pizza.objects.only('id', 'diameter').get(pk=self.pizzas[0].pk)
+        self.assertIsNone(get_missing_field_path(pizza, 'diameter__gt'))
+        self.assertEqual('created', get_missing_field_path(pizza, 'created__year'))
+        self.assertEqual('order', get_missing_field_path(pizza, 'order__delivered_time__isnull'))
+        self.assertEqual('toppings', get_missing_field_path(pizza, 'toppings__name'))
+
+        pizza = Pizza.objects.select_related('order').only('id', 'order__price').get(pk=self.pizzas[0].pk)
+        self.assertIsNone(get_missing_field_path(pizza, 'order__price'))
+        self.assertEqual('order__name_on_order', get_missing_field_path(pizza, 'order__name_on_order'))
+
+        order = Order.objects.prefetch_related('pizza_set').get(pk=self.delivered.pk)
+        self.assertIsNone(get_missing_field_path(order, 'pizza__diameter'))
+        self.assertEqual('pizza', get_missing_field_path(Order.objects.get(pk=self.delivered.pk), 'pizza__diameter'))
+
+    def test_partial_evaluation(self):
+        pizza = Pizza.objects.only('id', 'diameter').get(pk=self.pizzas[0].pk)
+        unknown = Q(order__delivered_time__isnull=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(UNKNOWN, partial_obj_matches_q(pizza, unknown))
+            self.assertIs(False, partial_obj_matches_q(pizza, Q(diameter__gt=12) & unknown))
+            self.assertIs(True, partial_obj_matches_q(pizza, Q(diameter__lt=12) | unknown))
+            self.assertEqual(UNKNOWN, partial_obj_matches_q(pizza, Q(diameter__lt=12) & unknown))
+            self.assertEqual(UNKNOWN, partial_obj_matches_q(pizza, ~(Q(diameter__lt=12) & unknown)))
+            self.assertIs(True, partial_obj_matches_q(pizza, ~(Q(diameter__gt=12) & unknown)))
+
+    def test_residual_q(self):
+        q = Q(diameter__gt=12) & (Q(order__price=10) | Q(order__name_on_order='Bob'))
+        self.assertEqual(
+            str(Q(order__price=10) | Q(order__name_on_order='Bob')),
+            str(residual_q(q, {(0,): {True}, (1, 0): {UNKNOWN}, (1, 1): {UNKNOWN}}))
+        )
+        self.assertEqual([('order__price', 10)], residual_q(q, {(0,): {True}, (1, 0): {UNKNOWN}, (1, 1): {False}}).children)
+        # a leaf with different results for different objects stays in the query
+        self.assertEqual(str(q), str(residual_q(q, {(0,): {True, False}, (1, 0): {UNKNOWN}, (1, 1): {UNKNOWN}})))
+        self.assertIs(False, residual_q(q, {(0,): {False}}))
+        self.assertIs(True, residual_q(~q, {(0,): {False}}))
+
+    def test_filter_by_q_queries_once(self):
+        pizzas = list(Pizza.objects.only('id', 'diameter').order_by('pk'))
+        q = Q(diameter__gt=12) & Q(order__delivered_time__isnull=False)
+        with self.assertNumQueries(1):
+            self.assertEqual([self.pizzas[1]], filter_by_q(pizzas, q, missing='query'))
+        self.assertEqual([self.pizzas[1]], filter_by_q(pizzas, q))
+
+    def test_decided_objects_skip_the_database(self):
+        pizzas = list(Pizza.objects.select_related('order').order_by('pk'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.pizzas[:2], filter_by_q(pizzas, Q(order__delivered_time__isnull=False), missing='query'))
+
+        pizzas = list(Pizza.objects.only('id', 'diameter').order_by('pk'))
+        with self.assertNumQueries(0):
+            self.assertEqual([], filter_by_q(pizzas, Q(diameter__gt=20) & Q(order__price=10), missing='query'))
+
+    def test_forward_many_to_many(self):
+        cheese = Topping.objects.create(name='cheese', is_gluten_free=True)
+        self.pizzas[1].toppings.add(cheese)
+        pizzas = list(Pizza.objects.order_by('pk'))
+        with self.assertNumQueries(1):
+            result = filter_by_q(pizzas, Q(toppings__name='cheese') | Q(diameter__lt=12), missing='query')
+        self.assertEqual(self.pizzas[:2], result)
+
+    def test_obj_matches_q(self):
+        pizza = Pizza.objects.only('id', 'diameter').get(pk=self.pizzas[1].pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(obj_matches_q(pizza, Q(order__price=10), missing='query'))
+        with self.assertNumQueries(0):
+            self.assertFalse(obj_matches_q(pizza, Q(order__price=10, diameter=1), missing='query'))
+
+        unsaved = Pizza(diameter=10, created=timezone.now(), order=self.pending)
+        self.assertTrue(obj_matches_q(unsaved, Q(order__price=20), missing='query'))
+
+        with self.assertRaises(ValueError):
+            obj_matches_q(pizza, Q(order__price=10), missing='ignore')
+
+    def test_descriptor(self):
+        pizza = Pizza.objects.only('id').get(pk=self.pizzas[0].pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(pizza.is_delivered_planned)
+
+    def test_model_values_are_not_expressions(self):
+        # an attribute named like the operands of an expression
+        order = Order.objects.get(pk=self.delivered.pk)
+        order.children = Order.objects
+        pizza = Pizza.objects.select_related('order').get(pk=self.pizzas[0].pk)
+        with self.assertNumQueries(0):
+            self.assertIs(True, partial_obj_matches_q(pizza, Q(order=order)))
+
+    def test_reverse_one_to_one(self):
+        main = MiscModel.objects.create(integer=1)
+        MiscModel.objects.create(integer=2, main_info=main)
+        objs = list(MiscModel.objects.order_by('pk'))
+        q = Q(extra_info__integer=2)
+        with self.assertNumQueries(1):
+            self.assertEqual([main], filter_by_q(objs, q, missing='query'))
+        self.assertEqual([main], filter_by_q(objs, q))
+
+
+class UnknownResultTests(TestCase):
+    def setUp(self):
+        order = Order.objects.create(name_on_order='Bob', price=10, delivered_time=timezone.now())
+        self.pizza = Pizza.objects.create(diameter=10, created=timezone.now(), order=order)
+
+    def test_unknown(self):
+        pizza = Pizza.objects.only('id', 'diameter').get(pk=self.pizza.pk)
+        q = Q(diameter__lt=12) & (Q(order__price=10) | Q(created__year=2000))
+        with self.assertNumQueries(0):
+            result = obj_matches_q(pizza, q, missing='unknown')
+            self.assertEqual(UNKNOWN, result)
+            self.assertEqual(('order', 'created'), result.missing_fields)
+            self.assertIs(False, obj_matches_q(pizza, Q(diameter__gt=12) & q, missing='unknown'))
+            self.assertIs(True, obj_matches_q(pizza, Q(diameter=10) | q, missing='unknown'))
+            self.assertEqual(UNKNOWN, obj_matches_q(pizza, ~q, missing='unknown'))
+
+        with self.assertRaises(TypeError):
+            bool(result)
+
+    def test_only_the_deciding_fields_are_reported(self):
+        pizza = Pizza.objects.only('id', 'diameter').get(pk=self.pizza.pk)
+        q = (Q(created__year=2000) & Q(diameter__gt=12)) | Q(order__price=10)
+        self.assertEqual(('order',), obj_matches_q(pizza, q, missing='unknown').missing_fields)
+
+        pizza = Pizza.objects.select_related('order').only('id', 'order__price').get(pk=self.pizza.pk)
+        result = obj_matches_q(pizza, Q(order__name_on_order='Bob'), missing='unknown')
+        self.assertEqual(('order__name_on_order',), result.missing_fields)
+
+    def test_known(self):
+        pizza = Pizza.objects.select_related('order').get(pk=self.pizza.pk)
+        with self.assertNumQueries(0):
+            self.assertIs(True, obj_matches_q(pizza, Q(order__price=10, diameter=10), missing='unknown'))
+
+    def test_unknown_results_are_not_cached(self):
+        cache = QResultCache()
+        pizza = Pizza.objects.only('id').get(pk=self.pizza.pk)
+        q = Q(diameter=10)
+        self.assertEqual(UNKNOWN, obj_matches_q(pizza, q, missing='unknown', cache=cache, version=1))
+        pizza.diameter = 10
+        self.assertIs(True, obj_matches_q(pizza, q, missing='unknown', cache=cache, version=1))
+        self.assertIs(True, obj_matches_q(pizza, q, cache=cache, version=1))
+        self.assertEqual(1, cache.info().hits)
+
+    def test_filter_by_q_needs_a_decision(self):
+        with self.assertRaises(ValueError):
+            filter_by_q([self.pizza], Q(diameter=10), missing='unknown')
@@ -0,0 +1,85 @@
+from django.db.models import F
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import filter_by_q, required_fields
+from qtools.planner import is_field_loaded
+from qtools.projection import project_queryset
+
+from main.models import MiscModel, Order, Pizza, PizzaQuerySet, Topping
+
+
+class RequiredFieldsTests(TestCase):
+    def test_paths(self):
+        self.assertEqual(['diameter', 'order__delivered_time'],
+                         required_fields(Pizza, Q(diameter__gt=12) & PizzaQuerySet.is_delivered.q()))
+        self.assertEqual(['order', 'id'], required_fields(Pizza, Q(order=1) | ~Q(pk__in=[1, 2])))
+        self.assertEqual(['created'], required_fields(Pizza, Q(created__year=2015, created__month__gt=2)))
+        self.assertEqual(['pizza__toppings__name'], required_fields(Order, Q(pizza__toppings__name__startswith='a')))
+        self.assertEqual(['integer', 'foreign__float'], required_fields(MiscModel, Q(integer__gt=F('foreign__float'))))
+        self.assertEqual([], required_fields(Pizza, Q()))
+
+
+class ProjectedQuerySetTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.order = Order.objects.create(name_on_order='Bob', price=10, delivered_time=now)
+        pizza = Pizza.objects.create(diameter=14, created=now, order=self.order)
+        pizza.toppings.add(Topping.objects.create(name='basil', is_gluten_free=True))
+        Pizza.objects.create(diameter=16, created=now, order=Order.objects.create(name_on_order='Sue', price=20))
+        Pizza.objects.create(diameter=10, created=now)
+
+    def assert_projected(self, model, q, num_queries):
+        expected = list(model.objects.filter(q).distinct().order_by('pk'))
+        with self.assertNumQueries(num_queries):
+            result = filter_by_q(model.objects.order_by('pk'), q, project=True)
+        self.assertEqual(expected, result)
+        return result
+
+    def test_loads_only_the_required_fields(self):
+        pizzas = self.assert_projected(Pizza, Q(diameter__gt=12) & PizzaQuerySet.is_delivered.q(), 1)
+        self.assertEqual(['created'], [f.name for f in Pizza._meta.concrete_fields
+                                       if not is_field_loaded(pizzas[0], f.name)])
+        self.assertFalse(is_field_loaded(pizzas[0].order, 'price'))
+
+        # the key the pizza holds is enough, the orders aren't joined
+        pizzas = self.assert_projected(Pizza, Q(order=self.order) | Q(order__isnull=True), 1)
+        self.assertFalse(is_field_loaded(pizzas[0], 'order'))
+        self.assertNotIn('JOIN', str(project_queryset(Pizza.objects.all(), Q(order=self.order)).query))
+        self.assert_projected(Pizza, Q(diameter__gt=F('order__price')), 1)
+
+    def test_not_projected_by_default(self):
+        expected = list(Pizza.objects.filter(diameter__gt=12).order_by('pk'))
+        with self.assertNumQueries(1):
+            pizzas = filter_by_q(Pizza.objects.order_by('pk'), Q(diameter__gt=12))
+            self.assertEqual(expected, pizzas)
+            for pizza in pizzas:
+                self.assertTrue(all(is_field_loaded(pizza, f.name) for f in Pizza._meta.concrete_fields
+                                    if f.name != 'order'))
+
+    def test_prefetches_multi_valued_relations(self):
+        self.assert_projected(Order, Q(pizza__diameter__gt=15) | Q(pizza__toppings__is_gluten_free=True), 3)
+        self.assert_projected(Pizza, Q(toppings__name='basil'), 2)
+        self.assert_projected(Order, Q(pizza__isnull=True), 2)
+
+    def test_querysets_that_pick_their_fields_are_left_alone(self):
+        q = Q(diameter__gt=12)
+        for queryset in [
+            Pizza.objects.only('created'),
+            Pizza.objects.defer('created'),
+            Pizza.objects.prefetch_related('toppings'),
+            Pizza.objects.select_related('order'),
+            Pizza.objects.select_related(),
+            Pizza.objects.values('diameter'),
+        ]:
+            self.assertEqual(queryset.query.deferred_loading, project_queryset(queryset, q).query.deferred_loading)
+
+        expected = list(Pizza.objects.filter(q).order_by('pk'))
+        with self.assertNumQueries(1):
+            pizzas = filter_by_q(Pizza.objects.select_related('order').order_by('pk'), q, project=True)
+            self.assertEqual(expected, pizzas)
+            self.assertEqual(['Bob', 'Sue'], [pizza.order.name_on_order for pizza in pizzas])
+
+        evaluated = Pizza.objects.all()
+        list(evaluated)
+        self.assertIs(evaluated, project_queryset(evaluated, q))
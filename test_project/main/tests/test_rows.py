@@ -0,0 +1,81 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.db.models import F
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import filter_by_q, obj_matches_q
+
+from main.models import MiscModel, Order, OrderQuerySet, Pizza, PizzaQuerySet
+
+
+class RowFilteringTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.bob = Order.objects.create(name_on_order='Bob', price=10, delivered_time=now - timedelta(days=1))
+        self.sue = Order.objects.create(name_on_order='sue', price=25)
+        self.pizzas = [
+            Pizza.objects.create(diameter=10, created=now, order=self.bob),
+            Pizza.objects.create(diameter=14, created=now, order=self.sue),
+            Pizza.objects.create(diameter=18, created=now),
+        ]
+
+    def assert_rows_match_sql(self, model, q, *fields):
+        rows = list(model.objects.values(*fields).order_by('pk'))
+        with self.assertNumQueries(0):
+            result = filter_by_q(rows, q, model=model)
+        self.assertEqual(list(model.objects.filter(q).values(*fields).order_by('pk')), result)
+
+    def test_values(self):
+        self.assert_rows_match_sql(Order, OrderQuerySet.is_delivered.q())
+        self.assert_rows_match_sql(Order, OrderQuerySet.cost_between.q(5, 20))
+        self.assert_rows_match_sql(Order, Q(name_on_order__iexact='SUE') | Q(pk__in=[self.bob.pk]))
+        self.assert_rows_match_sql(Order, ~Q(price__gt=10) & Q(delivered_time__year=timezone.now().year))
+
+    def test_joined_keys(self):
+        self.assert_rows_match_sql(Pizza, PizzaQuerySet.is_delivered.q(), 'id', 'order__delivered_time')
+        self.assert_rows_match_sql(Pizza, Q(order__price__gte=20) | Q(diameter__lt=12), 'id', 'diameter', 'order__price')
+        self.assert_rows_match_sql(Pizza, Q(order__isnull=True), 'id', 'order')
+        self.assert_rows_match_sql(Pizza, Q(order=self.sue), 'id', 'order')
+        self.assert_rows_match_sql(Order, Q(pizza__diameter__gt=12), 'id', 'pizza__diameter')
+
+    def test_attname_keys(self):
+        rows = list(Pizza.objects.values().order_by('pk'))
+        self.assertIn('order_id', rows[0])
+        self.assertEqual(rows[1:], filter_by_q(rows, Q(order__pk=self.sue.pk) | Q(order=None), model=Pizza))
+
+    def test_named_tuples(self):
+        Row = namedtuple('Row', ['id', 'name_on_order', 'price'])
+        rows = [Row(*values) for values in Order.objects.values_list('id', 'name_on_order', 'price').order_by('pk')]
+        self.assertEqual(rows[1:], filter_by_q(rows, Q(price__gt=20), model=Order))
+        self.assertTrue(obj_matches_q(rows[0], Q(name_on_order__startswith='B'), model=Order))
+
+    def test_lookup_semantics_follow_the_model(self):
+        MiscModel.objects.create(text='Hello', datetime=timezone.now())
+        self.assert_rows_match_sql(MiscModel, Q(text__contains='hell'), 'id', 'text')
+        self.assert_rows_match_sql(MiscModel, Q(datetime__gte=timezone.now() - timedelta(days=1)), 'id', 'datetime')
+
+    def test_f_expressions(self):
+        self.assert_rows_match_sql(Pizza, Q(diameter__gt=F('order__price')), 'id', 'diameter', 'order__price')
+        self.assert_rows_match_sql(Pizza, ~Q(diameter__lt=F('order__price') + 1), 'id', 'diameter', 'order__price')
+        self.assert_rows_match_sql(Order, Q(delivered_time__lt=F('pizza__created') - timedelta(hours=1)),
+                                   'id', 'delivered_time', 'pizza__created')
+
+    def test_missing_key(self):
+        rows = list(Pizza.objects.values('id'))
+        with self.assertRaises(KeyError):
+            filter_by_q(rows, Q(order__price=10), model=Pizza)
+        with self.assertRaises(ValueError):
+            filter_by_q(rows, Q(diameter__price=10), model=Pizza)
+
+
+class RowQuerySetFilterValueTests(TestCase):
+    def test_queryset_values(self):
+        delivered = Order.objects.create(price=1, delivered_time=timezone.now())
+        Pizza.objects.create(diameter=1, created=timezone.now(), order=delivered)
+        Pizza.objects.create(diameter=2, created=timezone.now(), order=Order.objects.create(price=2))
+
+        rows = list(Pizza.objects.values('order', 'diameter').order_by('pk'))
+        with self.assertNumQueries(1):
+            self.assertEqual(rows[:1], filter_by_q(rows, Q(order__in=Order.objects.is_delivered()), model=Pizza))
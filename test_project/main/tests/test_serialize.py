@@ -0,0 +1,85 @@
+import datetime
+import pickle
+from decimal import Decimal
+
+import pytz
+from django.db.models import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import serialize_q, deserialize_q, fingerprint_q, filter_by_q
+
+from main.models import Order, OrderQuerySet, Pizza
+
+
+class SerializeQTests(TestCase):
+    def test_round_trip(self):
+        order = Order(price=10)
+        order.save()
+        Order(price=20).save()
+
+        q = (
+            Q(price__gte=Decimal('1.50'), name_on_order__in=['a', 'b'])
+            | ~Q(delivered_time__gt=timezone.now())
+            | Q(price__range=(1, 3.5))
+            | Q(pk=order)
+            | Q(delivered_time__gte=datetime.date(2015, 1, 1))
+        )
+        restored = deserialize_q(serialize_q(q))
+        self.assertEqual(serialize_q(q), serialize_q(restored))
+        self.assertEqual(fingerprint_q(q), fingerprint_q(restored))
+
+        q = OrderQuerySet.cost_between.q(5, 15)
+        self.assertEqual(set(Order.objects.filter(q)), set(Order.objects.filter(deserialize_q(serialize_q(q)))))
+
+    def test_model_instances_and_querysets(self):
+        order = Order(price=10)
+        order.save()
+        Pizza(diameter=12, order=order, created=timezone.now()).save()
+
+        restored = deserialize_q(serialize_q(Q(order=order)))
+        self.assertEqual(('order', Order(pk=order.pk)), restored.children[0])
+        self.assertEqual(1, Pizza.objects.filter(restored).count())
+
+        restored = deserialize_q(serialize_q(Q(order__in=Order.objects.all())))
+        self.assertEqual(1, Pizza.objects.filter(restored).count())
+
+    def test_values_list_querysets(self):
+        Order(name_on_order='Bob', price=10).save()
+        Order(name_on_order='Bob', price=20).save()
+        Order(name_on_order='Alice', price=10).save()
+        Order(name_on_order=str(Order.objects.get(name_on_order='Bob', price=10).pk), price=30).save()
+
+        for q in [
+            Q(name_on_order__in=Order.objects.filter(price=10).values_list('name_on_order', flat=True)),
+            Q(price__in=Order.objects.filter(name_on_order='Bob').values('price')),
+        ]:
+            restored = deserialize_q(serialize_q(q))
+            self.assertEqual(serialize_q(q), serialize_q(restored))
+            self.assertEqual(set(Order.objects.filter(q)), set(Order.objects.filter(restored)))
+
+    def test_canonical_order(self):
+        a, b, c = Q(price=1), Q(name_on_order='x'), Q(delivered_time=None)
+        self.assertEqual(fingerprint_q(a & b & c), fingerprint_q(c & (b & a)))
+        self.assertEqual(fingerprint_q(a | b), fingerprint_q(b | a))
+        self.assertEqual(fingerprint_q(Q(price__in={3, 1, 2})), fingerprint_q(Q(price__in={2, 3, 1})))
+        self.assertNotEqual(fingerprint_q(a & b), fingerprint_q(a | b))
+        self.assertNotEqual(fingerprint_q(a & b), fingerprint_q(~(a & b)))
+        self.assertNotEqual(fingerprint_q(Q(price=1)), fingerprint_q(Q(price=True)))
+        self.assertNotEqual(fingerprint_q(Q(price=1)), fingerprint_q(Q(price='1')))
+
+    def test_aware_datetimes_are_normalized(self):
+        utc = datetime.datetime(2015, 6, 1, 12, tzinfo=pytz.utc)
+        eastern = utc.astimezone(pytz.timezone('US/Eastern'))
+        self.assertEqual(fingerprint_q(Q(delivered_time=utc)), fingerprint_q(Q(delivered_time=eastern)))
+        self.assertEqual(utc, deserialize_q(serialize_q(Q(delivered_time=eastern))).children[0][1])
+
+    def test_deserialized_q_filters_in_memory(self):
+        Order(price=10).save()
+        Order(price=20).save()
+        orders = list(Order.objects.all())
+        q = pickle.loads(pickle.dumps(deserialize_q(serialize_q(Q(price__gt=15)))))
+        self.assertEqual(1, len(filter_by_q(orders, q)))
+
+    def test_unsupported_value(self):
+        with self.assertRaisesRegexp(ValueError, 'object'):
+            serialize_q(Q(price=object()))
@@ -0,0 +1,64 @@
+from django.db.models import Q
+from django.test.testcases import TestCase
+from django.utils import timezone
+from qtools import evaluation_session, filter_by_q, obj_matches_q
+from qtools.session import get_current_session
+
+from main.models import MiscModel, Order, Pizza
+
+
+class EvaluationSessionTests(TestCase):
+    def test_normalized_values_are_reused_within_session(self):
+        m = MiscModel(text='Hello', datetime='2015-01-02 03:04:05')
+        with evaluation_session() as session:
+            self.assertTrue(obj_matches_q(m, Q(text__iexact='HELLO') & Q(datetime__year=2015)))
+
+            # the object isn't expected to change during a session, the earlier normalized values are used
+            m.text = 'Goodbye'
+            m.datetime = '2016-01-02 03:04:05'
+            self.assertTrue(obj_matches_q(m, Q(text__istartswith='hel')))
+            self.assertTrue(obj_matches_q(m, Q(datetime__month=1, datetime__year=2015)))
+            self.assertIs(session, get_current_session())
+
+        self.assertIsNone(get_current_session())
+        self.assertFalse(obj_matches_q(m, Q(text__istartswith='hel')))
+        self.assertTrue(obj_matches_q(m, Q(datetime__year=2016)))
+
+    def test_session_per_call(self):
+        m = MiscModel(text='Hello')
+        self.assertEqual([m], filter_by_q([m], Q(text__icontains='ell')))
+        m.text = 'Goodbye'
+        self.assertEqual([], filter_by_q([m], Q(text__icontains='ell')))
+        self.assertIsNone(get_current_session())
+
+    def test_nested_sessions_share_state(self):
+        with evaluation_session() as outer:
+            with evaluation_session() as inner:
+                self.assertIs(outer, inner)
+            self.assertIs(outer, get_current_session())
+        self.assertIsNone(get_current_session())
+
+
+class RelationTraversalTests(TestCase):
+    def setUp(self):
+        for price in (10, 20):
+            order = Order.objects.create(name_on_order='Bob', price=price)
+            for diameter in (10, 14):
+                Pizza.objects.create(diameter=diameter, created=timezone.now(), order=order)
+
+    def test_reverse_relations_are_read_once_per_object(self):
+        orders = list(Order.objects.order_by('pk'))
+        q = Q(pizza__diameter=14) & Q(pizza__created__isnull=False) & ~Q(pizza__diameter=20)
+        with self.assertNumQueries(2):
+            self.assertEqual(orders, filter_by_q(orders, q))
+
+        # a new call reads them again
+        with self.assertNumQueries(1):
+            self.assertFalse(obj_matches_q(orders[0], Q(pizza__diameter=12) | Q(pizza__diameter=13)))
+
+    def test_relations_are_shared_within_session(self):
+        orders = list(Order.objects.order_by('pk'))
+        with self.assertNumQueries(2):
+            with evaluation_session():
+                self.assertEqual(orders, filter_by_q(orders, Q(pizza__diameter=10)))
+                self.assertEqual(orders[1:], filter_by_q(orders, Q(pizza__diameter=14, price=20)))
@@ -0,0 +1,52 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models.query_utils import Q
+from django.test.testcases import TestCase
+from qtools import q_method
+from qtools.exceptions import InvalidFieldLookupCombo
+from qtools.lookups import _ADAPTERS_BY_ALIAS
+from qtools.utils import _FIELD_SIMPLE_DATATYPES
+from qtools.warmup import iter_parameterless_q_funcs, validate_q, warm_up
+
+from main.models import Order, Pizza
+
+
+class WarmUpTests(TestCase):
+    def test_warm_up(self):
+        _ADAPTERS_BY_ALIAS.clear()
+        _FIELD_SIMPLE_DATATYPES.clear()
+        with self.assertNumQueries(0):
+            validated = warm_up()
+
+        self.assertIn('default', _ADAPTERS_BY_ALIAS)
+        self.assertIn(('default', Order, 'price'), _FIELD_SIMPLE_DATATYPES)
+        self.assertIn('PizzaQuerySet.is_delivered', validated)
+        self.assertIn('Pizza.is_delivered_method', validated)
+        self.assertIn('OrderQuerySet.cost_between', validated)
+        # needs an argument
+        self.assertNotIn('OrderQuerySet.delivered_in_last_x_days', validated)
+
+    def test_parameterless_q_funcs(self):
+        names = [name for name, q_func in iter_parameterless_q_funcs(Pizza)]
+        self.assertEqual(
+            ['PizzaQuerySet.has_gluten_free_toppings', 'PizzaQuerySet.is_delivered',
+             'PizzaQuerySet.is_delivered_using_cls'],
+            sorted(name for name in names if name.startswith('PizzaQuerySet'))
+        )
+        self.assertNotIn('Pizza.adelivered_in_last_x_days', names)
+        self.assertIn('Pizza.ais_delivered', names)
+
+    def test_validate_q(self):
+        validate_q(Pizza, Q(order__price__gt=1) | Q(toppings__name__startswith='c'))
+        with self.assertRaises(InvalidFieldLookupCombo):
+            validate_q(Pizza, Q(diameter=1) & ~Q(order__price__endswith='0'))
+
+    def test_invalid_q_method(self):
+        def is_cheap(cls):
+            return Q(price__startswith='1')
+
+        Order.objects._queryset_class.is_cheap = q_method(is_cheap)
+        try:
+            with self.assertRaisesRegexp(ImproperlyConfigured, 'OrderQuerySet.is_cheap'):
+                warm_up()
+        finally:
+            del Order.objects._queryset_class.is_cheap
@@ -35,6 +35,7 @@ INSTALLED_APPS = (
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'qtools.apps.QToolsConfig',
     'main'
 )
 
@@ -72,21 +73,39 @@ WSGI_APPLICATION = 'test_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/1.8/ref/settings/#databases
 
-DATABASES = {
-    'default': {
+# The tests run against sqlite by default. Set QTOOLS_TEST_DB=mysql or QTOOLS_TEST_DB=postgres to compare the
+# in-memory lookups to a local database server instead, for example:
+#   docker run -d -p 5432:5432 -e POSTGRES_USER=qtools -e POSTGRES_PASSWORD=qtools postgres
+#   QTOOLS_TEST_DB=postgres python manage.py test
+TEST_DATABASES = {
+    'sqlite': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME':   os.path.join(BASE_DIR, 'db.sqlite3'),
     },
-    # 'default': {
-    #     'ENGINE':   'django.db.backends.mysql',
-    #     'NAME':     'qtools',
-    #     'USER':     'circleup',
-    #     'PASSWORD': 'circleup',
-    #     'HOST':     '127.0.0.1',
-    #     'PORT':     '3306',
-    #     'OPTIONS':  {}
-    # },
+    'mysql': {
+        'ENGINE':   'django.db.backends.mysql',
+        'NAME':     'qtools',
+        'USER':     os.environ.get('QTOOLS_TEST_DB_USER', 'circleup'),
+        'PASSWORD': os.environ.get('QTOOLS_TEST_DB_PASSWORD', 'circleup'),
+        'HOST':     os.environ.get('QTOOLS_TEST_DB_HOST', '127.0.0.1'),
+        'PORT':     os.environ.get('QTOOLS_TEST_DB_PORT', '3306'),
+        'OPTIONS':  {}
+    },
+    'postgres': {
+        'ENGINE':   'django.db.backends.postgresql_psycopg2',
+        'NAME':     'qtools',
+        'USER':     os.environ.get('QTOOLS_TEST_DB_USER', 'qtools'),
+        'PASSWORD': os.environ.get('QTOOLS_TEST_DB_PASSWORD', 'qtools'),
+        'HOST':     os.environ.get('QTOOLS_TEST_DB_HOST', '127.0.0.1'),
+        'PORT':     os.environ.get('QTOOLS_TEST_DB_PORT', '5432'),
+    },
+}
+
+DATABASES = {
+    'default': TEST_DATABASES[os.environ.get('QTOOLS_TEST_DB', 'sqlite')],
 }
+# a second alias for the multiple database tests. it uses the same test database as default.
+DATABASES['replica'] = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/